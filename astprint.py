@@ -4,6 +4,7 @@ from graphviz import Digraph
 from rich     import print
 
 from model    import *
+from typesys  import type_name
 
 
 class ASTPrinter(Visitor):
@@ -36,32 +37,32 @@ class ASTPrinter(Visitor):
         name = self.name
         self.dot.node(name, label='Program')
         for stmt in n.body:
-            self.dot.edge(name, stmt.accept(self))
+            self.dot.edge(name, (yield stmt))
         return name
 
     def visit(self, n: VarDecl):
         name = self.name
         self.dot.node(name, label=f'VarDecl\n{n.name}:{n.type}')
         if n.value:
-            self.dot.edge(name, n.value.accept(self))
+            self.dot.edge(name, (yield n.value))
         return name
 
     def visit(self, n: BinOper):
         name = self.name
         self.dot.node(name, label=f'{n.oper}', shape='circle')
-        self.dot.edge(name, n.left.accept(self))
-        self.dot.edge(name, n.right.accept(self))
+        self.dot.edge(name, (yield n.left))
+        self.dot.edge(name, (yield n.right))
         return name
 
     def visit(self, n: UnaryOper):
         name = self.name
         self.dot.node(name, label=f'{n.oper}', shape='circle')
-        self.dot.edge(name, n.expr.accept(self))
+        self.dot.edge(name, (yield n.expr))
         return name
 
     def visit(self, n: Literal):
         name = self.name
-        self.dot.node(name, label=f'{n.value}:{n.type}')
+        self.dot.node(name, label=f'{n.value}:{type_name(n.type)}')
         return name
 
 
@@ -0,0 +1,783 @@
+# bench.py
+#
+# Mediciones de rendimiento del compilador B-Minor sobre programas
+# generados sintéticamente.
+#
+#   python bench.py lex [--funcs N]
+#   python bench.py stream [--funcs N] [--chunk BYTES]
+#   python bench.py startup [--runs N]
+#   python bench.py lists [--sizes 1000,10000,100000]
+#   python bench.py reparse [--lines N] [--edits N]
+#   python bench.py parallel [--lines N] [--workers N]
+#   python bench.py recheck [--funcs N] [--edits N]
+#   python bench.py checkpar [--funcs N] [--workers N]
+#   python bench.py parsers [--funcs N]
+#   python bench.py nodes [--funcs N]
+#   python bench.py intern [--decls N]
+#   python bench.py check [--exprs N]
+#   python bench.py diag [--errors N]
+#   python bench.py index [--files N] [--funcs N] [--queries N]
+#   python bench.py fold [--funcs N]
+#   python bench.py dce [--funcs N] [--used N]
+#   python bench.py flat [--funcs N]
+#   python bench.py dispatch [--funcs N]
+#   python bench.py traverse [--funcs N] [--depth N]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def gen_program(nfuncs):
+    '''
+    Genera un programa B-Minor válido para la gramática actual con
+    'nfuncs' funciones y algunas variables globales.
+    '''
+    parts = ['// programa generado\nN: integer = 100;\nscale: float = 2.5;\n']
+    for i in range(nfuncs):
+        parts.append(
+            f'/* función {i} */\n'
+            f'f{i}: function integer (a: integer, b: integer) = {{\n'
+            f'    x: integer = a * {i} + b - N;\n'
+            f'    y: float = 1.5e3 / scale;\n'
+            f'    x = x + a * b;\n'
+            f'    print x, y, "valor\\n", \'c\';\n'
+            f'    return x;\n'
+            f'}}\n'
+        )
+    return ''.join(parts)
+
+
+def _timeit(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _allocated(func):
+    '''
+    Bytes que siguen reservados por el resultado de func().
+    '''
+    tracemalloc.start()
+    result = func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def bench_lex(args):
+    from lexer import Lexer, scan
+
+    src = gen_program(args.funcs)
+    print(f'Fuente: {len(src):,} caracteres, {src.count(chr(10)):,} líneas')
+
+    t_sly, ntoks = _timeit(lambda: sum(1 for _ in Lexer().tokenize(src)), repeat=5)
+    t_fast, toks = _timeit(lambda: scan(src), repeat=5)
+    assert len(toks) == ntoks and toks.error is None
+
+    print(f'{"Lexer.tokenize":<16} {t_sly:8.3f} s  {ntoks / t_sly:14,.0f} tokens/s')
+    print(f'{"scan":<16} {t_fast:8.3f} s  {ntoks / t_fast:14,.0f} tokens/s')
+    print(f'Aceleración: {t_sly / t_fast:.2f}x')
+
+    # La salida de --scan: el texto de cada token, desde objetos Token o
+    # directamente desde los arreglos
+    t_sly, lines = _timeit(lambda: [repr(t) for t in Lexer().tokenize(src)], repeat=5)
+    t_fast, fast = _timeit(lambda: list(scan(src).reprs()), repeat=5)
+    assert fast == lines
+    print(f'{"--scan (Token)":<16} {t_sly:8.3f} s')
+    print(f'{"--scan (reprs)":<16} {t_fast:8.3f} s  aceleración: {t_sly / t_fast:.2f}x')
+
+    m_sly, _ = _allocated(lambda: list(Lexer().tokenize(src)))
+    m_fast, _ = _allocated(lambda: scan(src))
+    print(f'Memoria: {m_sly / ntoks:.1f} bytes/token (Token) frente a '
+          f'{m_fast / ntoks:.1f} bytes/token (TokenArray)')
+
+
+def bench_stream(args):
+    from lexer import scan, scan_stream
+
+    with tempfile.NamedTemporaryFile('w', suffix='.bminor', encoding='utf-8', delete=False) as f:
+        f.write(gen_program(args.funcs))
+    try:
+        print(f'Archivo: {os.path.getsize(f.name):,} bytes, bloques de {args.chunk:,} bytes')
+
+        def whole():
+            t0 = time.perf_counter()
+            with open(f.name, encoding='utf-8') as fp:
+                toks = scan(fp.read())
+            return time.perf_counter() - t0, len(toks)
+
+        def stream():
+            t0 = time.perf_counter()
+            first, ntoks = None, 0
+            for toks in scan_stream(f.name, args.chunk):
+                if first is None:
+                    first = time.perf_counter() - t0
+                ntoks += len(toks)
+            return first, ntoks
+
+        for label, func in (('read + scan', whole), ('scan_stream', stream)):
+            tracemalloc.start()
+            first, ntoks = func()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'{label:<12} primer token {first * 1000:9.1f} ms  '
+                  f'pico {peak / 2**20:8.1f} MiB  ({ntoks:,} tokens)')
+    finally:
+        os.unlink(f.name)
+
+
+def bench_startup(args):
+    from parser import Parser
+
+    code = ('import time; t0 = time.perf_counter(); import parser; '
+            'print(time.perf_counter() - t0)')
+
+    def run(cold):
+        times = []
+        for _ in range(args.runs):
+            if cold and os.path.exists(Parser.tables_file):
+                os.unlink(Parser.tables_file)
+            out = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                                 text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            times.append(float(out.stdout))
+        return min(times), sum(times) / len(times)
+
+    for label, cold in (('en frío', True), ('con caché', False)):
+        best, mean = run(cold)
+        print(f'import parser {label:<10} mín {best * 1000:7.1f} ms  media {mean * 1000:7.1f} ms')
+
+
+def bench_lists(args):
+    from parser import parse
+
+    print(f'{"n":>8} {"declaraciones":>14} {"sentencias":>12} {"argumentos":>12}')
+    for n in (int(s) for s in args.sizes.split(',')):
+        decls = ''.join(f'x{i}: integer = {i};\n' for i in range(n))
+        stmts = 'main: function void () = {\n' + 'x = x + 1;\n' * n + '}\n'
+        args_ = 'main: function void () = {\n print ' + ', '.join(['x'] * n) + ';\n}\n'
+        row = []
+        for src, count in ((decls, lambda p: len(p.body)),
+                           (stmts, lambda p: len(p.body[0].body)),
+                           (args_, lambda p: len(p.body[0].body[0].value))):
+            t, prog = _timeit(lambda: parse(src), repeat=1)
+            assert count(prog) == n
+            row.append(t)
+        print(f'{n:>8} {row[0]:>12.3f} s {row[1]:>10.3f} s {row[2]:>10.3f} s')
+
+
+def bench_reparse(args):
+    from parser import parse
+    from incremental import IncrementalParser
+
+    src = gen_program(args.lines // 8)
+    print(f'Fuente: {src.count(chr(10)):,} líneas')
+
+    t_full, _ = _timeit(lambda: parse(src), repeat=1)
+    t_init, ip = _timeit(lambda: IncrementalParser(src), repeat=1)
+    print(f'{"parse completo":<22} {t_full * 1000:10.1f} ms')
+    print(f'{"IncrementalParser()":<22} {t_init * 1000:10.1f} ms')
+
+    # Ediciones de una línea repartidas por el archivo: cambiar un
+    # operador (mismo largo), insertar un carácter e insertar una
+    # sentencia (desplazan el resto)
+    lines = [i for i in range(len(src)) if src.startswith('    x = x + a * b;', i)]
+    step = max(len(lines) // args.edits, 1)
+    for label, make in (('cambiar una línea', lambda i: (i + 10, 1, '-')),
+                        ('insertar un carácter', lambda i: (i + 10, 0, ' ')),
+                        ('insertar una línea', lambda i: (i, 0, '    x = x * 2;\n'))):
+        times = []
+        for i in lines[::step][:args.edits]:
+            offset, deleted, inserted = make(i)
+            t0 = time.perf_counter()
+            ip.edit(offset, deleted, inserted)
+            times.append(time.perf_counter() - t0)
+            # deshacer para que todas las ediciones partan del mismo texto
+            ip.edit(offset, len(inserted), src[offset:offset + deleted])
+        times.sort()
+        print(f'{label:<22} {times[len(times) // 2] * 1000:10.1f} ms (mediana de {len(times)})')
+
+
+def bench_recheck(args):
+    from checker import Check
+    from incremental import IncrementalChecker, IncrementalParser
+
+    src = gen_program(args.funcs)
+    ip = IncrementalParser(src)
+    ic = IncrementalChecker()
+    t_full, _ = _timeit(lambda: Check.checker(ip.program), repeat=1)
+    t_init, _ = _timeit(lambda: ic.check(ip.program), repeat=1)
+    print(f'{args.funcs:,} funciones')
+    print(f'{"Check.checker":<26} {t_full * 1000:10.1f} ms')
+    print(f'{"IncrementalChecker (1a)":<26} {t_init * 1000:10.1f} ms')
+
+    # Cambiar un operador dentro de una función: se vuelven a analizar y
+    # a verificar sólo esa función y la anterior (ver IncrementalParser)
+    lines = [i for i in range(len(src)) if src.startswith('    x = x + a * b;', i)]
+    step = max(len(lines) // args.edits, 1)
+    reparse, recheck, counts = [], [], set()
+    for i in lines[::step][:args.edits]:
+        t0 = time.perf_counter()
+        ip.edit(i + 10, 1, '-')
+        t1 = time.perf_counter()
+        ic.check(ip.program)
+        t2 = time.perf_counter()
+        counts.add(ic.rechecked)
+        reparse.append(t1 - t0)
+        recheck.append(t2 - t1)
+        ip.edit(i + 10, 1, '+')
+    for label, times in (('reparse', reparse), ('recheck', recheck)):
+        times.sort()
+        print(f'{label:<26} {times[len(times) // 2] * 1000:10.1f} ms (mediana de {len(times)})')
+    print(f'declaraciones verificadas por edición: {sorted(counts)}')
+
+
+def bench_parallel(args):
+    from parser import parse
+    from parallel import get_pool, parse_parallel
+
+    src = gen_program(args.lines // 8)
+    workers = args.workers or os.cpu_count()
+    print(f'Fuente: {src.count(chr(10)):,} líneas, {workers} procesos ({os.cpu_count()} CPU)')
+
+    t_serial, expected = _timeit(lambda: parse(src), repeat=1)
+    t0 = time.perf_counter()
+    get_pool(workers).submit(int).result()
+    t_pool = time.perf_counter() - t0
+    t_par, prog = _timeit(lambda: parse_parallel(src, workers), repeat=2)
+    assert prog == expected
+
+    print(f'{"parse":<16} {t_serial:8.3f} s')
+    print(f'{"crear el pool":<16} {t_pool:8.3f} s')
+    print(f'{"parse_parallel":<16} {t_par:8.3f} s  ({t_serial / t_par:.2f}x)')
+
+
+def bench_checkpar(args):
+    from checker import Check
+    from parallel import check_parallel, get_pool
+    from rdparser import parse
+
+    prog = parse(gen_program(args.funcs))
+    workers = args.workers or os.cpu_count()
+    print(f'{args.funcs:,} funciones, {workers} procesos ({os.cpu_count()} CPU)')
+
+    t_serial, _ = _timeit(lambda: Check.checker(prog), repeat=1)
+    get_pool(workers).submit(int).result()
+    t_par, _ = _timeit(lambda: check_parallel(prog, workers), repeat=2)
+    print(f'{"Check.checker":<16} {t_serial:8.3f} s')
+    print(f'{"check_parallel":<16} {t_par:8.3f} s  ({t_serial / t_par:.2f}x)')
+
+
+def bench_parsers(args):
+    from lexer import Lexer
+    from parser import Parser
+    from rdparser import RDParser
+
+    src = gen_program(args.funcs)
+    toks = list(Lexer().tokenize(src))
+    print(f'Fuente: {src.count(chr(10)):,} líneas, {len(toks):,} tokens (sin contar el lexer)')
+
+    t_sly, expected = _timeit(lambda: Parser().parse(iter(toks)))
+    t_rd, prog = _timeit(lambda: RDParser().parse(toks))
+    assert prog == expected
+
+    print(f'{"sly (LALR)":<16} {t_sly:8.3f} s  {len(toks) / t_sly:12,.0f} tokens/s')
+    print(f'{"RDParser":<16} {t_rd:8.3f} s  {len(toks) / t_rd:12,.0f} tokens/s')
+    print(f'Aceleración: {t_sly / t_rd:.2f}x')
+
+
+def _copy_tree(prog, slots=True, interned=False):
+    '''
+    Copia del árbol (las hojas, como los nombres, se comparten). Con
+    slots=False los nodos son de clases equivalentes sin __slots__:
+    dataclasses comunes con __dict__, como eran antes. Con interned=True
+    los literales y tipos de la copia son los canónicos (model.intern);
+    si no, cada uno es una instancia nueva.
+    '''
+    import dataclasses
+    from model import Node, intern
+
+    classes = {}
+
+    def twin(cls):
+        if slots:
+            return cls
+        if cls not in classes:
+            fields = [(f.name, f.type, f) for f in dataclasses.fields(cls)]
+            classes[cls] = dataclasses.make_dataclass(cls.__name__, fields)
+        return classes[cls]
+
+    def copy(n):
+        if isinstance(n, list):
+            return [copy(x) for x in n]
+        if isinstance(n, Node):
+            new = twin(type(n))(**{f.name: copy(getattr(n, f.name)) for f in dataclasses.fields(n)})
+            if n.lineno is not None:
+                new.lineno = n.lineno
+            if n.start is not None:
+                new.start, new.end = n.start, n.end
+            return intern(new) if interned else new
+        return n
+
+    return copy(prog)
+
+
+def bench_nodes(args):
+    import dataclasses
+    from parser import parse
+
+    src = gen_program(args.funcs)
+    prog = parse(src)
+
+    def count(n):
+        if isinstance(n, list):
+            return sum(count(x) for x in n)
+        if dataclasses.is_dataclass(n):
+            return 1 + sum(count(getattr(n, f.name)) for f in dataclasses.fields(n))
+        return 0
+
+    nnodes = count(prog)
+    print(f'Fuente: {src.count(chr(10)):,} líneas, {nnodes:,} nodos')
+
+    m_slots, _ = _allocated(lambda: _copy_tree(prog))
+    m_dict, _ = _allocated(lambda: _copy_tree(prog, slots=False))
+    print(f'{"con __slots__":<16} {m_slots / 2**20:8.1f} MiB  {m_slots / nnodes:8.1f} bytes/nodo')
+    print(f'{"con __dict__":<16} {m_dict / 2**20:8.1f} MiB  {m_dict / nnodes:8.1f} bytes/nodo')
+    print(f'Reducción: {1 - m_slots / m_dict:.0%}')
+
+
+def gen_decls(ndecls):
+    '''
+    Genera 'ndecls' declaraciones globales: variables con valor inicial,
+    arreglos y prototipos de funciones.
+    '''
+    kinds = [
+        lambda i: f'v{i}: integer = {i % 10};\n',
+        lambda i: f'w{i}: float = 2.5;\n',
+        lambda i: f'b{i}: boolean = true;\n',
+        lambda i: f's{i}: string = "hola";\n',
+        lambda i: f'a{i}: array [16] integer;\n',
+        lambda i: f'f{i}: function integer (x: integer, y: float, z: array [] char);\n',
+    ]
+    return ''.join(kinds[i % len(kinds)](i) for i in range(ndecls))
+
+
+def bench_intern(args):
+    from parser import parse
+
+    src = gen_decls(args.decls)
+    prog = parse(src)
+    print(f'Fuente: {args.decls:,} declaraciones, {src.count(chr(10)):,} líneas')
+
+    m_plain, _ = _allocated(lambda: _copy_tree(prog))
+    m_intern, _ = _allocated(lambda: _copy_tree(prog, interned=True))
+    print(f'{"sin compartir":<16} {m_plain / 2**20:8.1f} MiB')
+    print(f'{"canónicos":<16} {m_intern / 2**20:8.1f} MiB')
+    print(f'Reducción: {1 - m_intern / m_plain:.0%}')
+
+
+def bench_flat(args):
+    import pickle
+    import flatast
+    from parser import parse
+
+    prog = parse(gen_program(args.funcs))
+    t_flat, flat = _timeit(lambda: flatast.flatten(prog), repeat=1)
+    print(f'{len(flat):,} nodos, {len(flat.const_kind):,} constantes')
+    print(f'{"flatten":<22} {t_flat:8.3f} s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, ppath = os.path.join(tmp, 'ast.bin'), os.path.join(tmp, 'ast.pickle')
+        flat.save(path)
+        with open(ppath, 'wb') as f:
+            pickle.dump(prog, f, pickle.HIGHEST_PROTOCOL)
+        print(f'{"archivo":<22} {os.path.getsize(path) / 2**20:8.1f} MiB '
+              f'(pickle {os.path.getsize(ppath) / 2**20:.1f} MiB)')
+
+        def walk():
+            with flatast.load(path) as f:
+                return sum(1 for _ in f.walk())
+
+        def unpickle():
+            with open(ppath, 'rb') as f:
+                return pickle.load(f)
+
+        def to_tree():
+            with flatast.load(path) as f:
+                return f.to_tree()
+
+        t_load, _ = _timeit(lambda: flatast.load(path).close())
+        t_walk, count = _timeit(walk)
+        t_pickle, _ = _timeit(unpickle)
+        t_tree, tree = _timeit(to_tree, repeat=1)
+        assert tree == prog
+
+    print(f'{"load":<22} {t_load * 1000:8.3f} ms')
+    print(f'{"load + walk":<22} {t_walk:8.3f} s  ({count:,} nodos)')
+    print(f'{"pickle.load":<22} {t_pickle:8.3f} s')
+    print(f'{"load + to_tree":<22} {t_tree:8.3f} s')
+
+
+def bench_dispatch(args):
+    import dataclasses
+    from multimethod import multimeta
+    import model
+    from parser import parse
+
+    # Los mismos métodos visit para las dos metaclases: la mayoría de los
+    # nodos se resuelven por herencia
+    body = '''
+def visit(self, n: Node): return 0
+def visit(self, n: Declaration): return 1
+def visit(self, n: BinOper): return 2
+def visit(self, n: Literal): return 3
+def visit(self, n: Location): return 4
+'''
+
+    def make(meta, bases):
+        ns = meta.__prepare__('V', bases)
+        exec(body, vars(model), ns)
+        return meta('V', bases, ns)()
+
+    old = make(multimeta, ())
+    new = make(model.VisitorMeta, (model.Visitor,))
+
+    nodes, stack = [], [parse(gen_program(args.funcs))]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, list):
+            stack.extend(n)
+        elif isinstance(n, model.Node):
+            nodes.append(n)
+            stack.extend(getattr(n, f.name) for f in dataclasses.fields(n))
+    assert [old.visit(n) for n in nodes] == [new.visit(n) for n in nodes]
+    print(f'{len(nodes):,} nodos')
+
+    def per_node(func):
+        t, _ = _timeit(func, repeat=5)
+        return t / len(nodes) * 1e9
+
+    t_old = per_node(lambda: [old.visit(n) for n in nodes])
+    t_new = per_node(lambda: [new.visit(n) for n in nodes])
+    t_accept = per_node(lambda: [n.accept(new) for n in nodes])
+    print(f'{"multimethod":<22} {t_old:8.1f} ns/nodo')
+    print(f'{"tabla: v.visit(n)":<22} {t_new:8.1f} ns/nodo  ({t_old / t_new:.1f}x)')
+    print(f'{"tabla: n.accept(v)":<22} {t_accept:8.1f} ns/nodo  ({t_old / t_accept:.1f}x)')
+
+
+def bench_traverse(args):
+    from model import BinOper, Integer, Node, Visitor
+    from parser import parse
+    from traversal import children, preorder
+
+    # El mismo recorrido (contar nodos) recursivo y con pila explícita
+    class Recursive(Visitor):
+        def visit(self, n: Node):
+            return 1 + sum(c.accept(self) for c in children(n))
+
+    class Explicit(Visitor):
+        def visit(self, n: Node):
+            return 1 + sum((yield children(n)))
+
+    prog = parse(gen_program(args.funcs))
+    nnodes = sum(1 for _ in preorder(prog))
+    print(f'{nnodes:,} nodos (gen_program)')
+    visitors = [('visit recursivo', Recursive), ('visit con yield', Explicit)]
+    rows = [(label, lambda v=v: prog.accept(v())) for label, v in visitors]
+    rows.append(('preorder', lambda: sum(1 for _ in preorder(prog))))
+    for label, func in rows:
+        t, count = _timeit(func)
+        assert count == nnodes
+        print(f'{label:<22} {t / nnodes * 1e9:8.1f} ns/nodo')
+
+    expr = Integer(0)
+    for i in range(1, args.depth):
+        expr = BinOper('+', expr, Integer(i))
+    print(f'\nCadena 0 + 1 + ... de {args.depth:,} operandos (profundidad {args.depth - 1:,})')
+    for label, v in visitors:
+        try:
+            t, count = _timeit(lambda: expr.accept(v()), repeat=1)
+            print(f'{label:<22} {t:8.3f} s  ({count:,} nodos)')
+        except RecursionError:
+            print(f'{label:<22} RecursionError (límite {sys.getrecursionlimit()})')
+
+
+def gen_exprs(nexprs):
+    '''
+    Genera un programa con una función de unos 'nexprs' nodos de
+    expresiones (10 por sentencia), enteras y de punto flotante.
+    '''
+    parts = ['a: integer = 1;\nb: integer = 2;\ny: integer = 3;\n'
+             'f: float = 1.5;\ng: float = 2.5;\n'
+             'main: function void () = {\n    x: integer = 0;\n    h: float = 0.0;\n']
+    for i in range(nexprs // 10):
+        if i % 2:
+            parts.append('    h = f * 2.5 + g - f / 1.5;\n')
+        else:
+            parts.append(f'    x = a * {i} + b - y / 2;\n')
+    parts.append('}\n')
+    return ''.join(parts)
+
+
+def bench_check(args):
+    from checker import Check
+    from model import BinOper, Expression
+    from rdparser import parse
+    from traversal import preorder
+    from typesys import _bin_ops, binop, op_codes, type_code, type_name
+
+    prog = parse(gen_exprs(args.exprs))
+    nexprs = sum(1 for n in preorder(prog) if isinstance(n, Expression))
+    print(f'{nexprs:,} nodos de expresiones')
+
+    t, _ = _timeit(lambda: Check.checker(prog))
+    print(f'{"Check.checker":<22} {t:8.3f} s  {nexprs / t:12,.0f} expresiones/s')
+
+    # Sólo la consulta del tipo de cada BinOper: una tupla de nombres en
+    # un dict (como era check_binop) frente a códigos en la tabla densa
+    def by_names(op, left, right):
+        return _bin_ops.get((left, op, right))
+
+    ops = [n for n in preorder(prog) if isinstance(n, BinOper)]
+    codes = [(op_codes[n.oper], n.left.type, n.right.type) for n in ops]
+    names = [(n.oper, type_name(l), type_name(r)) for n, (_, l, r) in zip(ops, codes)]
+    t_names, r_names = _timeit(lambda: [by_names(o, l, r) for o, l, r in names])
+    t_codes, r_codes = _timeit(lambda: [binop(o, l, r) for o, l, r in codes])
+    assert [type_code(r) for r in r_names] == r_codes
+    print(f'{len(ops):,} BinOper')
+    print(f'{"tuplas de nombres":<22} {t_names / len(ops) * 1e9:8.1f} ns/operación')
+    print(f'{"tabla de códigos":<22} {t_codes / len(ops) * 1e9:8.1f} ns/operación')
+
+
+def bench_diag(args):
+    import io
+    import errors
+    from checker import Check
+    from rdparser import parse
+    from rich import print as rprint
+
+    # una variable sin declarar por sentencia: un error cada una
+    src = 'f: function void () = {\n' + ''.join(f'    print u{i};\n' for i in range(args.errors)) + '}\n'
+    prog = parse(src)
+    with errors.collecting() as sink:
+        t_check, _ = _timeit(lambda: Check.checker(prog))
+    print(f'{sink.count:,} errores, verificación {t_check:.3f} s')
+
+    def per_error():
+        # como antes: rich.print de cada mensaje al reportarlo
+        out = io.StringIO()
+        for d in sink.records:
+            rprint(f'[red]{d.lineno}: {d.message}[/red]', file=out)
+
+    def buffered(format):
+        sink.render(io.StringIO(), format)
+
+    t_old, _ = _timeit(per_error)
+    print(f'{"rich.print por error":<22} {t_old:8.3f} s')
+    for format in ('rich', 'text', 'json'):
+        t, _ = _timeit(lambda: buffered(format))
+        print(f'{"render " + format:<22} {t:8.3f} s  {t_old / t:8.1f}x')
+
+
+def bench_index(args):
+    import random
+    from symindex import SymbolIndex
+
+    sources = {f'mod{k}.bminor': gen_program(args.funcs) for k in range(args.files)}
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'symbols.db')
+        with SymbolIndex(db) as ix:
+            t_build, _ = _timeit(lambda: [ix.update(p, s) for p, s in sources.items()], repeat=1)
+            t_same, _ = _timeit(lambda: [ix.update(p, s) for p, s in sources.items()], repeat=1)
+            path = 'mod0.bminor'
+            t_edit, _ = _timeit(lambda: ix.update(path, sources[path] + 'z: integer = N;\n'), repeat=1)
+        size = os.path.getsize(db)
+        print(f'{args.files} archivos de {args.funcs:,} funciones, índice de {size / 2**20:.1f} MiB')
+        print(f'{"indexar todo":<24} {t_build:10.3f} s')
+        print(f'{"sin cambios":<24} {t_same * 1000:10.1f} ms')
+        print(f'{"un archivo editado":<24} {t_edit * 1000:10.1f} ms')
+
+        # consultas sobre el índice ya guardado, sin analizar nada
+        with SymbolIndex(db) as ix:
+            names = [f'f{rng.randrange(args.funcs)}' for _ in range(args.queries)]
+            files = sorted(sources.items())
+            offsets = [(p, s.index('x = x', rng.randrange(len(s) - 200)))
+                       for p, s in (rng.choice(files) for _ in range(args.queries))]
+            queries = [
+                ('definitions', lambda: [ix.definitions(n) for n in names]),
+                ('references', lambda: [ix.references(n) for n in names]),
+                ('definition_at', lambda: [ix.definition_at(p, o) for p, o in offsets]),
+                ('references_at', lambda: [ix.references_at(p, o) for p, o in offsets]),
+            ]
+            assert all(ix.definition_at(p, o).name == 'x' for p, o in offsets)
+            for label, func in queries:
+                t, _ = _timeit(func)
+                print(f'{label:<24} {t / args.queries * 1e6:10.1f} µs/consulta')
+
+
+def bench_fold(args):
+    from checker import Check
+    from model import BinOper, UnaryOper, VarLoc
+    from optimize import fold_constants
+    from rdparser import parse
+    from traversal import preorder
+
+    src = gen_program(args.funcs)
+
+    def counts(prog):
+        nodes = list(preorder(prog))
+        return (len(nodes), sum(isinstance(n, (BinOper, UnaryOper)) for n in nodes),
+                sum(isinstance(n, VarLoc) and n.mode == 'load' for n in nodes))
+
+    prog = parse(src)
+    before = counts(prog)
+    refs = []
+    t_check, _ = _timeit(lambda: Check.checker(prog, refs), repeat=1)
+    t_fold, _ = _timeit(lambda: fold_constants(prog, refs), repeat=1)
+    after = counts(prog)
+    print(f'{args.funcs:,} funciones')
+    print(f'{"":<22} {"nodos":>10} {"operadores":>12} {"lecturas":>10}')
+    for label, (nodes, ops, loads) in (('original', before), ('plegado', after)):
+        print(f'{label:<22} {nodes:10,} {ops:12,} {loads:10,}')
+    print(f'{"Check.checker":<22} {t_check * 1000:10.1f} ms')
+    print(f'{"fold_constants":<22} {t_fold * 1000:10.1f} ms')
+
+
+def bench_dce(args):
+    import random
+    from checker import Check
+    from model import FuncCall, Integer, PrintStmt
+    from optimize import eliminate_dead_code
+    from rdparser import parse
+    from traversal import preorder
+
+    # una biblioteca de 'funcs' funciones y un main que llama a 'used'
+    # (la gramática no tiene llamadas: se agregan al AST)
+    src = gen_program(args.funcs) + 'main: function void () = {\n}\n'
+    used = random.Random(1).sample(range(args.funcs), args.used)
+
+    def program():
+        prog = parse(src)
+        prog.body[-1].body = [PrintStmt([FuncCall(f'f{i}', [Integer(1), Integer(2)])]) for i in used]
+        return prog
+
+    prog = program()
+    nodes = sum(1 for _ in preorder(prog))
+    t_full, _ = _timeit(lambda: Check.checker(prog), repeat=1)
+
+    prog = program()
+    t_dce, removed = _timeit(lambda: eliminate_dead_code(prog), repeat=1)
+    kept = sum(1 for _ in preorder(prog))
+    t_kept, _ = _timeit(lambda: Check.checker(prog), repeat=1)
+
+    print(f'{args.funcs:,} funciones, main llama a {args.used}')
+    print(f'{"nodos":<28} {nodes:10,} -> {kept:,} ({len(removed):,} declaraciones eliminadas)')
+    print(f'{"Check.checker":<28} {t_full * 1000:10.1f} ms')
+    print(f'{"eliminate_dead_code + check":<28} {(t_dce + t_kept) * 1000:10.1f} ms '
+          f'({t_dce * 1000:.1f} + {t_kept * 1000:.1f})')
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmarks del compilador B-Minor')
+    sub = ap.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('lex', help='tokens/segundo: Lexer.tokenize frente a scan')
+    p.add_argument('--funcs', type=int, default=20000)
+    p.set_defaults(func=bench_lex)
+
+    p = sub.add_parser('stream', help='memoria pico y primer token: scan frente a scan_stream')
+    p.add_argument('--funcs', type=int, default=20000)
+    p.add_argument('--chunk', type=int, default=1 << 16)
+    p.set_defaults(func=bench_stream)
+
+    p = sub.add_parser('startup', help='tiempo de import parser con y sin caché de tablas')
+    p.add_argument('--runs', type=int, default=10)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser('lists', help='escalamiento del parser con listas largas')
+    p.add_argument('--sizes', default='1000,10000,100000')
+    p.set_defaults(func=bench_lists)
+
+    p = sub.add_parser('reparse', help='latencia del análisis incremental tras editar una línea')
+    p.add_argument('--lines', type=int, default=50000)
+    p.add_argument('--edits', type=int, default=20)
+    p.set_defaults(func=bench_reparse)
+
+    p = sub.add_parser('recheck', help='verificación incremental después de editar una función')
+    p.add_argument('--funcs', type=int, default=5000)
+    p.add_argument('--edits', type=int, default=20)
+    p.set_defaults(func=bench_recheck)
+
+    p = sub.add_parser('parallel', help='parse secuencial frente a parse_parallel')
+    p.add_argument('--lines', type=int, default=50000)
+    p.add_argument('--workers', type=int, default=0)
+    p.set_defaults(func=bench_parallel)
+
+    p = sub.add_parser('checkpar', help='Check.checker secuencial frente a check_parallel')
+    p.add_argument('--funcs', type=int, default=5000)
+    p.add_argument('--workers', type=int, default=0)
+    p.set_defaults(func=bench_checkpar)
+
+    p = sub.add_parser('parsers', help='tokens/segundo: parser sly frente al descendente recursivo')
+    p.add_argument('--funcs', type=int, default=5000)
+    p.set_defaults(func=bench_parsers)
+
+    p = sub.add_parser('nodes', help='memoria por nodo del AST con y sin __slots__')
+    p.add_argument('--funcs', type=int, default=5000)
+    p.set_defaults(func=bench_nodes)
+
+    p = sub.add_parser('intern', help='memoria del AST con literales y tipos canónicos')
+    p.add_argument('--decls', type=int, default=100000)
+    p.set_defaults(func=bench_intern)
+
+    p = sub.add_parser('check', help='expresiones/segundo del checker con tipos codificados')
+    p.add_argument('--exprs', type=int, default=1000000)
+    p.set_defaults(func=bench_check)
+
+    p = sub.add_parser('diag', help='mostrar errores: rich.print por error frente a render al final')
+    p.add_argument('--errors', type=int, default=20000)
+    p.set_defaults(func=bench_diag)
+
+    p = sub.add_parser('index', help='índice de símbolos: construcción, actualización y consultas')
+    p.add_argument('--files', type=int, default=20)
+    p.add_argument('--funcs', type=int, default=1000)
+    p.add_argument('--queries', type=int, default=2000)
+    p.set_defaults(func=bench_index)
+
+    p = sub.add_parser('fold', help='plegado y propagación de constantes: nodos evaluados en ejecución')
+    p.add_argument('--funcs', type=int, default=5000)
+    p.set_defaults(func=bench_fold)
+
+    p = sub.add_parser('dce', help='código muerto: verificar todo frente a sólo lo que usa main')
+    p.add_argument('--funcs', type=int, default=5000)
+    p.add_argument('--used', type=int, default=10)
+    p.set_defaults(func=bench_dce)
+
+    p = sub.add_parser('flat', help='AST plano: tamaño, carga con mmap y recorrido')
+    p.add_argument('--funcs', type=int, default=5000)
+    p.set_defaults(func=bench_flat)
+
+    p = sub.add_parser('dispatch', help='costo por nodo del despacho de visit: multimethod frente a la tabla')
+    p.add_argument('--funcs', type=int, default=2000)
+    p.set_defaults(func=bench_dispatch)
+
+    p = sub.add_parser('traverse', help='visitors recursivos frente a la pila explícita')
+    p.add_argument('--funcs', type=int, default=2000)
+    p.add_argument('--depth', type=int, default=1000000)
+    p.set_defaults(func=bench_traverse)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,66 @@
 import argparse
+import os
 import sys
-from lexer import Lexer
+import cache
+import errors
+from traversal import node_repr
 
 def scan_file(filename):
-    try:
-        with open(filename, 'r') as f:
-            data = f.read()
-    except FileNotFoundError:
+    if not os.path.exists(filename):
         print(f"    File doest exist'{filename}'", file=sys.stderr)
         sys.exit(1)
 
-    lexer = Lexer()
+    # los tokens se muestran desde los arreglos, sin crear objetos Token
+    from lexer import scan_stream
     try:
-        for token in lexer.tokenize(data):
-            print(token)
+        for toks in scan_stream(filename):
+            if len(toks):
+                print('\n'.join(toks.reprs()))
+            if toks.error:
+                raise toks.error
         sys.exit(0)
     except Exception as e:
         print(f"    {e}", file=sys.stderr)
         sys.exit(1)
 
+def check_file(filename, check=True, parser='sly'):
+    if not os.path.exists(filename):
+        print(f"    File doest exist'{filename}'", file=sys.stderr)
+        sys.exit(1)
+
+    with open(filename, encoding='utf-8') as f:
+        source = f.read()
+    try:
+        program, _ = cache.frontend(source, check, parser)
+    except Exception as e:
+        print(f"    {e}", file=sys.stderr)
+        sys.exit(1)
+    errors.render()
+    if not check:
+        print(node_repr(program))
+    sys.exit(1 if errors.errors_detected() else 0)
+
 def main():
     parser = argparse.ArgumentParser(description="B-Minor Compiler")
     parser.add_argument('--scan', help='Scan file .bminor')
+    parser.add_argument('--parse', help='Parse file .bminor and print the AST')
+    parser.add_argument('--check', help='Parse and type check file .bminor')
+    parser.add_argument('--parser', choices=sorted(cache.PARSERS), default='sly',
+                        help='Parser backend: sly (LALR) or rd (hand-written)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not use the front-end cache')
     args = parser.parse_args()
 
+    if args.no_cache:
+        cache.enabled = False
+
     if args.scan:
         scan_file(args.scan)
+    elif args.parse:
+        check_file(args.parse, check=False, parser=args.parser)
+    elif args.check:
+        check_file(args.check, parser=args.parser)
     else:
-        print("Uso: python bminor.py --scan archivo.bminor", file=sys.stderr)
+        print("Uso: python bminor.py [--scan | --parse | --check] archivo.bminor [--parser sly|rd] [--no-cache]", file=sys.stderr)
         sys.exit(1)
 
 if __name__ == '__main__':
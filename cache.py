@@ -0,0 +1,251 @@
+# cache.py
+'''
+Caché en disco de los resultados del front-end (lexer, parser y
+checker).
+
+Cada entrada se identifica por el hash del código fuente y de la versión
+del compilador (el contenido de los módulos del front-end), así que un
+cambio en cualquiera de los dos produce otra entrada. Se guarda el
+Program, la tabla de símbolos del checker y los mensajes de error,
+serializados con pickle y comprimidos con zlib. Los nodos se guardan
+uno por uno (ver _dumps), así que un AST de cualquier profundidad se
+puede guardar.
+
+El tamaño total del directorio está limitado: al superarlo se eliminan
+las entradas usadas hace más tiempo (cada lectura actualiza la fecha de
+modificación del archivo).
+
+Variables de entorno:
+
+    BMINOR_NO_CACHE=1        desactiva la caché
+    BMINOR_CACHE_DIR=dir     directorio (por omisión __pycache__/frontend)
+    BMINOR_CACHE_SIZE=bytes  tamaño máximo (por omisión 64 MiB)
+'''
+import hashlib
+import io
+import logging
+import os
+import pickle
+import zlib
+
+from errors    import collecting, report
+from model     import Literal, Node, TypeNode
+from traversal import field_names
+
+
+log = logging.getLogger(__name__)
+
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+enabled   = not os.environ.get('BMINOR_NO_CACHE')
+cache_dir = os.environ.get('BMINOR_CACHE_DIR', os.path.join(_here, '__pycache__', 'frontend'))
+max_size  = int(os.environ.get('BMINOR_CACHE_SIZE', 64 << 20))
+
+# Módulos cuyo contenido forma parte de la versión del compilador
+FRONTEND_MODULES = ['lexer.py', 'parser.py', 'rdparser.py', 'model.py', 'checker.py',
+                    'symtab.py', 'typesys.py', 'errors.py', 'cache.py']
+
+# Módulos con la función parse() de cada parser
+PARSERS = {'sly': 'parser', 'rd': 'rdparser'}
+
+_version = None
+
+
+def compiler_version():
+    global _version
+    if _version is None:
+        h = hashlib.sha256()
+        for name in FRONTEND_MODULES:
+            with open(os.path.join(_here, name), 'rb') as f:
+                h.update(f.read())
+        _version = h.hexdigest()[:16]
+    return _version
+
+
+def cache_key(source, check=True, parser='sly'):
+    h = hashlib.sha256(compiler_version().encode('ascii'))
+    h.update(b'check' if check else b'parse')
+    h.update(parser.encode('ascii'))
+    h.update(source.encode('utf-8'))
+    return h.hexdigest()
+
+
+def _path(key):
+    return os.path.join(cache_dir, key + '.bmc')
+
+
+class _Pickler(pickle.Pickler):
+    # Cada nodo se escribe como una referencia (número, clase); su
+    # contenido va después (ver _dumps). Los literales y los TypeNode
+    # no: pickle los escribe completos, y uno canónico vuelve a ser el
+    # canónico al cargarlo (ver model.intern)
+    def __init__(self, f):
+        super().__init__(f, pickle.HIGHEST_PROTOCOL)
+        self.nodes = []
+        self.numbers = {}
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, Node) or isinstance(obj, (Literal, TypeNode)):
+            return None
+        k = self.numbers.get(id(obj))
+        if k is None:
+            k = self.numbers[id(obj)] = len(self.nodes)
+            self.nodes.append(obj)
+        return k, type(obj)
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, f):
+        super().__init__(f)
+        self.nodes = []
+
+    def persistent_load(self, pid):
+        k, cls = pid
+        if k == len(self.nodes):
+            self.nodes.append(cls.__new__(cls))
+        return self.nodes[k]
+
+
+def _dumps(value):
+    '''
+    Como pickle.dumps(value), sin recursión en el AST: pickle escribe
+    los hijos de un objeto dentro del objeto, y en una cadena de
+    BinOper la profundidad supera el límite de recursión de Python.
+    Aquí cada nodo es una referencia, y el contenido de los nodos que
+    aparecieron en un pickle (sus campos y 'lineno', 'start', 'end',
+    'type', 'addr') va en el siguiente, hasta que no aparecen más: uno
+    por nivel del árbol. El memo del Pickler se conserva entre ellos,
+    así que un objeto compartido se escribe una sola vez.
+    '''
+    f = io.BytesIO()
+    pickler = _Pickler(f)
+    pickler.dump(value)
+    nodes = pickler.nodes
+    done = 0
+    while done < len(nodes):
+        level, done = nodes[done:], len(nodes)
+        pickler.dump([([getattr(n, name) for name in field_names(type(n))],
+                       [getattr(n, name) for name in Node.__slots__]) for n in level])
+    return f.getvalue()
+
+
+def _loads(data):
+    f = io.BytesIO(data)
+    unpickler = _Unpickler(f)
+    value = unpickler.load()
+    nodes = unpickler.nodes
+    done = 0
+    while f.tell() < len(data):
+        states = unpickler.load()
+        for n, (values, slots) in zip(nodes[done:], states):
+            for name, v in zip(field_names(type(n)), values):
+                setattr(n, name, v)
+            for name, v in zip(Node.__slots__, slots):
+                if v is not None:
+                    setattr(n, name, v)
+        done += len(states)
+    return value
+
+
+def load(key):
+    '''
+    Retorna el objeto guardado con 'key', o None si no existe (o no se
+    puede leer).
+    '''
+    path = _path(key)
+    try:
+        with open(path, 'rb') as f:
+            value = _loads(zlib.decompress(f.read()))
+        os.utime(path)
+        return value
+    except Exception:
+        return None
+
+
+def store(key, value):
+    '''
+    Guarda 'value' con 'key'. Si no se puede (el directorio no se puede
+    escribir, o algo en 'value' no se puede serializar), no se guarda
+    nada, se deja un mensaje de depuración en el log 'cache' y se
+    retorna False: la caché nunca hace fallar la compilación.
+    '''
+    try:
+        data = zlib.compress(_dumps(value))
+    except (RecursionError, pickle.PicklingError, TypeError) as e:
+        log.debug('no se guarda %s en la caché: %r', key, e)
+        return False
+    path = _path(key)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        evict()
+    except OSError as e:
+        log.debug('no se guarda %s en la caché: %s', key, e)
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def evict(limit=None):
+    '''
+    Elimina las entradas usadas hace más tiempo hasta que el tamaño total
+    no supere 'limit' (por omisión max_size).
+    '''
+    limit = max_size if limit is None else limit
+    try:
+        entries = [e for e in os.scandir(cache_dir) if e.name.endswith('.bmc')]
+    except FileNotFoundError:
+        return
+    files = sorted((st.st_mtime, st.st_size, e.path) for e in entries for st in [e.stat()])
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= limit:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def clear():
+    evict(0)
+
+
+def frontend(source, check=True, parser='sly'):
+    '''
+    Analiza 'source' con el parser indicado (ver PARSERS) y, si 'check'
+    es verdadero, lo verifica con el checker. Retorna (program, env);
+    env es None sin 'check'.
+
+    Con la caché activa, un código fuente ya procesado no vuelve a pasar
+    por el front-end: se cargan los resultados guardados y se vuelven a
+    reportar sus mensajes de error.
+    '''
+    key = cache_key(source, check, parser) if enabled else None
+    if key:
+        value = load(key)
+        if value is not None:
+            program, env, messages = value
+            report(messages)
+            return program, env
+
+    # importados aquí: con la caché caliente no hace falta ni cargar
+    # las tablas del parser
+    from importlib import import_module
+    from checker   import Check
+
+    with collecting() as found:
+        program = import_module(PARSERS[parser]).parse(source)
+        env = Check.checker(program) if check else None
+    report(found.records)
+    if key:
+        store(key, (program, env, found.records))
+    return program, env
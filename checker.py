@@ -7,6 +7,10 @@ Primero, debe tener una noción de "tipo" en su compilador.
 Segundo, debe administrar los entornos (symtab) y el alcance para manejar
 los nombres de las definiciones (variables, funciones, etc.)
 
+Los tipos de las expresiones son códigos enteros (ver typesys): cada
+visit de una expresión guarda el código en n.type y lo retorna. El de
+un literal lo fija su clase al crearlo.
+
 Una clave para esta parte del proyecto es realizar pruebas adecuadas.
 A medida que agregue código, piense en cómo podría probarlo.
 '''
@@ -16,17 +20,23 @@ from typing  import Union, List
 from errors  import error, errors_detected
 from model   import *
 from symtab  import Symtab
-from typesys import typenames, check_binop, check_unaryop, CheckError
+from typesys import NOTYPE, type_code, binop, unaryop, op_codes, CheckError
 
 
 class Check(Visitor):
+    # Si es una lista, cada uso de un nombre (VarLoc, ArrayLoc, FuncCall)
+    # agrega (nodo, declaración); la declaración es None si no está
+    # definido. Ver symindex.
+    refs = None
+
     @classmethod
-    def checker(cls, n: Program):
+    def checker(cls, n: Program, refs: List = None):
         '''
         1. Crear la tabla de simbol global
         2. Visitar todas las declaraciones en n.body
         '''
         checker = cls()
+        checker.refs = refs
         env = Symtab('global')
         for decl in n.body:
             decl.accept(checker, env)
@@ -40,15 +50,18 @@ class Check(Visitor):
         2. Agregar 'n' a la tabla de Simbol actual
         '''
         if n.value:
-            if typenames(check_binop('=', n.type, n.value.type)) is None:
-                error(f"En asignación de '{n.name}', no coincide los tipos", n.lineno)
+            t = yield n.value
+            if t and t != type_code(n.type.name):
+                error(f"En asignación de '{n.name}', no coincide los tipos", n, 'type-mismatch')
         
+        n.addr = None
         try:
             env.add(n.name, n)
+            n.addr = (0, env.slots[n.name])
         except Symtab.SymbolConflictError:
-            error(f"La variable '{n.name}' ya declarada y con tipo diferente", n.lineno)
+            error(f"La variable '{n.name}' ya declarada y con tipo diferente", n, 'conflict')
         except Symtab.SymbolDefinedError:
-            error(f"La variable '{n.name}' ya declarada", n.lineno)
+            error(f"La variable '{n.name}' ya declarada", n, 'redefined')
 
     def visit(self, n: ArrayDecl, env: Symtab):
         '''
@@ -56,7 +69,17 @@ class Check(Visitor):
         2. Si se definió n.value, deben de ser tipo del arreglo
         3. Agregar el arreglo n a symtab.
         '''
-        pass
+        yield n.dims
+        yield n.value
+
+        n.addr = None
+        try:
+            env.add(n.name, n)
+            n.addr = (0, env.slots[n.name])
+        except Symtab.SymbolConflictError:
+            error(f"El arreglo '{n.name}' ya declarado y con tipo diferente", n, 'conflict')
+        except Symtab.SymbolDefinedError:
+            error(f"El arreglo '{n.name}' ya declarado", n, 'redefined')
 
     def visit(self, n: FuncDecl, env: Symtab):
         '''
@@ -65,72 +88,204 @@ class Check(Visitor):
         3. Visitar cada uno de los parametros y agregarlos a Symtab
         4. Visitar cada decl en n.body
         '''
+        n.addr = None
         try:
             env.add(n.name, n)
+            n.addr = (0, env.slots[n.name])
         except Symtab.SymbolConflictError:
-            error(f"La función '{n.name}' ya declarada y con tipo diferente", n.lineno)
+            error(f"La función '{n.name}' ya declarada y con tipo diferente", n, 'conflict')
         except Symtab.SymbolDefinedError:
-            error(f"La función '{n.name}' ya declarada", n.lineno)
+            error(f"La función '{n.name}' ya declarada", n, 'redefined')
         
         env = Symtab(n.name, env)
 
-        for parm in n.parms:
-            parm.accept(self, env)
+        for parm in n.params:
+            yield (parm, env)
+
+        yield from self.block(n.body or [], env, scope=False)
 
-        for stmt in n.body:
-            stmt.accept(self, env)
+    def block(self, stmts, env, scope=True):
+        '''
+        Visita una lista de sentencias. Un bloque anidado tiene su propia
+        Symtab (sus variables ocupan slots del marco de la función).
+        '''
+        if scope:
+            env = Symtab(env.name, env, block=True)
+        for stmt in stmts:
+            if isinstance(stmt, list):
+                yield from self.block(stmt, env)
+            else:
+                yield (stmt, env)
+
+    def visit(self, n: ErrorDecl, env: Symtab):
+        '''
+        1. El error de sintaxis ya fue reportado por el parser: no hay nada
+           que verificar
+        '''
+        pass
 
     def visit(self, n: VarParm, env: Symtab):
         '''
         1. Agregar 'n' a la tabla a Symtab
         '''        
+        n.addr = None
         try:
             env.add(n.name, n)
+            n.addr = (0, env.slots[n.name])
         except Symtab.SymbolConflictError:
-            error(f"El parámetro '{n.name}' ya declarada y con tipo diferente", n.lineno)
+            error(f"El parámetro '{n.name}' ya declarada y con tipo diferente", n, 'conflict')
         except Symtab.SymbolDefinedError:
-            error(f"El parámetro '{n.name}' ya declarada", n.lineno)
+            error(f"El parámetro '{n.name}' ya declarada", n, 'redefined')
 
     def visit(self, n: ArrayParm, env: Symtab):
         '''
         1. Si n.size esta definido, verificar que sea entero
         2. Agregar 'n' a la tabla de Symtab
         '''
-        pass
+        n.addr = None
+        try:
+            env.add(n.name, n)
+            n.addr = (0, env.slots[n.name])
+        except Symtab.SymbolConflictError:
+            error(f"El parámetro '{n.name}' ya declarada y con tipo diferente", n, 'conflict')
+        except Symtab.SymbolDefinedError:
+            error(f"El parámetro '{n.name}' ya declarada", n, 'redefined')
+
+    def visit(self, n: IfStmt, env: Symtab):
+        '''
+        1. Visitar la condición y las dos ramas
+        '''
+        yield n.cond
+        yield from self.block(n.then, env)
+        yield from self.block(n.else_ or [], env)
+
+    def visit(self, n: ForStmt, env: Symtab):
+        '''
+        1. Visitar init, cond, step y el cuerpo
+        '''
+        yield n.init
+        yield n.cond
+        yield n.step
+        yield from self.block(n.body, env)
+
+    def visit(self, n: Union[WhileStmt, DoWhileStmt], env: Symtab):
+        '''
+        1. Visitar la condición y el cuerpo
+        '''
+        yield n.cond
+        yield from self.block(n.body, env)
+
+    def visit(self, n: PrintStmt, env: Symtab):
+        '''
+        1. Visitar cada expresión
+        '''
+        yield n.value
+
+    def visit(self, n: Assignment, env: Symtab):
+        '''
+        1. Visitar n.target y n.value
+        '''
+        n.type = yield n.target
+        yield n.value
+        return n.type
 
     def visit(self, n: ReturnStmt, env: Symtab):
         '''
         1. Verificar que el return este dentro de una función.
-        2. Visitar n.expr, si existe
-        3. Verificar que tipo de n.expr sea igual al tipo de retorno de la función
+        2. Visitar n.value, si existe
+        3. Verificar que tipo de n.value sea igual al tipo de retorno de la función
         '''
         if env.name == 'global':
-            error("La instrucción Return esta por fuera de uan función", n.lineno)
+            error("La instrucción Return esta por fuera de uan función", n, 'return-outside')
         
         func = env.get(env.name)
-        if n.expr:
-            n.expr.accept(self, env)
-            if func.type != n.expr.type:
-                error(f"La función '{func.name}' retorna un tipo diferente", n.lineno)
+        if not isinstance(func, FuncDecl):
+            func = None
+        if n.value:
+            t = yield n.value
+            if func and t and t != type_code(func.return_type.name):
+                error(f"La función '{func.name}' retorna un tipo diferente", n, 'return-type')
+
+    def visit(self, n: Literal, env: Symtab):
+        '''
+        1. El tipo de un literal lo fija su clase (n.type)
+        '''
+        return n.type
 
     def visit(self, n: BinOper, env: Symtab):
         '''
         1. Visitar el n.left y n.right
         2. Revisar si n.oper es permitida
         '''
-        n.left.accept(self, env)
-        n.right.accept(self, env)
-
-        n.type = check_binop(n.oper, n.left.type, n.right.type)
+        left = yield n.left
+        right = yield n.right
 
-        if n.type is None:
-            error(f"En '{n.oper}', no coincide los tipos", n.lineno)
+        n.type = binop(op_codes[n.oper], left, right)
+        # con un operando sin tipo el error ya se reportó
+        if not n.type and left and right:
+            error(f"En '{n.oper}', no coincide los tipos", n, 'type-mismatch')
+        return n.type
 
     def visit(self, n: VarLoc, env: Symtab):
         '''
-        1. Buscar en Symtab la variable n.name y guardar su tipo
+        1. Buscar en Symtab la variable n.name y guardar su tipo y su
+           dirección léxica
         '''
-        n.type = env.get(n.name)
+        decl, n.addr = env.lookup(n.name)
+        n.type = _type_code(decl)
+        if self.refs is not None:
+            self.refs.append((n, decl))
+
+        if decl is None:
+            error(f"La variable '{n.name}' no está definida", n, 'undefined')
+        return n.type
+
+    def visit(self, n: ArrayLoc, env: Symtab):
+        '''
+        1. Buscar en Symtab el arreglo n.name y guardar su tipo y su
+           dirección léxica
+        2. Visitar los índices
+        '''
+        decl, n.addr = env.lookup(n.name)
+        n.type = _type_code(decl)
+        if self.refs is not None:
+            self.refs.append((n, decl))
+        yield n.index
+        return n.type
+
+    def visit(self, n: FuncCall, env: Symtab):
+        '''
+        1. Buscar en Symtab la función n.name y guardar su dirección
+           léxica
+        2. Visitar los argumentos
+        '''
+        decl, n.addr = env.lookup(n.name)
+        n.type = _type_code(decl) if isinstance(decl, FuncDecl) else NOTYPE
+        if self.refs is not None:
+            self.refs.append((n, decl))
+        yield n.args
+        return n.type
+
+    def visit(self, n: UnaryOper, env: Symtab):
+        '''
+        1. Visitar n.expr
+        '''
+        t = yield n.expr
+        n.type = unaryop(op_codes[n.oper], t)
+        return n.type
+
+    def visit(self, n: Union[Increment, Decrement], env: Symtab):
+        '''
+        1. Visitar n.target
+        '''
+        n.type = yield n.target
+        return n.type
+
 
-        if n.type is None:
-            error(f"La variable '{n.name}' no está definida", n.lineno)
\ No newline at end of file
+def _type_code(decl):
+    # código del tipo de un símbolo (el de retorno, si es una función)
+    if decl is None:
+        return NOTYPE
+    if isinstance(decl, FuncDecl):
+        return type_code(decl.return_type.name)
+    return type_code(decl.type.name)
\ No newline at end of file
@@ -1,32 +1,71 @@
 # context.py
+import re
+from array  import array
+from bisect import bisect_right
+
+from errors import Diagnostic, Diagnostics
+
+
 class Context:
     def __init__(self, filename, source):
         self.filename = filename
         self.source = source
-        self.errors = []
+        self.diagnostics = Diagnostics()
+        self._line_starts = None
 
     @property
     def have_errors(self):
-        return len(self.errors) > 0
+        return self.diagnostics.count > 0
+
+    @property
+    def errors(self):
+        """Los errores como texto, 'línea:columna: mensaje'."""
+        return [d.text(self.position) for d in self.diagnostics.records]
+
+    @property
+    def line_starts(self):
+        """Posición en el código fuente donde empieza cada línea.
+
+        Se arma la primera vez que se necesita convertir una posición en
+        línea y columna.
+        """
+        if self._line_starts is None:
+            self._line_starts = array('q', [0])
+            self._line_starts.extend(m.end() for m in re.finditer('\n', self.source))
+        return self._line_starts
+
+    def position(self, offset):
+        """Retorna (línea, columna) de una posición, ambas desde 1."""
+        starts = self.line_starts
+        line = bisect_right(starts, offset)
+        return line, offset - starts[line - 1] + 1
 
     def error(self, position, message):
         """Registra un error."""
+        start = getattr(position, 'start', None)
         if hasattr(position, 'lineno'):
             line = position.lineno
         elif isinstance(position, int):
             line = position
         else:
             line = '?'
-        self.errors.append(f"{line}: {message}")
+        self.diagnostics.report(Diagnostic(message, line, 'runtime', start=start,
+                                           end=getattr(position, 'end', None)))
+
+    def show_errors(self, format=None):
+        """Muestra los errores acumulados, todos juntos."""
+        self.diagnostics.render(format=format, position=self.position)
 
-    def show_errors(self):
-        """Muestra los errores acumulados."""
-        for err in self.errors:
-            print(f"{err}")
+    def find_span(self, node):
+        """Retorna el rango (inicio, fin) del texto fuente de un nodo, sin
+        copiarlo, o None si el nodo no tiene posición."""
+        if getattr(node, 'start', None) is not None:
+            return node.start, node.end
+        return None
 
     def find_source(self, node):
         """Retorna el texto fuente asociado a un nodo, si es posible."""
-        try:
-            return self.source[node.index]
-        except:
-            return str(node)
+        span = self.find_span(node)
+        if span is not None:
+            return self.source[span[0]:span[1]]
+        return str(node)
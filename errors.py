@@ -7,26 +7,179 @@ es la notificación fiable de mensajes de error al usuario. Este archivo
 debería consolidar algunas funciones básicas de gestión de errores en un solo lugar.
 Facilitar la notificación de errores. Facilitar la detección de errores.
 
-Podría ampliarse para que sea más potente posteriormente.
+Cada error es un Diagnostic (código, severidad, línea, posiciones en el
+código fuente y mensaje) que se guarda en un Diagnostics: el destino de
+los errores de una compilación. error() no muestra nada; los mensajes
+se muestran todos juntos al final con render(), como texto, JSON o con
+rich. Un Diagnostics descarta los errores repetidos y puede limitar
+cuántos guarda.
 
-Variable global que indica si se ha producido algún error. El compilador puede 
-consultar esto posteriormente para decidir si debe detenerse.
+El destino actual se elige con collecting() (es una ContextVar: cada
+hilo o tarea puede tener el suyo). Fuera de collecting() se usa uno
+global, que es el que consultan errors_detected(), error_messages() y
+clear_errors().
 '''
-from rich import print
-
-_errors_detected = 0
-
-def error(message, lineno=None):
-	global _errors_detected
-	if lineno:
-		print(f'{lineno}: [red]{message}[/red]')
-	else:
-		print(f"[red]{message}[/red]")
-	_errors_detected += 1
-	
+import contextlib
+import contextvars
+import json
+import sys
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Diagnostic:
+	message : str
+	lineno  : object = None		# número de línea, 'EOF' o None
+	code    : str = None		# tipo de error, p. ej. 'syntax' o 'undefined'
+	severity: str = 'error'
+	start   : int = None		# posiciones en el código fuente (ver model.Node)
+	end     : int = None
+
+	def shifted(self, delta, ldelta):
+		'''
+		El mismo diagnóstico, 'delta' caracteres y 'ldelta' líneas más
+		adelante (para una declaración que se movió).
+		'''
+		return Diagnostic(self.message,
+			self.lineno + ldelta if isinstance(self.lineno, int) else self.lineno,
+			self.code, self.severity,
+			self.start + delta if self.start is not None else None,
+			self.end + delta if self.end is not None else None)
+
+	def text(self, position=None):
+		'''
+		El mensaje como una línea de texto. 'position', si se da, convierte
+		una posición en (línea, columna) (ver context.Context.position).
+		'''
+		if position is not None and self.start is not None:
+			line, column = position(self.start)
+			return f'{line}:{column}: {self.message}'
+		if self.lineno:
+			return f'{self.lineno}: {self.message}'
+		return self.message
+
+
+class Diagnostics:
+	'''
+	Los diagnósticos de una compilación, en el orden en que se
+	reportaron. Un diagnóstico igual a uno anterior (mismo código,
+	mensaje y posición) se descarta. Con 'limit' se guardan a lo sumo
+	esa cantidad de errores; los demás sólo se cuentan (ver 'dropped').
+	'''
+	def __init__(self, limit=None):
+		self.limit = limit
+		self.records = []
+		self.count = 0			# errores distintos, incluidos los no guardados
+		self._seen = set()
+
+	def __len__(self):
+		return len(self.records)
+
+	@property
+	def dropped(self):
+		return self.count - len(self.records)
+
+	def report(self, diag):
+		key = (diag.code, diag.message, diag.lineno, diag.start)
+		if key in self._seen:
+			return
+		self._seen.add(key)
+		self.count += 1
+		if self.limit is None or len(self.records) < self.limit:
+			self.records.append(diag)
+
+	def extend(self, records):
+		for diag in records:
+			self.report(diag)
+
+	def clear(self):
+		self.records.clear()
+		self._seen.clear()
+		self.count = 0
+
+	def render(self, file=None, format=None, position=None):
+		'''
+		Escribe todos los diagnósticos en 'file' (por omisión sys.stdout)
+		de una sola vez. 'format' es 'text', 'json' o 'rich' (colores);
+		por omisión 'rich' si 'file' es una terminal y si no 'text'.
+		'''
+		file = file or sys.stdout
+		if format is None:
+			format = 'rich' if file.isatty() else 'text'
+		if format == 'json':
+			json.dump([{'code': d.code, 'severity': d.severity, 'message': d.message,
+			            'lineno': d.lineno, 'start': d.start, 'end': d.end}
+			           for d in self.records], file)
+			file.write('\n')
+			return
+		lines = [d.text(position) for d in self.records]
+		if self.dropped:
+			lines.append(f'... y {self.dropped} errores más')
+		if not lines:
+			return
+		if format == 'rich':
+			from rich.console import Console
+			from rich.markup  import escape
+			Console(file=file, highlight=False).print('\n'.join(f'[red]{escape(l)}[/red]' for l in lines))
+		else:
+			file.write('\n'.join(lines) + '\n')
+
+
+_default = Diagnostics()
+_current = contextvars.ContextVar('diagnostics', default=_default)
+
+def current():
+	return _current.get()
+
+@contextlib.contextmanager
+def collecting(diagnostics=None):
+	'''
+	Dentro del bloque los errores van a 'diagnostics' (uno nuevo si no
+	se da), que es lo que entrega.
+	'''
+	diagnostics = Diagnostics() if diagnostics is None else diagnostics
+	token = _current.set(diagnostics)
+	try:
+		yield diagnostics
+	finally:
+		_current.reset(token)
+
+def _span(position):
+	# (lineno, start, end) de un nodo, un token de sly, un número de
+	# línea o 'EOF'
+	if position is None or isinstance(position, (int, str)):
+		return position, None, None
+	start = getattr(position, 'start', None)
+	if start is None:
+		# el 'index' de un token; el de un ArrayLoc es la lista de índices
+		start = getattr(position, 'index', None)
+		if not isinstance(start, int):
+			start = None
+	return position.lineno, start, getattr(position, 'end', None)
+
+def error(message, position=None, code=None, severity='error'):
+	'''
+	Reporta un error. 'position' es el nodo o token donde ocurrió, o
+	sólo un número de línea.
+	'''
+	lineno, start, end = _span(position)
+	_current.get().report(Diagnostic(message, lineno, code, severity, start, end))
+
+def report(records):
+	'''
+	Vuelve a reportar diagnósticos ya creados (de la caché, de otro
+	proceso...).
+	'''
+	_current.get().extend(records)
+
+def render(file=None, format=None, position=None):
+	_current.get().render(file, format, position)
+
 def errors_detected():
-	return _errors_detected
-	
+	return _current.get().count
+
+def error_messages():
+	return [(d.message, d.lineno) for d in _current.get().records]
+
 def clear_errors():
-	global _errors_detected
-	_errors_detected = 0
\ No newline at end of file
+	_current.get().clear()
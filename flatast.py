@@ -0,0 +1,326 @@
+# flatast.py
+'''
+Representación plana del AST: los nodos se guardan en arreglos paralelos
+(struct-of-arrays) en lugar de objetos, y se identifican por su índice.
+
+Para un programa de n nodos:
+
+    kind[n]      código de la clase del nodo (ver KINDS)
+    lineno[n]    número de línea, -1 si no tiene
+    start[n]     posición del nodo en el código fuente, -1 si no tiene
+    end[n]       (ver Node)
+    first[n+1]   los campos del nodo i son refs[first[i]:first[i+1]]
+    refs[...]    valor de cada campo, codificado como un entero:
+                     r >= 0   el nodo r
+                     r == -1  None
+                     r <= -2  la constante -r-2 del pool
+
+Las listas (cuerpos de funciones, argumentos de print, dimensiones...)
+son nodos de tipo LIST cuyos campos son sus elementos. Los nombres, los
+operadores y los valores de los literales van a un pool de constantes
+sin repetir. Un nodo que aparece dos veces en el árbol (las dimensiones
+de ArrayDecl, que también están en su TypeNode) tiene un único índice,
+y los hijos siempre tienen un índice menor que su padre.
+
+save() escribe estos arreglos en un archivo binario y load() los abre
+con mmap sin copiarlos: se puede recorrer un AST guardado sin crear un
+solo objeto de model.py. El archivo incluye el esquema (clases y campos)
+con el que se escribió; load() rechaza un archivo de otro esquema.
+
+Sólo se conservan los campos de los nodos, su número de línea y sus
+posiciones, no los atributos que agrega el checker.
+'''
+import json
+import mmap
+import struct
+import sys
+from array       import array
+from dataclasses import fields, is_dataclass
+
+import model
+from model import Node, intern
+
+
+# Códigos de clase: LIST y luego las clases de model.py en el orden en
+# que están definidas
+LIST = 0
+KINDS = [list] + [c for c in vars(model).values()
+                  if isinstance(c, type) and issubclass(c, Node) and is_dataclass(c)]
+KIND_CODES = {c: i for i, c in enumerate(KINDS)}
+FIELDS = [()] + [tuple(f.name for f in fields(c)) for c in KINDS[1:]]
+SCHEMA = json.dumps([['list', []]] + [[c.__name__, list(f)] for c, f in zip(KINDS[1:], FIELDS[1:])])
+
+# Tipos de las constantes
+_STR, _INT, _FLOAT, _BOOL = range(4)
+
+MAGIC = b'BMAST\0'
+VERSION = 2
+# magic, versión, nodos, refs, constantes, bytes del pool, raíz, largo del esquema
+_header = struct.Struct('<6sHIIIIiI')
+
+
+class FlatAST:
+    '''
+    Un AST plano. Se construye con flatten() o load(); los arreglos son
+    array.array, o memoryview sobre el archivo si se cargó con load().
+    '''
+    def __init__(self, kind, lineno, start, end, first, refs, const_kind, const_off, const_data, root):
+        self.kind = kind
+        self.lineno = lineno
+        self.start = start
+        self.end = end
+        self.first = first
+        self.refs = refs
+        self.const_kind = const_kind
+        self.const_off = const_off
+        self.const_data = const_data
+        self.root = root
+        self._consts = [None] * len(const_kind)
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''
+        Libera el archivo abierto por load(). Después no se puede usar.
+        '''
+        if self._mmap is not None:
+            for name in ('kind', 'lineno', 'start', 'end', 'first', 'refs',
+                         'const_kind', 'const_off', 'const_data'):
+                view = getattr(self, name)
+                if isinstance(view, memoryview):
+                    view.release()
+            self._mmap.close()
+            self._mmap = None
+
+    # ==========================================================
+    # ACCESO
+    # ==========================================================
+    def node_class(self, n):
+        return KINDS[self.kind[n]]
+
+    def field_names(self, n):
+        return FIELDS[self.kind[n]]
+
+    def constant(self, k):
+        value = self._consts[k]
+        if value is None:
+            data = bytes(self.const_data[self.const_off[k]:self.const_off[k + 1]])
+            kind = self.const_kind[k]
+            if kind == _STR:
+                value = data.decode('utf-8')
+            elif kind == _INT:
+                value = int(data)
+            elif kind == _FLOAT:
+                value = float(data)
+            else:
+                value = data == b'1'
+            self._consts[k] = value
+        return value
+
+    def decode(self, r):
+        '''
+        Valor de un campo codificado: el índice de un nodo, None o una
+        constante.
+        '''
+        if r >= -1:
+            return None if r == -1 else r
+        return self.constant(-r - 2)
+
+    def values(self, n):
+        '''
+        Valores de los campos del nodo 'n' (los elementos, si es una
+        lista), en el orden de FIELDS.
+        '''
+        return [self.decode(r) for r in self.refs[self.first[n]:self.first[n + 1]]]
+
+    def get(self, n, name):
+        return self.decode(self.refs[self.first[n] + FIELDS[self.kind[n]].index(name)])
+
+    def children(self, n):
+        '''
+        Índices de los nodos hijos de 'n'.
+        '''
+        return [r for r in self.refs[self.first[n]:self.first[n + 1]] if r >= 0]
+
+    def walk(self, start=None):
+        '''
+        Recorre en preorden los nodos alcanzables desde 'start' (por
+        omisión la raíz), sin recursión. Como al recorrer los objetos, un
+        nodo compartido se visita una vez por cada lugar donde aparece.
+        '''
+        first, refs = self.first, self.refs
+        stack = [self.root if start is None else start]
+        pop, push = stack.pop, stack.extend
+        while stack:
+            n = pop()
+            yield n
+            push(r for r in reversed(refs[first[n]:first[n + 1]]) if r >= 0)
+
+    # ==========================================================
+    # CONVERSIÓN
+    # ==========================================================
+    def to_tree(self):
+        '''
+        Reconstruye el árbol de objetos de model.py.
+        '''
+        kind, lineno, first, refs = self.kind, self.lineno, self.first, self.refs
+        start, end = self.start, self.end
+        consts = [self.constant(k) for k in range(len(self.const_kind))]
+        objs = []
+        for n in range(len(kind)):
+            vals = [objs[r] if r >= 0 else None if r == -1 else consts[-r - 2]
+                    for r in refs[first[n]:first[n + 1]]]
+            k = kind[n]
+            if k == LIST:
+                objs.append(vals)
+                continue
+            node = KINDS[k](**dict(zip(FIELDS[k], vals)))
+            if lineno[n] < 0 and start[n] < 0:
+                # los literales y tipos canónicos no tienen posición
+                node = intern(node)
+            if lineno[n] >= 0:
+                node.lineno = lineno[n]
+            if start[n] >= 0:
+                node.start, node.end = start[n], end[n]
+            objs.append(node)
+        return objs[self.root] if objs else None
+
+    def save(self, path):
+        schema = SCHEMA.encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(_header.pack(MAGIC, VERSION, len(self.kind), len(self.refs),
+                                 len(self.const_kind), len(self.const_data), self.root, len(schema)))
+            f.write(schema)
+            for data in self._sections():
+                f.write(b'\0' * (-f.tell() % 8))
+                f.write(data)
+
+    def _sections(self):
+        # mismo orden que en load(); los enteros en little-endian
+        arrays = [self.kind, self.lineno, self.start, self.end, self.first, self.refs,
+                  self.const_kind, self.const_off]
+        for a in arrays:
+            if sys.byteorder == 'big' and a.itemsize > 1:
+                a = array(a.typecode if isinstance(a, array) else a.format, a)
+                a.byteswap()
+            yield memoryview(a).cast('B')
+        yield self.const_data
+
+
+def flatten(root):
+    '''
+    Convierte un árbol de model.py (normalmente un Program) en un
+    FlatAST, sin recursión.
+    '''
+    kind, lineno, first, refs = array('B'), array('i'), array('I', [0]), array('i')
+    start, end = array('i'), array('i')
+    const_kind, const_off, const_data = array('B'), array('I', [0]), bytearray()
+    pool = {}
+    ids = {}            # id(objeto) -> índice del nodo
+
+    def const(value):
+        key = (type(value), value)
+        k = pool.get(key)
+        if k is None:
+            if isinstance(value, bool):
+                kind_, data = _BOOL, b'1' if value else b'0'
+            elif isinstance(value, int):
+                kind_, data = _INT, str(value).encode('ascii')
+            elif isinstance(value, float):
+                kind_, data = _FLOAT, repr(value).encode('ascii')
+            elif isinstance(value, str):
+                kind_, data = _STR, value.encode('utf-8')
+            else:
+                raise TypeError(f'no se puede guardar un {type(value).__name__} en el AST plano')
+            k = pool[key] = len(const_kind)
+            const_kind.append(kind_)
+            const_data.extend(data)
+            const_off.append(len(const_data))
+        return -k - 2
+
+    def items(obj):
+        return obj if type(obj) is list else [getattr(obj, name) for name in FIELDS[KIND_CODES[type(obj)]]]
+
+    # Postorden: un nodo se numera después de todos sus hijos
+    stack = [(root, False)]
+    while stack:
+        obj, expanded = stack.pop()
+        if id(obj) in ids:
+            continue
+        vals = items(obj)
+        if not expanded:
+            stack.append((obj, True))
+            stack.extend((v, False) for v in reversed(vals)
+                         if isinstance(v, (list, Node)) and id(v) not in ids)
+            continue
+        for v in vals:
+            if v is None:
+                refs.append(-1)
+            elif isinstance(v, (list, Node)):
+                refs.append(ids[id(v)])
+            else:
+                refs.append(const(v))
+        ids[id(obj)] = len(kind)
+        if type(obj) is list:
+            kind.append(LIST)
+            lineno.append(-1)
+            start.append(-1)
+            end.append(-1)
+        else:
+            kind.append(KIND_CODES[type(obj)])
+            lineno.append(-1 if obj.lineno is None else obj.lineno)
+            start.append(-1 if obj.start is None else obj.start)
+            end.append(-1 if obj.end is None else obj.end)
+        first.append(len(refs))
+    return FlatAST(kind, lineno, start, end, first, refs, const_kind, const_off, bytes(const_data),
+                   ids[id(root)])
+
+
+def load(path):
+    '''
+    Abre un AST guardado con FlatAST.save. Los arreglos se leen
+    directamente del archivo mapeado en memoria; hay que cerrarlo con
+    close() (o usarlo con 'with').
+    '''
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, version, nnodes, nrefs, nconsts, ndata, root, nschema = _header.unpack_from(mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path}: no es un AST plano de esta versión')
+        pos = _header.size
+        if mm[pos:pos + nschema].decode('utf-8') != SCHEMA:
+            raise ValueError(f'{path}: el AST se guardó con otras clases de nodos')
+        pos += nschema
+
+        buf = memoryview(mm)
+        sections = []
+        for fmt, count in (('B', nnodes), ('i', nnodes), ('i', nnodes), ('i', nnodes),
+                           ('I', nnodes + 1), ('i', nrefs),
+                           ('B', nconsts), ('I', nconsts + 1), ('B', ndata)):
+            pos += -pos % 8
+            size = count * struct.calcsize(fmt)
+            view = buf[pos:pos + size].cast(fmt)
+            if sys.byteorder == 'big' and view.itemsize > 1:
+                # el archivo es little-endian: aquí sí hay que copiar
+                a = array(fmt, view.tobytes())
+                a.byteswap()
+                view.release()
+                view = a
+            sections.append(view)
+            pos += size
+        buf.release()
+    except Exception:
+        mm.close()
+        raise
+    flat = FlatAST(*sections, root)
+    flat._mmap = mm
+    return flat
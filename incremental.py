@@ -0,0 +1,397 @@
+# incremental.py
+'''
+Análisis incremental para editores: en lugar de volver a procesar el
+archivo completo después de cada cambio, se reutiliza todo lo que el
+cambio no pudo afectar.
+'''
+from bisect   import bisect_left, bisect_right
+from collections import namedtuple
+from dataclasses import fields
+from itertools import chain
+from operator import attrgetter
+
+from checker  import Check
+from errors   import collecting, report
+from lexer    import Lexer, _LOOKAHEAD
+from model    import ArrayDecl, ErrorDecl, FuncDecl, Node, Program, VarDecl
+from parser   import Parser, split_decls
+from symtab   import Symtab
+
+
+_index = attrgetter('index')
+_end   = attrgetter('end')
+
+
+class IncrementalLexer:
+    '''
+    Mantiene el texto y su lista de tokens (los mismos que produce
+    Lexer.tokenize). Cada edición vuelve a analizar sólo desde el último
+    token que el cambio no puede alterar hasta que los tokens nuevos
+    coinciden otra vez con los anteriores; el resto se reutiliza
+    desplazando posiciones y números de línea.
+    '''
+    def __init__(self, text, lineno=1):
+        self.text = text
+        self.lineno = lineno
+        self.tokens = list(Lexer().tokenize(text, lineno))
+        self.restart = 0        # desde dónde se volvió a analizar en la última edición
+
+    def edit(self, offset, deleted, inserted):
+        '''
+        Reemplaza 'deleted' caracteres en 'offset' por el texto 'inserted'
+        y retorna la nueva lista de tokens. Los tokens posteriores al cambio
+        son los mismos objetos de la lista anterior, con sus posiciones
+        actualizadas. Si el texto resultante tiene un error léxico, la
+        excepción se propaga y no se modifica nada.
+        '''
+        old, text = self.tokens, self.text
+        new_text = text[:offset] + inserted + text[offset + deleted:]
+        delta = len(inserted) - deleted
+
+        # Punto de reinicio: el final del último token que no pudo
+        # examinar nada del cambio. Un '/' seguido de '*' es un comentario
+        # sin cerrar cuyo análisis depende del resto del archivo.
+        keep = bisect_right(old, offset - _LOOKAHEAD, key=_end)
+        pos = text.find('/*', 0, old[keep - 1].end + 1) if keep else -1
+        while pos != -1:
+            i = bisect_left(old, pos, hi=keep, key=_index)
+            if i < keep and old[i].index == pos and old[i].type == '/':
+                keep = i
+                break
+            pos = text.find('/*', pos + 1, old[keep - 1].end + 1)
+        if keep:
+            index, lineno = old[keep - 1].end, old[keep - 1].lineno
+        else:
+            index, lineno = 0, self.lineno
+
+        # Volver a analizar hasta sincronizar con la lista anterior: un
+        # token nuevo que empieza después del cambio en la misma posición
+        # que uno anterior implica que el resto es idéntico.
+        edit_end = offset + len(inserted)
+        tokens = old[:keep]
+        rest = []
+        for tok in Lexer().tokenize(new_text, lineno, index):
+            if tok.index >= edit_end:
+                k = bisect_left(old, tok.index - delta, lo=keep, key=_index)
+                if k < len(old) and old[k].index == tok.index - delta:
+                    rest = _shift(old[k:], delta, tok.lineno - old[k].lineno)
+                    break
+            tokens.append(tok)
+
+        self.text = new_text
+        self.tokens = tokens + rest
+        self.restart = index
+        return self.tokens
+
+
+# Rango de texto de una declaración de nivel superior (o de varias, ver
+# IncrementalParser._parse), su primera línea, cuántos nodos produjo y
+# los nodos con posición de esos nodos y sus descendientes: 'located'
+# tiene lineno, start y end; 'partial' sólo alguno (ver _located)
+_Span = namedtuple('_Span', 'start end lineno count located partial')
+
+# Lo analizado que todavía depende de las declaraciones siguientes: los
+# tokens, sus nodos, los errores de sintaxis y si la recuperación del
+# último error terminó
+_Pending = namedtuple('_Pending', 'tokens nodes records recovered')
+
+# Una declaración en medio del texto se analiza en el estado en que la
+# encuentra parse(): después de otra. Estos tokens son esa declaración
+# anterior (su nodo se descarta).
+_PREFIX = list(Lexer().tokenize('x: integer;'))
+
+def _error_decl_follow():
+    # Los tokens con los que sly termina un "decl : error ';'". Con otro
+    # token el error que causa no se reporta y se descarta junto con el
+    # ErrorDecl anterior, así que ese ErrorDecl depende de lo que sigue.
+    prods = Parser._grammar.Productions
+    n = next(i for i, p in enumerate(prods) if p.name == 'decl' and tuple(p.prod) == ('error', ';'))
+    return {tok for actions in Parser._lrtable.lr_action.values()
+            for tok, action in actions.items() if action == -n}
+
+_ERROR_DECL_FOLLOW = _error_decl_follow()
+
+
+class IncrementalParser:
+    '''
+    Mantiene el Program de un texto que se edita. Cada declaración de
+    nivel superior se analiza por separado y se recuerda el rango de
+    texto que ocupa; una edición vuelve a analizar sólo las declaraciones
+    que toca y reemplaza sus nodos en program.body. Los nodos de las
+    demás declaraciones se conservan (son los mismos objetos). El
+    resultado y los errores de sintaxis son los de parse().
+
+    Las posiciones y los números de línea de los nodos conservados se
+    actualizan en su lugar. Para no recorrer esos árboles en cada
+    edición, cada span guarda la lista de sus nodos con posición (ver
+    _located). Un nodo que se agrega al árbol después no está en esa
+    lista y sus posiciones no se actualizan.
+    '''
+    def __init__(self, text, lineno=1):
+        self.lexer = IncrementalLexer(text, lineno)
+        self.parser = Parser()
+        self.spans = []
+        self.program = Program([])
+        pending = None
+        for chunk in split_decls(self.lexer.tokens):
+            pending = self._settle(pending, chunk, self.spans, self.program.body)
+            pending = self._parse(chunk, pending)
+            if pending.recovered is None:
+                pending = self._flush(pending, self.spans, self.program.body)
+        self._flush(pending, self.spans, self.program.body)
+
+    @property
+    def text(self):
+        return self.lexer.text
+
+    def _parse(self, chunk, pending):
+        '''
+        Analiza la declaración 'chunk' (ver split_decls), junto con lo que
+        quedó pendiente de las anteriores. La recuperación de un error de
+        sintaxis puede seguir en los tokens siguientes: en ese caso
+        'recovered' es False (o True si terminó en un ErrorDecl, ver
+        _settle) y se vuelve a analizar todo con la próxima declaración.
+        Si no, es None y el resultado no depende de lo que sigue.
+        '''
+        parser = self.parser
+        region = pending.tokens + chunk if pending else chunk
+        first = region[0] is self.lexer.tokens[0]
+        with collecting() as found:
+            nodes = parser.parse(iter(region)).body
+        if parser.errors and not first:
+            # sin errores el resultado es el mismo con o sin _PREFIX
+            with collecting() as found:
+                nodes = parser.parse(chain(_PREFIX, region)).body[1:]
+        if parser.errors and not parser.errorok:
+            recovered = False
+        elif nodes and type(nodes[-1]) is ErrorDecl:
+            recovered = True
+        else:
+            recovered = None
+        return _Pending(region, nodes, found.records, recovered)
+
+    def _settle(self, pending, chunk, spans, body):
+        # Lo pendiente que terminó en un ErrorDecl queda así si 'chunk'
+        # empieza con un token que puede seguirlo
+        if pending and pending.recovered and chunk[0].type in _ERROR_DECL_FOLLOW:
+            return self._flush(pending, spans, body)
+        return pending
+
+    def _flush(self, pending, spans, body):
+        # Agrega lo analizado por _parse a 'spans' y 'body'
+        if pending:
+            region, nodes, records, _ = pending
+            report(records)
+            spans.append(_Span(region[0].index, region[-1].end, region[0].lineno, len(nodes),
+                               *_located(nodes)))
+            body.extend(nodes)
+        return None
+
+    def edit(self, offset, deleted, inserted):
+        '''
+        Aplica la edición (como IncrementalLexer.edit) y retorna el
+        Program actualizado.
+        '''
+        old = self.spans
+        tokens = self.lexer.edit(offset, deleted, inserted)
+        delta = len(inserted) - deleted
+        edit_end = offset + len(inserted)
+
+        # Declaraciones afectadas: las que tocan los tokens que cambiaron
+        # (un comentario sin cerrar puede empezar antes de la edición), más
+        # la anterior, porque su final depende del token que la sigue (un
+        # '}' seguido de ';' no termina la declaración).
+        changed = min(offset, self.lexer.restart)
+        first = max(bisect_left(old, changed, key=_span_end) - 1, 0)
+        k = bisect_left(tokens, old[first - 1].end if first else 0, key=_index)
+
+        # Volver a dividir y analizar hasta encontrar una declaración que
+        # empieza después del cambio donde empezaba una anterior: desde
+        # ahí la división es la misma y se reutiliza (salvo que haya pasado
+        # a ser la primera del texto o haya dejado de serlo).
+        spans, body = [], []
+        last, ldelta = len(old), 0
+        pending = None
+        for chunk in split_decls(tokens[k:]):
+            pending = self._settle(pending, chunk, spans, body)
+            pos = chunk[0].index
+            if pos >= edit_end and not pending:
+                m = bisect_left(old, pos - delta, lo=first, key=_span_start)
+                if m < len(old) and old[m].start == pos - delta and \
+                        (m == 0) == (chunk[0] is tokens[0]):
+                    last, ldelta = m, chunk[0].lineno - old[m].lineno
+                    break
+            pending = self._parse(chunk, pending)
+            if pending.recovered is None:
+                pending = self._flush(pending, spans, body)
+        self._flush(pending, spans, body)
+
+        lo = sum(s.count for s in old[:first])
+        hi = lo + sum(s.count for s in old[first:last])
+        self.program.body[lo:hi] = body
+        self.program._digest = None     # las demás declaraciones conservan el suyo
+        rest = old[last:]
+        if delta or ldelta:
+            rest = [_Span(s.start + delta, s.end + delta, s.lineno + ldelta, *s[3:]) for s in rest]
+            for s in rest:
+                _shift_nodes(s.located, s.partial, delta, ldelta)
+        self.spans = old[:first] + spans + rest
+        return self.program
+
+
+_span_start = attrgetter('start')
+_span_end   = attrgetter('end')
+
+
+def _shift_nodes(located, partial, delta, ldelta):
+    # Mueve las posiciones y los números de línea de los nodos de un span
+    if ldelta:
+        for n in located:
+            n.start += delta
+            n.end += delta
+            n.lineno += ldelta
+    else:
+        for n in located:
+            n.start += delta
+            n.end += delta
+    for n in partial:
+        if n.start is not None:
+            n.start += delta
+        if n.end is not None:
+            n.end += delta
+        if n.lineno is not None:
+            n.lineno += ldelta
+
+
+def _located(nodes):
+    # Los nodos con posición de 'nodes' y de todos sus descendientes: los
+    # que tienen lineno, start y end, y los que tienen sólo alguno (como
+    # el ErrorDecl de un error al final del texto)
+    located, partial = [], []
+    stack = list(nodes)
+    push, pop = stack.extend, stack.pop
+    while stack:
+        n = pop()
+        cls = type(n)
+        if cls is list:
+            push(n)
+            continue
+        children = _children.get(cls, _missing)
+        if children is _missing:
+            children = _children[cls] = _child_getter(cls)
+        if children is None:
+            continue
+        if n.start is not None and n.end is not None and n.lineno is not None:
+            located.append(n)
+        elif n.start is not None or n.end is not None or n.lineno is not None:
+            partial.append(n)
+        push(children(n))
+    return located, partial
+
+
+# Clase -> función que retorna los campos de un nodo (None si la clase
+# no es un nodo)
+_children = {}
+_missing = object()
+
+def _child_getter(cls):
+    if not issubclass(cls, Node):
+        return None
+    names = [f.name for f in fields(cls)]
+    if cls is ArrayDecl:
+        # las dimensiones son la misma lista que las de su TypeNode: se
+        # recorren una sola vez
+        names.remove('dims')
+    if len(names) == 1:
+        get = attrgetter(names[0])
+        return lambda n: (get(n),)
+    return attrgetter(*names) if names else lambda n: ()
+
+
+def _shift(tokens, delta, ldelta):
+    # Los tokens de la lista anterior se actualizan en su lugar: copiarlos
+    # costaba más que volver a analizar la parte editada.
+    if ldelta:
+        for tok in tokens:
+            tok.lineno += ldelta
+    if delta:
+        for tok in tokens:
+            tok.index += delta
+            tok.end += delta
+    return tokens
+
+
+# ==========================================================
+# Verificación incremental
+# ==========================================================
+_Checked = namedtuple('_Checked', 'decl slot deps messages lineno start table')
+
+
+def _signature(env, name):
+    # Lo que el checker usa de un símbolo global: su slot, su clase y
+    # su tipo (None si no está definido)
+    decl = env.entries.get(name)
+    if decl is None:
+        return None
+    t = decl.return_type if isinstance(decl, FuncDecl) else decl.type
+    return env.slots[name], type(decl), t.digest
+
+
+class IncrementalChecker:
+    '''
+    Verifica un Program que cambia entre llamadas (normalmente el de un
+    IncrementalParser) reutilizando el resultado de las declaraciones
+    que la edición no pudo afectar.
+
+    De cada declaración se recuerdan los símbolos globales que buscó
+    (ver Symtab.reads) y lo que encontró. Se vuelve a verificar si es
+    un nodo nuevo, si cambió su slot en la tabla global o si alguno de
+    esos símbolos ahora es otro; las demás conservan sus anotaciones y
+    su Symtab, y sus errores se vuelven a reportar (con los números de
+    línea desplazados si la declaración se movió). El resultado es el
+    mismo que el de Check.checker.
+    '''
+    def __init__(self):
+        self.checked = {}       # id(declaración) -> _Checked
+        self.rechecked = 0      # declaraciones verificadas en la última llamada
+
+    def check(self, program):
+        '''
+        Verifica 'program' y retorna la Symtab global.
+        '''
+        checker = Check()
+        env = Symtab('global')
+        checked = {}
+        self.rechecked = 0
+        for decl in program.body:
+            slot = len(env.layout)
+            c = self.checked.get(id(decl))
+            if (c is None or c.decl is not decl or c.slot != slot or
+                    any(_signature(env, name) != sig for name, sig in c.deps)):
+                env.reads = set()
+                with collecting() as found:
+                    decl.accept(checker, env)
+                # el nombre de la propia declaración dependía de lo que
+                # había antes de agregarla
+                deps = [(name, None if env.entries.get(name) is decl else _signature(env, name))
+                        for name in env.reads]
+                env.reads = None
+                table = env.children[-1] if isinstance(decl, FuncDecl) else None
+                c = _Checked(decl, slot, deps, found.records, decl.lineno, decl.start, table)
+                self.rechecked += 1
+            elif isinstance(decl, (VarDecl, ArrayDecl, FuncDecl)):
+                # sus dependencias no cambiaron: se agrega igual que antes
+                try:
+                    env.add(decl.name, decl)
+                except (Symtab.SymbolConflictError, Symtab.SymbolDefinedError):
+                    pass
+                if c.table is not None:
+                    c.table.parent = env
+                    env.children.append(c.table)
+            checked[id(decl)] = c
+
+            moved = decl.lineno - c.lineno if decl.lineno is not None and c.lineno is not None else 0
+            delta = decl.start - c.start if decl.start is not None and c.start is not None else 0
+            report([d.shifted(delta, moved) for d in c.messages] if moved or delta else c.messages)
+        self.checked = checked
+        return env
@@ -2,7 +2,64 @@
 #
 # Analizador Léxico para el lenguaje B-Minor (SLY)
 
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, compress, repeat
+import codecs
+import mmap
+import re
+
 import sly
+from sly.lex import Token
+
+
+# Palabras reservadas (no distinguen mayúsculas de minúsculas)
+keywords = {
+    'array': 'ARRAY',
+    'auto': 'AUTO',
+    'boolean': 'BOOLEAN',
+    'char': 'CHAR',
+    'else': 'ELSE',
+    'false': 'FALSE',
+    'float': 'FLOAT',
+    'for': 'FOR',
+    'function': 'FUNCTION',
+    'if': 'IF',
+    'integer': 'INTEGER',
+    'print': 'PRINT',
+    'return': 'RETURN',
+    'string': 'STRING',
+    'true': 'TRUE',
+    'void': 'VOID',
+    'while': 'WHILE',
+    'do': 'DOWHILE',
+    'switch': 'SWITCH',
+    'case': 'CASE',
+    'default': 'DEFAULT',
+    'break': 'BREAK',
+}
+
+
+def _unescape(raw):
+    try:
+        return bytes(raw, 'utf-8').decode('unicode_escape')
+    except Exception:
+        return raw
+
+def _int_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+def _float_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def _lex_error(lineno, char):
+    return Exception(f"Lexical error at line {lineno}: illegal character '{char}'")
 
 
 class Lexer(sly.Lexer):
@@ -51,33 +108,7 @@ class Lexer(sly.Lexer):
     ID = r'[A-Za-z_]\w*'
 
     def ID(self, t):
-        kw = t.value.lower()
-        keywords = {
-            'array': 'ARRAY',
-            'auto': 'AUTO',
-            'boolean': 'BOOLEAN',
-            'char': 'CHAR',
-            'else': 'ELSE',
-            'false': 'FALSE',
-            'float': 'FLOAT',
-            'for': 'FOR',
-            'function': 'FUNCTION',
-            'if': 'IF',
-            'integer': 'INTEGER',
-            'print': 'PRINT',
-            'return': 'RETURN',
-            'string': 'STRING',
-            'true': 'TRUE',
-            'void': 'VOID',
-            'while': 'WHILE',
-            'do': 'DOWHILE',
-            'switch': 'SWITCH',
-            'case': 'CASE',
-            'default': 'DEFAULT',
-            'break': 'BREAK',
-        }
-        if kw in keywords:
-            t.type = keywords[kw]
+        t.type = keywords.get(t.value.lower(), 'ID')
         return t
 
     # === Operadores multi-caracter ===
@@ -122,36 +153,22 @@ class Lexer(sly.Lexer):
     # === Literales ===
     @_(r'(?:(?:\d+\.\d+|\.\d+)(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+)')
     def FLOAT_LITERAL(self, t):
-        try:
-            t.value = float(t.value)
-        except ValueError:
-            pass
+        t.value = _float_value(t.value)
         return t
 
     @_(r'\d+')
     def INT_LITERAL(self, t):
-        try:
-            t.value = int(t.value)
-        except ValueError:
-            pass
+        t.value = _int_value(t.value)
         return t
 
     @_(r"'([^\\']|\\.)'")
     def CHAR_LITERAL(self, t):
-        raw = t.value[1:-1]
-        try:
-            t.value = bytes(raw, 'utf-8').decode('unicode_escape')
-        except Exception:
-            t.value = raw
+        t.value = _unescape(t.value[1:-1])
         return t
 
     @_(r'"([^\\"]|\\.)*"')
     def STRING_LITERAL(self, t):
-        raw = t.value[1:-1]
-        try:
-            t.value = bytes(raw, 'utf-8').decode('unicode_escape')
-        except Exception:
-            t.value = raw
+        t.value = _unescape(t.value[1:-1])
         return t
     
     @_(r'/\*[^*]*$')
@@ -159,7 +176,312 @@ class Lexer(sly.Lexer):
         return self.error(t)
     
     def error(self, t):
-        raise Exception(f"Lexical error at line {self.lineno}: illegal character '{t.value[0]}'")
+        raise _lex_error(self.lineno, t.value[0])
+
+
+# =====================================================================
+# Modo rápido: flujo de tokens en arreglos paralelos
+# =====================================================================
+# Cada tipo de token se codifica con un entero pequeño. Los literales de
+# un carácter usan el propio carácter como nombre de tipo, igual que sly.
+token_kinds = tuple(sorted(Lexer.tokens)) + tuple(Lexer.literals)
+kind_codes  = { name: code for code, name in enumerate(token_kinds) }
+
+# Expresión maestra equivalente a la que construye sly con las mismas
+# reglas y en el mismo orden, pero con los grupos internos sin captura.
+# Va precedida de los caracteres ignorados y seguida de los literales de
+# un carácter, del final del texto y de un grupo que captura cualquier
+# carácter ilegal. El grupo que coincide indica la regla: se usa para
+# clasificar el texto de cada token (ver _Kinds).
+_ID, _NEWLINE, _COMMENT, _SKIP, _LITERAL, _VALUE, _ERROR = range(-1, -8, -1)
+
+def _build_fast_re():
+    parts = []
+    actions = [None]
+    for name, rule in Lexer._rules:
+        pattern = rule if isinstance(rule, str) else rule.pattern
+        pattern = re.sub(r'(?<!\\)\((?!\?)', '(?:', pattern)
+        parts.append(f'(?P<{name}>{pattern})')
+        if name == 'ID':
+            actions.append(_ID)
+        elif name == 'ignore_newline':
+            actions.append(_NEWLINE)
+        elif name == 'ignore_comment':
+            actions.append(_COMMENT)
+        elif name.startswith('ignore_'):
+            actions.append(_SKIP)
+        elif name in _value_funcs:
+            actions.append(_VALUE)
+        elif name in kind_codes:
+            actions.append(kind_codes[name])
+        else:
+            # FLOAT_ERROR, UNCLOSED_COMMENT
+            actions.append(_ERROR)
+    parts.append(f'(?P<literal>[{re.escape(Lexer.literals)}])')
+    parts.append(r'\Z')
+    parts.append('(?P<error>.)')
+    actions += [_LITERAL, _ERROR]
+    regex = re.compile(f'[{re.escape(Lexer.ignore)}]*(?:' + '|'.join(parts) + ')', Lexer.reflags)
+    return regex, actions
+
+_value_funcs = {
+    'INT_LITERAL'   : _int_value,
+    'FLOAT_LITERAL' : _float_value,
+    'CHAR_LITERAL'  : lambda text: _unescape(text[1:-1]),
+    'STRING_LITERAL': lambda text: _unescape(text[1:-1]),
+}
+_value_kinds = { kind_codes[name]: func for name, func in _value_funcs.items() }
+
+_fast_re, _fast_actions = _build_fast_re()
+_group_names = { index: name for name, index in _fast_re.groupindex.items() }
+
+# Para recorrer el texto, las mismas reglas en dos grupos: lo que se
+# ignora (caracteres, saltos de línea y comentarios) y el token que le
+# sigue. re.split() con esta expresión deja en una lista, sin crear un
+# objeto por coincidencia, cada texto ignorado seguido de su token (el
+# del final del texto es vacío).
+def _build_split_re():
+    skip = [re.escape(c) for c in Lexer.ignore]
+    rules = []
+    for name, rule in Lexer._rules:
+        pattern = rule if isinstance(rule, str) else rule.pattern
+        pattern = re.sub(r'(?<!\\)\((?!\?)', '(?:', pattern)
+        (skip if name.startswith('ignore_') else rules).append(pattern)
+    rules += [f'[{re.escape(Lexer.literals)}]', r'\Z', '.']
+    return re.compile(f"((?:{'|'.join(skip)})*)({'|'.join(rules)})", Lexer.reflags)
+
+_split_re = _build_split_re()
+
+# Código de un token ilegal (fuera de 'token_kinds')
+_BAD = len(token_kinds)
+
+class _Kinds(dict):
+    '''
+    Texto de un token -> su código, calculado la primera vez que aparece
+    cada texto distinto.
+    '''
+    def __missing__(self, text):
+        m = _fast_re.match(text)
+        code = _fast_actions[m.lastindex]
+        if code == _ID:
+            code = kind_codes[keywords.get(text.lower(), 'ID')]
+        elif code == _LITERAL:
+            code = kind_codes[text]
+        elif code == _VALUE:
+            code = kind_codes[_group_names[m.lastindex]]
+        elif code < 0:
+            code = _BAD
+        self[text] = code
+        return code
+
+class TokenArray:
+    '''
+    Flujo de tokens guardado en arreglos paralelos: tipo (código de
+    'token_kinds'), desplazamiento inicial y final en el texto, y número de
+    línea. Los valores de los literales se guardan aparte en 'values' y
+    'vref' indica la posición de cada uno (-1 si el token no tiene valor
+    propio; su valor es el texto que ocupa).
+
+    Los desplazamientos son relativos a 'text'; 'base' es la posición de
+    'text' dentro del archivo completo (distinta de 0 en los bloques que
+    produce scan_stream).
+
+    Si el análisis encuentra un error léxico, los tokens anteriores se
+    conservan y el error queda en 'error'; se lanza al consumir el flujo
+    con tokens(), en el mismo punto en que lo haría Lexer.tokenize.
+    '''
+    def __init__(self, text, base=0):
+        self.text   = text
+        self.base   = base
+        self.kind   = array('B')
+        self.start  = array('I')
+        self.end    = array('I')
+        self.line   = array('I')
+        self.vref   = array('i')
+        self.values = []
+        self.error  = None
+
+    def __len__(self):
+        return len(self.kind)
+
+    def type(self, i):
+        return token_kinds[self.kind[i]]
+
+    def value(self, i):
+        ref = self.vref[i]
+        if ref >= 0:
+            return self.values[ref]
+        return self.text[self.start[i]:self.end[i]]
+
+    def reprs(self):
+        '''
+        El texto de cada token tal como lo muestra repr() de un Token de
+        sly, sin crear los objetos Token. No lanza el error léxico.
+        '''
+        base, text, values = self.base, self.text, self.values
+        for k, s, e, line, ref in zip(self.kind, self.start, self.end, self.line, self.vref):
+            value = values[ref] if ref >= 0 else text[s:e]
+            yield (f'Token(type={_kind_reprs[k]}, value={value!r}, lineno={line}, '
+                   f'index={base + s}, end={base + e})')
+
+    def tokens(self):
+        '''
+        Adaptador para Parser.parse(): genera objetos Token de sly.
+        '''
+        base = self.base
+        for i in range(len(self.kind)):
+            tok = Token()
+            tok.type = token_kinds[self.kind[i]]
+            tok.value = self.value(i)
+            tok.lineno = self.line[i]
+            tok.index = base + self.start[i]
+            tok.end = base + self.end[i]
+            yield tok
+        if self.error:
+            raise self.error
+
+    __iter__ = tokens
+
+
+def scan(text, lineno=1, base=0):
+    '''
+    Analiza el texto completo en modo rápido y retorna un TokenArray.
+    Produce exactamente los mismos tokens que Lexer.tokenize. 'base' es
+    la posición de 'text' si es sólo una parte de un archivo.
+    '''
+    toks = TokenArray(text, base)
+    _scan(toks, text, lineno)
+    return toks
+
+def scan_stream(filename, chunk_size=1 << 20, lineno=1):
+    '''
+    Analiza un archivo sin cargarlo completo en memoria. El archivo se
+    proyecta con mmap y se decodifica por bloques de 'chunk_size' bytes;
+    por cada bloque se genera un TokenArray (con su 'base') en cuanto
+    está listo.
+
+    Un token o comentario que cruza el final de un bloque no se analiza
+    hasta que llega el bloque siguiente, así que la secuencia de tokens
+    (y la numeración de líneas) es la misma que con scan() sobre el
+    texto completo.
+    '''
+    with open(filename, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap no admite archivos vacíos
+            data = b''
+        try:
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            buf, base = '', 0
+            for offset in range(0, len(data) or 1, chunk_size):
+                final = offset + chunk_size >= len(data)
+                buf += decoder.decode(data[offset:offset + chunk_size], final)
+                toks = TokenArray(buf, base)
+                index, lineno = _scan(toks, buf, lineno, final)
+                if len(toks) or toks.error:
+                    yield toks
+                if toks.error:
+                    return
+                buf, base = buf[index:], base + index
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+def tokenize_file(filename, chunk_size=1 << 20):
+    '''
+    Genera los tokens (objetos Token de sly) de un archivo usando
+    scan_stream(). Sirve como entrada de Parser.parse().
+    '''
+    for toks in scan_stream(filename, chunk_size):
+        yield from toks.tokens()
+
+# Cantidad de caracteres que el analizador puede necesitar examinar más
+# allá del final de un token para decidir dónde termina (p.ej. '1.5e+3').
+_LOOKAHEAD = 4
+
+def _scan(toks, text, lineno, final=True):
+    '''
+    Analiza 'text' agregando los tokens a 'toks'. Retorna la posición y
+    la línea donde terminó. Si 'final' es falso, el texto es sólo el
+    comienzo de la entrada: el análisis se detiene antes de cualquier
+    token que el resto de la entrada todavía podría cambiar.
+
+    No hay un ciclo de Python por token: re.split() separa el texto y
+    las posiciones, las líneas y los códigos se calculan sobre las listas
+    resultantes (ver _scan_block). Sólo los tokens con un valor
+    (literales) se recorren uno por uno. El texto se separa por bloques
+    de _BLOCK caracteres, como los de scan_stream, para que esas listas
+    no ocupen más memoria que los propios tokens.
+    '''
+    kinds = _Kinds()
+    index, size = 0, _BLOCK
+    while True:
+        begin, stop = index, index + size
+        last = stop >= len(text)
+        index, lineno = _scan_block(toks, text, index, len(text) if last else stop,
+                                    lineno, final and last, kinds)
+        if last or toks.error:
+            return index, lineno
+        # un token o un comentario más largo que el bloque lo agranda
+        size = _BLOCK if index > begin else size * 2
+
+_BLOCK = 1 << 16
+
+def _scan_block(toks, text, index, stop, lineno, final, kinds):
+    # Analiza text[index:stop] (ver _scan); 'kinds' es un _Kinds
+    parts = _split_re.split(text[index:stop])
+    # [previo, ignorado, token, entre, ignorado, token, ..., resto]
+    skips, words = parts[1::3], parts[2::3]
+    n = len(words)
+    while n and not words[n - 1]:
+        n -= 1                  # el final del texto
+    offsets = list(accumulate(map(len, parts), initial=index))
+    starts, ends = offsets[2:3 * n:3], offsets[3:3 * n + 1:3]
+    lines = list(accumulate(map(str.count, skips, repeat('\n')), initial=lineno))
+    kinds = list(map(kinds.__getitem__, words[:n]))
+    index, lineno = stop, lines[-1]
+
+    if not final:
+        # el primer token que podría cambiar: uno que llega hasta cerca del
+        # final, o un carácter ilegal que puede empezar un literal o un
+        # comentario que sigue en el resto
+        cut = bisect_right(ends, stop - _LOOKAHEAD)
+        for i in compress(range(cut), map(_unsure.__contains__, kinds[:cut])):
+            if kinds[i] == _BAD:
+                unsure = text[starts[i]] in '"\'/'
+            else:
+                unsure = text.startswith('/*', starts[i])
+            if unsure:
+                cut = i
+                break
+        if cut < n:
+            index, lineno, n = starts[cut], lines[cut + 1], cut
+        else:
+            index, lineno = ends[-1] if n else offsets[0], lines[n]
+
+    try:
+        bad = kinds.index(_BAD, 0, n)
+    except ValueError:
+        pass
+    else:
+        toks.error = _lex_error(lines[bad + 1], text[starts[bad]])
+        index, lineno, n = starts[bad], lines[bad + 1], bad
+
+    toks.kind.fromlist(kinds[:n])
+    toks.start.fromlist(starts[:n])
+    toks.end.fromlist(ends[:n])
+    toks.line.fromlist(lines[1:n + 1])
+    vref, values = [-1] * n, toks.values
+    for i in compress(range(n), map(_value_kinds.__contains__, kinds[:n])):
+        vref[i] = len(values)
+        values.append(_value_kinds[kinds[i]](words[i]))
+    toks.vref.fromlist(vref)
+    return index, lineno
+
+_unsure = {_BAD, kind_codes['/']}
+_kind_reprs = [repr(k) for k in token_kinds]
+
 
 def tokenize(txt: str):
     lexer = Lexer()
@@ -172,5 +494,5 @@ if __name__ == '__main__':
     if len(sys.argv) != 3 or sys.argv[1] != "--scan":
         print("usage: python lexer.py --scan filename")
         sys.exit(1)
-    with open(sys.argv[2], encoding='utf-8') as f:
-        tokenize(f.read())
+    for tok in tokenize_file(sys.argv[2]):
+        print(tok)
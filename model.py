@@ -1,105 +1,288 @@
-from dataclasses import dataclass, field
-from multimethod import multimeta, multimethod
-from typing      import List, Union, Optional
+import hashlib
+import weakref
+from dataclasses import dataclass, field, fields
+from types       import GeneratorType
+from typing      import List, Union, Optional, get_args, get_origin
+
+from typesys     import type_code
 
 # =====================================================================
 # Clases Abstractas
 # =====================================================================
-class Visitor(metaclass=multimeta):
+class VisitorMeta(type):
+    '''
+    Metaclase de los visitors. Cada 'def visit(self, n: Clase, ...)' del
+    cuerpo de la clase es el método para esa clase de nodo (o para cada
+    una de un Union; sin anotación, para cualquier objeto). Al crear la
+    clase se arma una tabla clase de nodo -> método, con los métodos
+    heredados y, para cada clase sin método propio, el de su ancestro
+    más cercano. visit(n) y n.accept(v) buscan type(n) en esa tabla.
+
+    A diferencia de multimethod, sólo se despacha por el tipo del nodo,
+    no por el de los demás argumentos.
+
+    Un método visit puede ser un generador: en lugar de llamar a
+    hijo.accept(self, ...) hace 'resultado = yield hijo' y los nodos se
+    recorren con una pila explícita (ver _run), sin importar la
+    profundidad del árbol.
+    '''
+    @classmethod
+    def __prepare__(mcls, name, bases):
+        return _VisitNamespace()
+
+    def __new__(mcls, name, bases, ns):
+        cls = super().__new__(mcls, name, bases, dict(ns))
+        handlers = {}
+        for base in reversed(cls.__mro__[1:]):
+            handlers.update(getattr(base, '_visit_handlers', {}))
+        for func in ns.handlers:
+            for t in _node_types(func):
+                handlers[t] = func
+        cls._visit_handlers = handlers
+        cls._visit_table = table = _DispatchTable(cls)
+        if handlers:
+            classes = [Node]
+            for c in classes:
+                classes.extend(c.__subclasses__())
+                if any(h in handlers for h in c.__mro__):
+                    table[c]
+        return cls
+
+
+class _VisitNamespace(dict):
+    # Junta las definiciones de 'visit' en lugar de quedarse con la última
+    def __init__(self):
+        super().__init__()
+        self.handlers = []
+
+    def __setitem__(self, key, value):
+        if key == 'visit' and callable(value):
+            self.handlers.append(value)
+        else:
+            super().__setitem__(key, value)
+
+
+class _DispatchTable(dict):
+    # Una clase que no está en la tabla se resuelve (y se agrega) con el
+    # método de su ancestro más cercano
+    def __init__(self, visitor):
+        super().__init__()
+        self.visitor = visitor
+
+    def __missing__(self, cls):
+        handlers = self.visitor._visit_handlers
+        for c in cls.__mro__:
+            if c in handlers:
+                self[cls] = handlers[c]
+                return handlers[c]
+        raise TypeError(f"{self.visitor.__name__} no tiene visit para {cls.__name__}")
+
+
+def _node_types(func):
+    code = func.__code__
+    if code.co_argcount < 2:
+        raise TypeError(f"{func.__qualname__} debe recibir el nodo")
+    t = func.__annotations__.get(code.co_varnames[1], object)
+    if isinstance(t, str):
+        t = eval(t, func.__globals__)
+    return get_args(t) if get_origin(t) is Union else (t,)
+
+
+class Visitor(metaclass=VisitorMeta):
     pass
 
-@dataclass
+def _visit(self, n, *args, **kwargs):
+    r = self._visit_table[type(n)](self, n, *args, **kwargs)
+    return _run(self, r, args, kwargs) if type(r) is GeneratorType else r
+
+Visitor.visit = _visit
+
+
+def _run(visitor, gen, args, kwargs):
+    '''
+    Ejecuta el generador de un método visit. Cada valor que entrega es:
+
+        nodo               se visita con los mismos argumentos
+        (nodo, *args)      se visita con otros argumentos
+        [nodo, ...]        se visita cada elemento (o sublista)
+        None               no se visita nada
+
+    y el resultado de la visita (una lista de resultados para una lista)
+    vuelve como valor del yield. Los generadores pendientes se guardan en
+    una pila propia, no en la de Python; una excepción sube por esa pila
+    como lo haría entre llamadas.
+    '''
+    table = visitor._visit_table
+    stack = [(gen, args)]
+    value = exc = None
+    while stack:
+        gen, args = stack[-1]
+        try:
+            item = gen.send(value) if exc is None else gen.throw(exc)
+        except StopIteration as e:
+            stack.pop()
+            value = e.value
+            exc = None
+            continue
+        except BaseException as e:
+            stack.pop()
+            if not stack:
+                raise
+            exc = e
+            continue
+        value = None
+        if type(item) is tuple:
+            item, *args = item
+        try:
+            if type(item) is list:
+                r = _each(item)
+            elif item is None:
+                continue
+            else:
+                r = table[type(item)](visitor, item, *args, **kwargs)
+        except BaseException as e:
+            exc = e
+            continue
+        if type(r) is GeneratorType:
+            stack.append((r, args))
+        else:
+            value = r
+    return value
+
+
+def _each(items):
+    results = []
+    for item in items:
+        results.append((yield item))
+    return results
+
 class Node:
-    def accept(self, v: Visitor, *args, **kwargs):
-        return v.visit(self, *args, **kwargs)
+    '''
+    Todos los nodos son dataclasses con __slots__: no tienen __dict__ por
+    instancia. Los atributos que no son campos se declaran aquí: 'lineno',
+    'start' y 'end' (los asigna el parser: la línea y las posiciones en el
+    código fuente del primer carácter del nodo y del siguiente al último)
+    y 'type' y 'addr' (los asigna el checker: 'addr' es la dirección
+    léxica, ver symtab.Symtab). Mientras no se asignen valen None.
+    '_digest' guarda el hash estructural (ver Node.digest).
+
+    Los literales y los tipos canónicos (ver intern) no tienen 'lineno',
+    'start' ni 'end': un error se reporta en el nodo que los contiene.
+    '''
+    __slots__ = ('lineno', 'start', 'end', 'type', 'addr', '_digest')
+
+    def __getattr__(self, name):
+        # sólo se llama si el atributo no existe o el slot está vacío
+        if name in Node.__slots__:
+            return None
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
 
-@dataclass
+    def accept(self, v: Visitor, *args, **kwargs):
+        r = v._visit_table[type(self)](v, self, *args, **kwargs)
+        return _run(v, r, args, kwargs) if type(r) is GeneratorType else r
+
+    @property
+    def digest(self):
+        '''
+        Hash estructural del subárbol (ver structural_hash). Se calcula
+        una vez y queda guardado en el nodo.
+        '''
+        d = self._digest
+        return structural_hash(self) if d is None else d
+
+@dataclass(slots=True)
 class Statement(Node):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class Expression(Node):
     pass
 
 # =====================================================================
 # Definiciones
 # =====================================================================
-@dataclass
+@dataclass(slots=True)
 class Program(Statement):
     body: List[Statement] = field(default_factory=list)
 
 # ------------------ Declaraciones ------------------
-@dataclass
+@dataclass(slots=True)
 class Declaration(Statement):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class VarDecl(Declaration):
     name : str
     type : Expression
     value: Optional[Expression] = None
 
-@dataclass
+@dataclass(slots=True)
 class ArrayDecl(Declaration):
     name  : str
     type  : Expression
     dims  : List[int]  # dimensiones del arreglo (ej. [3], [3,4])
     value : Optional[List[Expression]] = None
 
-@dataclass
+@dataclass(slots=True)
 class FuncDecl(Declaration):
     name   : str
     return_type: Expression
     params : List["Param"]
     body   : List[Statement] = field(default_factory=list)
 
+# Declaración o sentencia descartada por un error de sintaxis
+@dataclass(slots=True)
+class ErrorDecl(Declaration):
+    message: str = ''
+    lineno : Optional[int] = None
+
 # ------------------ Parámetros ------------------
-@dataclass
+@dataclass(slots=True)
 class Param(Node):
     name: str
     type: Expression
 
-@dataclass
+@dataclass(slots=True)
 class VarParm(Param):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class ArrayParm(Param):
     dims: List[int] = field(default_factory=list)
 
 # ------------------ Sentencias ------------------
-@dataclass
+@dataclass(slots=True)
 class IfStmt(Statement):
     cond : Expression
     then : List[Statement]
     else_ : Optional[List[Statement]] = None
 
-@dataclass
+@dataclass(slots=True)
 class ReturnStmt(Statement):
     value: Optional[Expression] = None
 
-@dataclass
+@dataclass(slots=True)
 class PrintStmt(Statement):
     value: Expression
 
-@dataclass
+@dataclass(slots=True)
 class ForStmt(Statement):
     init : Statement
     cond : Expression
     step : Statement
     body : List[Statement]
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt(Statement):
     cond : Expression
     body : List[Statement]
 
-@dataclass
+@dataclass(slots=True)
 class DoWhileStmt(Statement):
     body : List[Statement]
     cond : Expression
 
-@dataclass
+@dataclass(slots=True)
 class Assignment(Statement):
     target: "Location"
     value : Expression
@@ -107,89 +290,218 @@ class Assignment(Statement):
 # =====================================================================
 # Expresiones
 # =====================================================================
-@dataclass
+@dataclass(slots=True)
 class BinOper(Expression):
     oper : str
     left : Expression
     right: Expression
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOper(Expression):
     oper : str
     expr : Expression
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Literal(Expression):
     value : Union[int, float, str, bool]
-    type  : str = None
+    type  : int = None      # código del tipo (ver typesys), lo fija la clase
 
-@dataclass
+@dataclass(slots=True)
 class Integer(Literal):
     value : int
     def __post_init__(self):
         assert isinstance(self.value, int), "Value debe ser un 'integer'"
-        self.type = 'integer'
+        self.type = type_code('integer')
 
-@dataclass
+@dataclass(slots=True)
 class Float(Literal):
     value : float
     def __post_init__(self):
         assert isinstance(self.value, float), "Value debe ser un 'float'"
-        self.type = 'float'
+        self.type = type_code('float')
 
-@dataclass
+@dataclass(slots=True)
 class Boolean(Literal):
     value : bool
     def __post_init__(self):
         assert isinstance(self.value, bool), "Value debe ser un 'boolean'"
-        self.type = 'boolean'
+        self.type = type_code('boolean')
 
-@dataclass
+@dataclass(slots=True)
 class Char(Literal):
     value : str
     def __post_init__(self):
         assert isinstance(self.value, str) and len(self.value) == 1, "Value debe ser un 'char'"
-        self.type = 'char'
+        self.type = type_code('char')
 
-@dataclass
+@dataclass(slots=True)
 class String(Literal):
     value : str
     def __post_init__(self):
         assert isinstance(self.value, str), "Value debe ser un 'string'"
-        self.type = 'string'
+        self.type = type_code('string')
 
-@dataclass
+@dataclass(slots=True)
 class Increment(Expression):
     target: "Location"
     prefix: bool = True  # True = ++i, False = i++
 
-@dataclass
+@dataclass(slots=True)
 class Decrement(Expression):
     target: "Location"
     prefix: bool = True  # True = --i, False = i--
 
-@dataclass
+@dataclass(slots=True)
 class FuncCall(Expression):
     name: str
     args: List[Expression] = field(default_factory=list)
 
 # ------------------ Ubicaciones ------------------
-@dataclass
+@dataclass(slots=True)
 class Location(Expression):
     mode: str  # "load" o "store"
 
-@dataclass
+@dataclass(slots=True)
 class VarLoc(Location):
     name: str
 
-@dataclass
+@dataclass(slots=True)
 class ArrayLoc(Location):
     name : str
     index: List[Expression]
 
 # ------------------ Tipos ------------------
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class TypeNode(Expression):
     name: str
     dims: List[int] = field(default_factory=list)
 
+# =====================================================================
+# Nodos canónicos
+# =====================================================================
+# Los literales y los tipos son inmutables: el parser usa una sola
+# instancia para todos los iguales, así que dos tipos son iguales si y
+# sólo si son el mismo objeto. Las instancias canónicas se comparten
+# entre declaraciones, por eso no tienen línea ni posiciones propias
+# (las tiene el nodo que las contiene) y no se deben modificar.
+#
+# Sin posiciones quedan todos los literales (Integer, Float, Boolean,
+# Char, String), los que produce el plegado de constantes (ver
+# optimize.py) y los TypeNode, salvo los de un arreglo cuyo tamaño no
+# es un literal. Ningún error se reporta en uno de ellos: el checker
+# reporta en la declaración, la sentencia o la operación que lo
+# contiene, y el parser en el token.
+_interned = weakref.WeakValueDictionary()
+
+def _intern_key(node):
+    cls = type(node)
+    if cls is TypeNode:
+        # un arreglo cuyo tamaño no es un literal no es canónico
+        dims = tuple(_intern_key(d) if isinstance(d, Literal) else None for d in node.dims)
+        return None if None in dims else (cls, node.name, dims)
+    if isinstance(node, Literal):
+        # Float.hex() distingue 0.0 de -0.0
+        value = node.value.hex() if cls is Float else node.value
+        return (cls, value, node.type)
+    return None
+
+def intern(node):
+    '''
+    Retorna la instancia canónica igual a 'node' (el mismo 'node' si es
+    la primera, o si no es un literal ni un tipo canónico).
+    '''
+    key = _intern_key(node)
+    if key is None:
+        return node
+    canon = _interned.get(key)
+    if canon is None:
+        if type(node) is TypeNode:
+            node.dims = [intern(d) for d in node.dims]
+        node.lineno = node.start = node.end = None
+        _interned[key] = canon = node
+    return canon
+
+def type_node(name):
+    '''
+    El TypeNode canónico del tipo simple 'name'.
+    '''
+    return intern(TypeNode(name=name))
+
+def _reduce_ex(self, protocol):
+    # pickle y copy: una instancia canónica vuelve a ser la canónica
+    if _interned.get(_intern_key(self)) is self:
+        return (intern, (type(self)(**{f: getattr(self, f) for f in self.__dataclass_fields__}),))
+    return object.__reduce_ex__(self, protocol)
+
+Literal.__reduce_ex__ = TypeNode.__reduce_ex__ = _reduce_ex
+
+
+# =====================================================================
+# Hash estructural
+# =====================================================================
+# El hash de un nodo (un árbol de Merkle) se calcula a partir de su clase,
+# de sus campos que no son nodos y de los hashes de sus hijos, de las
+# hojas hacia la raíz. No depende de las líneas ni de las posiciones, ni
+# de lo que agregue el checker, así que una función que sólo se movió en
+# el archivo tiene el mismo hash. Es un blake2b, no hash(): es el mismo
+# en cualquier proceso y en cualquier ejecución.
+#
+# Cada nodo guarda su hash la primera vez que se calcula; si después se
+# modifica el árbol en el lugar hay que borrar (_digest = None) el de
+# los nodos modificados y el de sus ancestros, como hacen
+# traversal.transform e IncrementalParser.edit.
+_hashed_fields = {}
+
+def _field_names(cls):
+    names = _hashed_fields.get(cls)
+    if names is None:
+        # el lineno de ErrorDecl es un campo, pero tampoco cuenta
+        names = _hashed_fields[cls] = tuple(f.name for f in fields(cls) if f.name != 'lineno')
+    return names
+
+def structural_hash(value):
+    '''
+    Hash estructural (16 bytes) de un nodo o de una lista de nodos (por
+    ejemplo, el cuerpo de una función). Dos árboles con el mismo hash
+    son iguales salvo por sus posiciones. Se calcula sin recursión.
+    '''
+    lists = {}          # id(lista) -> hash; las listas no lo guardan
+    stack = [(value, False)]
+    while stack:
+        obj, expanded = stack.pop()
+        if type(obj) is list:
+            if id(obj) in lists:
+                continue
+            items = obj
+        else:
+            if obj._digest is not None:
+                continue
+            items = [getattr(obj, name) for name in _field_names(type(obj))]
+        if not expanded:
+            stack.append((obj, True))
+            stack.extend((v, False) for v in items if isinstance(v, (Node, list)))
+            continue
+        h = hashlib.blake2b(b'list' if type(obj) is list else type(obj).__name__.encode(),
+                            digest_size=16)
+        h.update(b'%d;' % len(items))
+        for v in items:
+            if isinstance(v, Node):
+                h.update(b'n' + v._digest)
+            elif type(v) is list:
+                h.update(b'n' + lists[id(v)])
+            elif v is None:
+                h.update(b'0')
+            elif isinstance(v, bool):
+                h.update(b't' if v else b'f')
+            elif isinstance(v, int):
+                h.update(b'i%d;' % v)
+            elif isinstance(v, float):
+                h.update(b'd' + v.hex().encode() + b';')
+            else:
+                data = str(v).encode('utf-8')
+                h.update(b's%d:' % len(data) + data)
+        if type(obj) is list:
+            lists[id(obj)] = h.digest()
+        else:
+            obj._digest = h.digest()
+    return lists[id(value)] if type(value) is list else value._digest
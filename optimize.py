@@ -0,0 +1,278 @@
+# optimize.py
+'''
+Optimizaciones del AST, entre el checker y la ejecución. Trabajan sobre
+un programa sin errores, usan a qué declaración se resolvió cada nombre
+(ver Check.refs) y modifican el árbol en el lugar.
+
+Plegado y propagación de constantes (fold_constants):
+
+    - un BinOper o UnaryOper cuyos operandos son literales se reemplaza
+      por el literal de su resultado
+    - una variable (VarDecl) con un valor inicial literal que nunca se
+      vuelve a asignar (ni con =, ni con ++ o --) es una constante: cada
+      uso se reemplaza por su valor
+    - un if, while, do-while o for con una condición constante se
+      reemplaza por la rama que se ejecuta (un bloque) o por nada
+
+Los resultados son los de la ejecución (ver interp.py): enteros de
+Python sin límite, '/' entre enteros es la división entera (//) y '%'
+el resto de Python. Sólo se pliega una operación que typesys permite
+para esos tipos. Una división por cero no se pliega: el error queda
+para la ejecución.
+
+Eliminación de código muerto (eliminate_dead_code):
+
+    - a partir de main se recorre el grafo de usos (llamadas y
+      variables) entre las declaraciones globales; las funciones,
+      variables y arreglos a los que no se llega se eliminan
+    - en las funciones que quedan se eliminan las sentencias después
+      de un return (o de un if cuyas dos ramas retornan) y las ramas
+      que una condición constante hace muertas
+
+Como este paso reduce lo que hay que verificar, puede correr antes que
+el checker, resolviendo los nombres sólo por nombre.
+'''
+import operator
+
+from errors    import collecting
+from model     import *
+from traversal import preorder, transform
+from typesys   import binop, unaryop, op_codes, type_name
+
+
+# El literal de cada tipo de resultado
+_literal_class = {'integer': Integer, 'float': Float, 'boolean': Boolean,
+                  'char': Char, 'string': String}
+
+_binary = {
+    '+':  operator.add,
+    '-':  operator.sub,
+    '*':  operator.mul,
+    '/':  lambda a, b: a // b if isinstance(a, int) and isinstance(b, int) else a / b,
+    '%':  operator.mod,
+    '<':  operator.lt,
+    '<=': operator.le,
+    '>':  operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '&&': lambda a, b: a and b,
+    '||': lambda a, b: a or b,
+}
+
+# '^' no tiene una semántica definida en la ejecución: no se pliega
+_unary = {
+    '+': operator.pos,
+    '-': operator.neg,
+    '!': operator.not_,
+}
+
+
+def fold_binop(oper, left, right):
+    '''
+    El literal de 'left oper right' (dos literales), o None si no se
+    puede plegar.
+    '''
+    func = _binary.get(oper)
+    if func is None:
+        return None
+    result = type_name(binop(op_codes[oper], left.type, right.type))
+    if result is None:
+        return None
+    if oper in ('/', '%') and right.value == 0:
+        return None
+    return intern(_literal_class[result](func(left.value, right.value)))
+
+def fold_unaryop(oper, operand):
+    '''
+    El literal de 'oper operand', o None si no se puede plegar.
+    '''
+    func = _unary.get(oper)
+    if func is None:
+        return None
+    result = type_name(unaryop(op_codes[oper], operand.type))
+    if result is None:
+        return None
+    return intern(_literal_class[result](func(operand.value)))
+
+
+def fold_constants(program, refs=None):
+    '''
+    Pliega y propaga las constantes de 'program' (ver arriba). 'refs'
+    son los usos de los nombres que registró Check.checker; si no se dan,
+    se verifica el programa para obtenerlos. Retorna el programa.
+    '''
+    if refs is None:
+        from checker import Check
+        refs = []
+        with collecting():
+            Check.checker(program, refs)
+
+    resolved = {id(n): decl for n, decl in refs}
+    # declaraciones que se vuelven a asignar
+    assigned = {id(decl) for n, decl in refs if isinstance(n, Location) and n.mode == 'store'}
+    for n in preorder(program):
+        if isinstance(n, (Increment, Decrement)):
+            assigned.add(id(resolved.get(id(n.target))))
+    consts = {}             # id(VarDecl) -> su valor literal
+
+    def fold(n):
+        cls = type(n)
+        if cls is VarLoc:
+            if n.mode == 'load':
+                value = consts.get(id(resolved.get(id(n))))
+                if value is not None:
+                    return value
+        elif cls is BinOper:
+            if isinstance(n.left, Literal) and isinstance(n.right, Literal):
+                return fold_binop(n.oper, n.left, n.right) or n
+        elif cls is UnaryOper:
+            if isinstance(n.expr, Literal):
+                return fold_unaryop(n.oper, n.expr) or n
+        elif cls is VarDecl:
+            if isinstance(n.value, Literal) and id(n) not in assigned:
+                consts[id(n)] = n.value
+        elif cls is TypeNode:
+            # un arreglo de tamaño constante vuelve a ser canónico
+            return intern(n)
+        elif cls in _conditional:
+            branch = constant_branch(n)
+            if branch is not None:
+                return branch
+        return n
+
+    return transform(program, fold)
+
+
+_conditional = (IfStmt, WhileStmt, DoWhileStmt, ForStmt)
+
+def constant_branch(n):
+    '''
+    Si la condición del if o del ciclo 'n' es un literal, el bloque
+    (una lista, posiblemente vacía) que lo reemplaza; si no, None.
+    '''
+    if type(n.cond) is not Boolean:
+        return None
+    cls = type(n)
+    if cls is IfStmt:
+        return n.then if n.cond.value else n.else_ or []
+    if n.cond.value:
+        return None             # un ciclo infinito se queda
+    if cls is WhileStmt:
+        return []
+    if cls is DoWhileStmt:
+        return n.body
+    return [n.init] if n.init is not None else []
+
+
+def eliminate_dead_code(program, refs=None, roots=('main',)):
+    '''
+    Elimina de 'program' lo que nunca se ejecuta (ver arriba) y retorna
+    la lista de los nodos eliminados: declaraciones, sentencias después
+    de un return y sentencias con una condición constante (éstas se
+    reemplazan por la rama que se ejecuta).
+
+    Con 'refs' (los usos que registró Check.checker) cada nombre va a la
+    declaración a la que se resolvió. Sin 'refs' no hace falta verificar
+    el programa: un uso de un nombre alcanza a todas las declaraciones
+    globales con ese nombre, aunque lo oculte una variable local (se
+    conserva de más, nunca de menos).
+    '''
+    body = program.body
+    decls = [d for d in body if isinstance(d, (VarDecl, ArrayDecl, FuncDecl))]
+    if refs is not None:
+        resolved = {id(n): decl for n, decl in refs}
+        def used(n):
+            decl = resolved.get(id(n))
+            return (decl,) if decl is not None else ()
+    else:
+        by_name = {}
+        for d in decls:
+            by_name.setdefault(d.name, []).append(d)
+        def used(n):
+            return by_name.get(n.name, ())
+
+    # Las raíces son las funciones de 'roots' y las variables globales
+    # cuyo valor inicial llama a una función (puede tener efectos). Sólo
+    # se recorren las declaraciones a las que se llega.
+    stack = [d for d in decls
+             if (d.name in roots if isinstance(d, FuncDecl) else
+                 any(type(n) is FuncCall for n in preorder(d.value or [])))]
+    reached = {}            # id(declaración) -> declaración
+    removed = []
+    if stack:
+        while stack:
+            d = stack.pop()
+            if id(d) not in reached:
+                reached[id(d)] = d
+                stack.extend(u for n in preorder(d) if type(n) in _uses
+                             for u in used(n) if id(u) not in reached)
+        removed = [d for d in decls if id(d) not in reached]
+        dead = {id(d) for d in removed}
+        body[:] = [d for d in body if id(d) not in dead]
+    # sin ninguna raíz (una biblioteca, sin main) se conservan todas
+
+    prune = _Prune(removed)
+    for d in body:
+        if isinstance(d, FuncDecl) and d.body:
+            prune.visit(d)
+    program._digest = None
+    return removed
+
+
+_uses = (VarLoc, ArrayLoc, FuncCall)
+
+
+class _Prune(Visitor):
+    '''
+    Quita las sentencias que no se ejecutan de los cuerpos de las
+    funciones. Cada visit retorna True si la sentencia siempre termina
+    en un return (lo que sigue en su bloque no se ejecuta).
+    '''
+    def __init__(self, removed):
+        self.removed = removed
+
+    def block(self, stmts):
+        kept = []
+        returns = False
+        for i, stmt in enumerate(stmts):
+            if type(stmt) in _conditional:
+                branch = constant_branch(stmt)
+                if branch is not None:
+                    self.removed.append(stmt)
+                    stmt = branch
+            kept.append(stmt)
+            if isinstance(stmt, list):
+                returns = yield from self.block(stmt)
+            else:
+                returns = yield stmt
+                stmt._digest = None
+            if returns:
+                self.removed.extend(stmts[i + 1:])
+                break
+        stmts[:] = kept
+        return returns
+
+    def visit(self, n: FuncDecl):
+        n._digest = None
+        return (yield from self.block(n.body))
+
+    def visit(self, n: ReturnStmt):
+        return True
+
+    def visit(self, n: IfStmt):
+        then = yield from self.block(n.then)
+        else_ = yield from self.block(n.else_ or [])
+        return then and else_ and n.else_ is not None
+
+    def visit(self, n: Union[WhileStmt, ForStmt]):
+        # el cuerpo puede no ejecutarse
+        yield from self.block(n.body)
+        return False
+
+    def visit(self, n: DoWhileStmt):
+        return (yield from self.block(n.body))
+
+    def visit(self, n):
+        # expresiones, print y declaraciones locales
+        return False
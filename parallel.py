@@ -0,0 +1,281 @@
+# parallel.py
+'''
+Front-end en paralelo para archivos grandes.
+
+Las declaraciones de nivel superior de B-Minor se pueden separar sin
+analizar la gramática: basta con seguir la profundidad de llaves sobre
+el flujo de tokens (ver parser.decl_ends). El texto se divide en partes
+con varias declaraciones completas cada una, y cada parte se analiza
+(lexer y parser) en un proceso de un pool que se conserva entre
+llamadas. Los Program parciales se unen en uno solo.
+
+La verificación de tipos se reparte igual (check_parallel): primero se
+arma la Symtab global en el proceso principal y luego las funciones se
+verifican en procesos creados para eso, que devuelven las anotaciones
+de cada función y su Symtab.
+'''
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from checker import Check
+from errors  import collecting, report
+from lexer   import scan, token_kinds
+from model   import FuncDecl, Node, Program
+from parser  import Parser, decl_ends, parse
+from symtab  import Symtab
+from traversal import preorder
+
+
+# Partes por proceso: más de una para repartir mejor la carga cuando las
+# declaraciones tienen tamaños muy distintos
+PARTS_PER_WORKER = 4
+
+_parser = None          # Parser de cada proceso del pool
+_pool = None
+_pool_workers = 0
+
+
+def _init_worker():
+    # Al importar parser las tablas LALR se cargan una sola vez (de la
+    # caché en disco, o heredadas del proceso principal con fork); el
+    # mismo Parser atiende todas las partes que recibe el proceso.
+    global _parser
+    _parser = Parser()
+
+
+def _parse_part(text, base, lineno):
+    '''
+    Analiza una parte del archivo que empieza en la posición 'base' y en
+    la línea 'lineno'. Retorna las declaraciones y la cantidad de errores
+    de sintaxis (los mensajes no se muestran; ver parse_parallel).
+    '''
+    with collecting():
+        prog = _parser.parse(scan(text, lineno, base).tokens())
+    return prog.body, len(_parser.errors)
+
+
+def get_pool(workers=None):
+    '''
+    Retorna el pool de procesos, creándolo la primera vez (o si cambia
+    la cantidad de procesos pedida).
+    '''
+    global _pool, _pool_workers
+    workers = workers or os.cpu_count() or 1
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(workers, initializer=_init_worker)
+        _pool_workers = workers
+    return _pool
+
+
+def split_parts(toks, nparts):
+    '''
+    Agrupa las declaraciones de nivel superior del TokenArray 'toks' en
+    a lo sumo 'nparts' rangos contiguos de tokens de tamaño parecido (en
+    caracteres). Retorna una lista de pares (primer token, último + 1).
+    '''
+    if not len(toks):
+        return []
+    start, end = toks.start, toks.end
+    target = (end[-1] - start[0]) / nparts
+    parts = []
+    first = 0
+    for n in decl_ends(map(token_kinds.__getitem__, toks.kind)):
+        if end[n - 1] - start[first] >= target:
+            parts.append((first, n))
+            first = n
+    if first < len(toks):
+        parts.append((first, len(toks)))
+    return parts
+
+
+def parse_parallel(txt, workers=None):
+    '''
+    Igual que parser.parse(txt), repartiendo el trabajo entre 'workers'
+    procesos (por omisión, uno por CPU).
+
+    Si el texto tiene errores léxicos o de sintaxis se vuelve a analizar
+    completo con parse(): la recuperación de errores puede cruzar los
+    límites entre partes, y así los mensajes y el resultado son siempre
+    los del análisis secuencial.
+    '''
+    workers = workers or os.cpu_count() or 1
+    toks = scan(txt)
+    parts = split_parts(toks, workers * PARTS_PER_WORKER)
+    if toks.error or workers == 1 or len(parts) < 2:
+        return parse(txt)
+
+    pool = get_pool(workers)
+    start, end, line = toks.start, toks.end, toks.line
+    futures = [pool.submit(_parse_part, txt[start[a]:end[b - 1]], start[a], line[a])
+               for a, b in parts]
+    body = []
+    for future in futures:
+        decls, nerrors = future.result()
+        if nerrors:
+            for f in futures:
+                f.cancel()
+            return parse(txt)
+        body.extend(decls)
+    return Program(body)
+
+
+# ==========================================================
+# Verificación de tipos
+# ==========================================================
+# Los procesos de check_parallel se crean con fork después de la fase
+# uno: heredan el programa y la Symtab global sin copiarlos por pickle
+# (enviar el AST cuesta varias veces más que verificarlo).
+_program = None
+_globals = None
+
+
+def _check_part(funcs):
+    '''
+    Verifica las funciones de 'funcs', pares (k, i): la declaración i
+    del programa se ve con los primeros k símbolos globales, los que
+    estaban declarados antes que ella. Retorna, para cada una, sus
+    errores y sus anotaciones (ver _annotations).
+    '''
+    checker = Check()
+    env = Symtab('global')
+    results = []
+    for k, i in funcs:
+        # las funciones vienen en orden: se saca la anterior (si se
+        # agregó) y se agregan los símbolos que faltan
+        while len(env.layout) > k:
+            name = env.layout.pop().name
+            del env.entries[name], env.slots[name]
+        for decl in _globals.layout[len(env.layout):k]:
+            env.add(decl.name, decl)
+        func = _program.body[i]
+        with collecting() as found:
+            func.accept(checker, env)
+        results.append((found.records, _annotations(func, env.children[-1])))
+    return results
+
+
+def _annotations(func, table):
+    '''
+    Lo que el checker dejó en la función 'func' y en su Symtab 'table',
+    sin nodos (enviarlos por pickle crearía copias): los nodos se
+    nombran por su posición en preorder(func), que es la misma en el
+    proceso principal. Retorna (tipos, direcciones, tablas); cada tabla
+    es (padre, nombre, block, [(símbolo, nodo, slot)], marco), con el
+    padre como posición en la lista (-1: la global).
+    '''
+    nodes = list(preorder(func))
+    index = {}
+    for j, n in enumerate(nodes):
+        index.setdefault(id(n), j)
+    # el campo 'type' de una declaración es su TypeNode, no una anotación
+    types = [None if isinstance(n.type, Node) else n.type for n in nodes]
+    addrs = [n.addr for n in nodes]
+    tables = []
+    stack = [(-1, table)]
+    while stack:
+        parent, t = stack.pop()
+        entries = [(name, index[id(value)], t.slots[name]) for name, value in t.entries.items()]
+        frame = None if t.block else [index[id(value)] for value in t.layout]
+        stack.extend((len(tables), c) for c in reversed(t.children))
+        tables.append((parent, t.name, t.block, entries, frame))
+    return types, addrs, tables
+
+
+def _merge(func, env, annotations):
+    '''
+    Copia en 'func' las anotaciones de _annotations y agrega su Symtab
+    como hija de 'env', como si se hubiera verificado aquí.
+    '''
+    types, addrs, tables = annotations
+    nodes = list(preorder(func))
+    for n, t, a in zip(nodes, types, addrs):
+        if not isinstance(n.type, Node):
+            n.type = t
+        n.addr = a
+    made = []
+    for parent, name, block, entries, frame in tables:
+        table = Symtab(name, made[parent] if parent >= 0 else env, block)
+        for key, j, slot in entries:
+            table.entries[key] = nodes[j]
+            table.slots[key] = slot
+        if frame is not None:
+            table.layout[:] = [nodes[j] for j in frame]
+        made.append(table)
+
+
+def check_parallel(program, workers=None):
+    '''
+    Verifica 'program' como Check.checker, con los cuerpos de las
+    funciones repartidos entre 'workers' procesos (por omisión, uno por
+    CPU).
+
+    1. Se arma la Symtab global, en orden, verificando aquí todo lo que
+       no es una función.
+    2. Cada función se verifica en un proceso con los símbolos globales
+       declarados antes que ella, como en la verificación secuencial.
+
+    Los errores se reportan al final, en el orden del archivo: son los
+    mismos mensajes, en el mismo orden, que los de Check.checker. Las
+    anotaciones de los cuerpos de las funciones (n.type, n.addr) y sus
+    Symtab vuelven de los procesos: el programa queda anotado y se
+    retorna la Symtab global, con las de las funciones como hijas, igual
+    que con Check.checker.
+
+    Sin fork (o con un solo proceso) se usa Check.checker.
+    '''
+    global _program, _globals
+    workers = workers or os.cpu_count() or 1
+    nfuncs = sum(isinstance(d, FuncDecl) for d in program.body)
+    if workers == 1 or nfuncs < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return Check.checker(program)
+
+    checker = Check()
+    env = Symtab('global')
+    messages = []           # errores de cada declaración (None: función)
+    funcs = []              # (k, i)
+    for i, decl in enumerate(program.body):
+        if isinstance(decl, FuncDecl):
+            funcs.append((len(env.layout), i))
+            messages.append(None)
+            # los errores de esta declaración los reporta su proceso
+            decl.addr = None
+            with collecting():
+                try:
+                    env.add(decl.name, decl)
+                    decl.addr = (0, env.slots[decl.name])
+                except (Symtab.SymbolConflictError, Symtab.SymbolDefinedError):
+                    pass
+        else:
+            with collecting() as found:
+                decl.accept(checker, env)
+            messages.append(found.records)
+
+    # partes contiguas de tamaño parecido (en caracteres, si hay posiciones)
+    body = program.body
+    sizes = [body[i].end - body[i].start if body[i].start is not None else 1 for _, i in funcs]
+    target = sum(sizes) / min(nfuncs, workers * PARTS_PER_WORKER)
+    parts, part, size = [], [], 0
+    for item, s in zip(funcs, sizes):
+        part.append(item)
+        size += s
+        if size >= target:
+            parts.append(part)
+            part, size = [], 0
+    if part:
+        parts.append(part)
+
+    _program, _globals = program, env
+    try:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = iter([r for found in pool.map(_check_part, parts) for r in found])
+    finally:
+        _program = _globals = None
+    for decl, found in zip(body, messages):
+        if found is None:
+            found, annotations = next(results)
+            _merge(decl, env, annotations)
+        report(found)
+    return env
@@ -1,25 +1,130 @@
 # parser.py
+import hashlib
 import logging
+import os
+import pickle
 from rich import print as rprint
 from rich.tree import Tree
 import sly
+from sly.lex import Token
 
 from lexer import Lexer
 from model import *
-from errors import error, errors_detected  # si no existe, crea un stub simple
+from errors import error, errors_detected, render  # si no existe, crea un stub simple
+
+
+def _L(node, p):
+    '''
+    Give 'node' the line number and the source offsets (start, end) of
+    the production 'p'. Symbols derived from an empty production have no
+    position and are skipped.
+    '''
+    node.lineno = p.lineno
+    node.start = p.index
+    for sym in reversed(p._slice):
+        end = getattr(sym, 'end', None)
+        if end is not None:
+            node.end = end
+            break
+    return node
 
 
-def _L(node, lineno):
-    if hasattr(node, "lineno"):
-        node.lineno = lineno
-    return node
+# ==========================================================
+# LALR TABLE CACHE
+# ==========================================================
+# sly builds the LALR tables every time the Parser class is created
+# (i.e. on every import). The tables only depend on the grammar, so they
+# are pickled next to the bytecode cache, keyed by a hash of the grammar
+# rules, and loaded on later imports.
+_tables_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+_sly_build_lrtables = sly.yacc.Parser.__dict__['_Parser__build_lrtables'].__func__
+
+
+class _LRTables:
+    '''
+    The subset of sly's LRTable used by Parser.parse().
+    '''
+    def __init__(self, lr_action, lr_goto, defaulted_states):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+
+
+def _grammar_hash(cls):
+    g = cls._grammar
+    spec = [sly.__version__, repr(g.Start), repr(sorted(g.Precedence.items()))]
+    spec += [str(p) for p in g.Productions]
+    return hashlib.sha256('\n'.join(spec).encode('utf-8')).hexdigest()[:16]
+
+
+def _load_lrtables(cls):
+    if cls.debugfile:
+        # the debug file needs the full LRTable object
+        return _sly_build_lrtables(cls)
+
+    cls.tables_file = os.path.join(_tables_dir, f'parsetab.{cls.__name__}.{_grammar_hash(cls)}.pickle')
+    try:
+        with open(cls.tables_file, 'rb') as f:
+            cls._lrtable = _LRTables(*pickle.load(f))
+        return True
+    except Exception:
+        # missing, stale or corrupt cache: rebuild it
+        pass
+
+    _sly_build_lrtables(cls)
+    t = cls._lrtable
+    tables = (t.lr_action, t.lr_goto, t.defaulted_states)
+    cls._lrtable = _LRTables(*tables)
+    try:
+        os.makedirs(_tables_dir, exist_ok=True)
+        tmp = f'{cls.tables_file}.{os.getpid()}'
+        with open(tmp, 'wb') as f:
+            pickle.dump(tables, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cls.tables_file)
+    except OSError:
+        pass
+    return True
+
+
+class _TokenStream:
+    '''
+    Token iterator that lets error recovery push tokens back.
+    '''
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.pending = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pending:
+            return self.pending.pop()
+        return next(self.tokens)
+
+    def push(self, *toks):
+        self.pending.extend(reversed(toks))
+
+
+def _semi(tok):
+    # synthetic ';' used to close a declaration discarded by recovery
+    t = Token()
+    t.type = t.value = ';'
+    t.lineno, t.index, t.end = tok.lineno, tok.index, tok.index
+    return t
 
 
 class Parser(sly.Parser):
     log = logging.getLogger()
     log.setLevel(logging.ERROR)
     expected_shift_reduce = 1
-    debugfile = 'grammar.txt'
+
+    # Set BMINOR_GRAMMAR_DEBUG=grammar.txt to dump the grammar and the
+    # LALR states (this bypasses the table cache).
+    debugfile = os.environ.get('BMINOR_GRAMMAR_DEBUG')
+
+    # sly.Parser._build() calls this private hook to build the tables
+    _Parser__build_lrtables = classmethod(_load_lrtables)
 
     tokens = Lexer.tokens
 
@@ -30,13 +135,18 @@ class Parser(sly.Parser):
     def prog(self, p):
         return Program(p.decl_list)
 
-    @_('decl decl_list')
+    # Lists are left-recursive and grow in place: linear time, and the
+    # LALR stack does not grow with the number of elements.
+    @_('decl_list decl')
     def decl_list(self, p):
-        return [p.decl] + p.decl_list
+        p.decl_list.append(p.decl)
+        return p.decl_list
 
     @_('empty')
     def decl_list(self, p):
-        return []
+        # kept so a parse aborted at EOF can still return what it had
+        self.decls = []
+        return self.decls
 
     # ==========================================================
     # DECLARATIONS
@@ -44,45 +154,43 @@ class Parser(sly.Parser):
     # var simple: name : type ;
     @_('ID ":" type_simple ";"')
     def decl(self, p):
-        return _L(VarDecl(name=p.ID, type=p.type_simple), p.lineno)
+        return _L(VarDecl(name=p.ID, type=p.type_simple), p)
 
     # array declaration: name : array [ expr ] type ;
     @_('ID ":" type_array_sized ";"')
     def decl(self, p):
         t = p.type_array_sized
-        dims = t.dims if isinstance(t, TypeNode) and t.dims else []
-        return _L(ArrayDecl(name=p.ID, type=TypeNode(name=t.name, dims=dims), dims=dims), p.lineno)
+        return _L(ArrayDecl(name=p.ID, type=t, dims=t.dims), p)
 
     # function declaration header: name : function ret_type ( params ) ;
     @_('ID ":" type_func ";"')
     def decl(self, p):
         ret_type, params = p.type_func
-        return _L(FuncDecl(name=p.ID, return_type=ret_type, params=params), p.lineno)
+        return _L(FuncDecl(name=p.ID, return_type=ret_type, params=params), p)
 
     # declaration with initializer (var)
     @_('ID ":" type_simple "=" expr ";"')
     def decl_init(self, p):
-        return _L(VarDecl(name=p.ID, type=p.type_simple, value=p.expr), p.lineno)
+        return _L(VarDecl(name=p.ID, type=p.type_simple, value=p.expr), p)
 
     # array with initializer: name : array [ expr ] type = { list } ;
     @_('ID ":" type_array_sized "=" "{" opt_expr_list "}" ";"')
     def decl_init(self, p):
         vals = p.opt_expr_list or []
         t = p.type_array_sized
-        dims = t.dims if isinstance(t, TypeNode) and t.dims else []
-        return _L(ArrayDecl(name=p.ID, type=TypeNode(name=t.name, dims=dims), dims=dims, value=vals), p.lineno)
+        return _L(ArrayDecl(name=p.ID, type=t, dims=t.dims, value=vals), p)
 
     # function with body: name : function ret_type ( params ) = { stmts }
     @_('ID ":" type_func "=" "{" opt_stmt_list "}"')
     def decl_init(self, p):
         ret_type, params = p.type_func
         body = p.opt_stmt_list or []
-        return _L(FuncDecl(name=p.ID, return_type=ret_type, params=params, body=body), p.lineno)
+        return _L(FuncDecl(name=p.ID, return_type=ret_type, params=params, body=body), p)
 
         # array sin tamaño
     @_('ID ":" type_array ";"')
     def decl(self, p):
-        return _L(ArrayDecl(name=p.ID, type=p.type_array, dims=[]), p.lineno)
+        return _L(ArrayDecl(name=p.ID, type=p.type_array, dims=[]), p)
 
 
     # allow decl or decl_init as decl
@@ -90,6 +198,13 @@ class Parser(sly.Parser):
     def decl(self, p):
         return p.decl_init
 
+    # error recovery: the tokens of a broken declaration or statement are
+    # discarded up to the ';' that error() leaves in the input
+    @_('error ";"')
+    def decl(self, p):
+        self.errok()
+        return _L(ErrorDecl(message=self.errors[-1][1], lineno=p.lineno), p)
+
     # ==========================================================
     # STATEMENTS
     # ==========================================================
@@ -99,8 +214,10 @@ class Parser(sly.Parser):
     @_('empty')
     def opt_stmt_list(self, p): return []
 
-    @_('stmt stmt_list')
-    def stmt_list(self, p): return [p.stmt] + p.stmt_list
+    @_('stmt_list stmt')
+    def stmt_list(self, p):
+        p.stmt_list.append(p.stmt)
+        return p.stmt_list
 
     @_('stmt')
     def stmt_list(self, p): return [p.stmt]
@@ -126,18 +243,18 @@ class Parser(sly.Parser):
     def if_stmt_closed(self, p):
         then_branch = p[1] if isinstance(p[1], list) else [p[1]]
         else_branch = p[3] if isinstance(p[3], list) else [p[3]]
-        return _L(IfStmt(cond=p.if_cond, then=then_branch, else_=else_branch), p.lineno)
+        return _L(IfStmt(cond=p.if_cond, then=then_branch, else_=else_branch), p)
 
     @_('if_cond stmt')
     def if_stmt_open(self, p):
         then_branch = p[1] if isinstance(p[1], list) else [p[1]]
-        return _L(IfStmt(cond=p.if_cond, then=then_branch), p.lineno)
+        return _L(IfStmt(cond=p.if_cond, then=then_branch), p)
 
     @_('if_cond closed_stmt ELSE if_stmt_open')
     def if_stmt_open(self, p):
         then_branch = p[1] if isinstance(p[1], list) else [p[1]]
         else_branch = p[3].then if isinstance(p[3], IfStmt) else [p[3]]
-        return _L(IfStmt(cond=p.if_cond, then=then_branch, else_=else_branch), p.lineno)
+        return _L(IfStmt(cond=p.if_cond, then=then_branch, else_=else_branch), p)
 
     # ---------- FOR ----------
     # for ( init ; cond ; step ) stmt
@@ -148,7 +265,7 @@ class Parser(sly.Parser):
         cond = getattr(p, 'opt_expr1', None)
         incr = getattr(p, 'opt_expr2', None)
         body = p.closed_stmt if isinstance(p.closed_stmt, list) else [p.closed_stmt]
-        return _L(ForStmt(init=init, cond=cond, step=incr, body=body), p.lineno)
+        return _L(ForStmt(init=init, cond=cond, step=incr, body=body), p)
 
     @_('FOR "(" opt_expr ";" opt_expr ";" opt_expr ")" stmt')
     def for_stmt_open(self, p):
@@ -156,17 +273,17 @@ class Parser(sly.Parser):
         cond = getattr(p, 'opt_expr1', None)
         incr = getattr(p, 'opt_expr2', None)
         body = p.stmt if isinstance(p.stmt, list) else [p.stmt]
-        return _L(ForStmt(init=init, cond=cond, step=incr, body=body), p.lineno)
+        return _L(ForStmt(init=init, cond=cond, step=incr, body=body), p)
 
     # ---------- SIMPLE STATEMENTS ----------
     @_('RETURN opt_expr ";"')
     def simple_stmt(self, p):
-        return _L(ReturnStmt(value=p.opt_expr), p.lineno)
+        return _L(ReturnStmt(value=p.opt_expr), p)
 
     @_('PRINT opt_expr_list ";"')
     def simple_stmt(self, p):
         vals = p.opt_expr_list or []
-        return _L(PrintStmt(value=vals), p.lineno)
+        return _L(PrintStmt(value=vals), p)
 
     @_('"{" opt_stmt_list "}"')
     def simple_stmt(self, p):
@@ -188,7 +305,7 @@ class Parser(sly.Parser):
     def expr(self, p): return p.expr1
 
     @_('lval "=" expr1')
-    def expr1(self, p): return _L(Assignment(target=p.lval, value=p.expr1), p.lineno)
+    def expr1(self, p): return _L(Assignment(target=p.lval, value=p.expr1), p)
 
     @_('expr2')
     def expr1(self, p): return p.expr2
@@ -198,27 +315,27 @@ class Parser(sly.Parser):
     def expr2(self, p): return p.factor
 
     @_('expr2 "+" factor')
-    def expr2(self, p): return _L(BinOper(oper='+', left=p.expr2, right=p.factor), p.lineno)
+    def expr2(self, p): return _L(BinOper(oper='+', left=p.expr2, right=p.factor), p)
 
     @_('expr2 "-" factor')
-    def expr2(self, p): return _L(BinOper(oper='-', left=p.expr2, right=p.factor), p.lineno)
+    def expr2(self, p): return _L(BinOper(oper='-', left=p.expr2, right=p.factor), p)
 
     @_('expr2 "*" factor')
-    def expr2(self, p): return _L(BinOper(oper='*', left=p.expr2, right=p.factor), p.lineno)
+    def expr2(self, p): return _L(BinOper(oper='*', left=p.expr2, right=p.factor), p)
 
     @_('expr2 "/" factor')
-    def expr2(self, p): return _L(BinOper(oper='/', left=p.expr2, right=p.factor), p.lineno)
+    def expr2(self, p): return _L(BinOper(oper='/', left=p.expr2, right=p.factor), p)
 
    
 
     # lvalues
     @_('ID')
-    def lval(self, p): return _L(VarLoc(mode="store", name=p.ID), p.lineno)
+    def lval(self, p): return _L(VarLoc(mode="store", name=p.ID), p)
 
     @_('ID "[" expr "]"')
     def lval(self, p):
         # array access: ID [ expr ]
-        return _L(ArrayLoc(mode="store", name=p.ID, index=[p.expr]), p.lineno)
+        return _L(ArrayLoc(mode="store", name=p.ID, index=[p.expr]), p)
 
     # ==========================================================
     # FACTORS (tokens literales and groups)
@@ -230,28 +347,28 @@ class Parser(sly.Parser):
     @_('ID "(" opt_expr_list ")"')
     def group(self, p):
         args = p.opt_expr_list or []
-        return _L(FuncCall(name=p.ID, args=args), p.lineno)
+        return _L(FuncCall(name=p.ID, args=args), p)
 
     @_('ID')
-    def factor(self, p): return _L(VarLoc(mode="load", name=p.ID), p.lineno)
+    def factor(self, p): return _L(VarLoc(mode="load", name=p.ID), p)
 
     @_('INT_LITERAL')
-    def factor(self, p): return _L(Integer(p.INT_LITERAL), p.lineno)
+    def factor(self, p): return intern(Integer(p.INT_LITERAL))
 
     @_('FLOAT_LITERAL')
-    def factor(self, p): return _L(Float(p.FLOAT_LITERAL), p.lineno)
+    def factor(self, p): return intern(Float(p.FLOAT_LITERAL))
 
     @_('CHAR_LITERAL')
-    def factor(self, p): return _L(Char(p.CHAR_LITERAL), p.lineno)
+    def factor(self, p): return intern(Char(p.CHAR_LITERAL))
 
     @_('STRING_LITERAL')
-    def factor(self, p): return _L(String(p.STRING_LITERAL), p.lineno)
+    def factor(self, p): return intern(String(p.STRING_LITERAL))
 
     @_('TRUE')
-    def factor(self, p): return _L(Boolean(True), p.lineno)
+    def factor(self, p): return intern(Boolean(True))
 
     @_('FALSE')
-    def factor(self, p): return _L(Boolean(False), p.lineno)
+    def factor(self, p): return intern(Boolean(False))
 
     # ==========================================================
     # TYPES and TYPE FORMS
@@ -263,18 +380,18 @@ class Parser(sly.Parser):
     @_('STRING')
     @_('VOID')
     def type_simple(self, p):
-        return TypeNode(name=p[0])
+        return intern(_L(TypeNode(name=p[0]), p))
 
     # array without explicit dimension: array [] type
     @_('ARRAY "[" "]" type_simple')
     def type_array(self, p):
-        return TypeNode(name=p.type_simple.name, dims=[])
+        return intern(_L(TypeNode(name=p.type_simple.name, dims=[]), p))
 
     # array with expression dimension: array [ expr ] type
     @_('ARRAY "[" expr "]" type_simple')
     def type_array_sized(self, p):
         # store the expression as dimension (may be an Integer node or any expr)
-        return TypeNode(name=p.type_simple.name, dims=[p.expr])   
+        return intern(_L(TypeNode(name=p.type_simple.name, dims=[p.expr]), p))
     # function type: FUNCTION ret_type ( opt_param_list )
     @_('FUNCTION type_simple "(" opt_param_list ")"')
     def type_func(self, p):
@@ -291,23 +408,25 @@ class Parser(sly.Parser):
     @_('empty')
     def opt_param_list(self, p): return []
 
-    @_('param "," param_list')
-    def param_list(self, p): return [p.param] + p.param_list
+    @_('param_list "," param')
+    def param_list(self, p):
+        p.param_list.append(p.param)
+        return p.param_list
 
     @_('param')
     def param_list(self, p): return [p.param]
 
     @_('ID ":" type_simple')
     def param(self, p):
-        return VarParm(name=p.ID, type=p.type_simple)
+        return _L(VarParm(name=p.ID, type=p.type_simple), p)
 
     @_('ID ":" type_array')
     def param(self, p):
-        return VarParm(name=p.ID, type=p.type_array)
+        return _L(VarParm(name=p.ID, type=p.type_array), p)
 
     @_('ID ":" type_array_sized')
     def param(self, p):
-        return VarParm(name=p.ID, type=p.type_array_sized)   
+        return _L(VarParm(name=p.ID, type=p.type_array_sized), p)
 
     # ==========================================================
     # EXPR LIST
@@ -318,8 +437,10 @@ class Parser(sly.Parser):
     @_('empty')
     def opt_expr_list(self, p): return []
 
-    @_('expr "," expr_list')
-    def expr_list(self, p): return [p.expr] + p.expr_list
+    @_('expr_list "," expr')
+    def expr_list(self, p):
+        p.expr_list.append(p.expr)
+        return p.expr_list
 
     @_('expr')
     def expr_list(self, p): return [p.expr]
@@ -342,10 +463,103 @@ class Parser(sly.Parser):
     # ==========================================================
     # ERROR
     # ==========================================================
+    def parse(self, tokens):
+        '''
+        Parse the tokens collecting every syntax error. Broken declarations
+        and statements become ErrorDecl nodes in the resulting Program.
+        '''
+        self.errors = []
+        self.decls = []
+        self.last_error = None
+        self.stream = _TokenStream(tokens)
+        try:
+            prog = super().parse(self.stream)
+        finally:
+            # sly also records the position of every reduced value in these
+            # dicts (keyed by id(), never cleared); the nodes keep their own
+            self._line_positions.clear()
+            self._index_positions.clear()
+        if prog is None:
+            # sly gives up on errors at EOF: keep the complete declarations
+            prog = Program(self.decls + [ErrorDecl(message=self.errors[-1][1], lineno=self.errors[-1][0])])
+        return prog
+
     def error(self, p):
-        lineno = p.lineno if p else 'EOF'
         value = repr(p.value) if p else 'EOF'
-        error(f"Syntax error at {value}", lineno)
+        error(f"Syntax error at {value}", p if p else 'EOF', 'syntax')
+        self.errors.append((p.lineno if p else None, f"Syntax error at {value}"))
+        if p:
+            self.synchronize(p)
+
+    def synchronize(self, p):
+        '''
+        Panic mode: skip tokens up to the next ';' or '}' at the same
+        nesting level, or up to the next 'ID :' (the start of another
+        declaration) outside parentheses. sly then unwinds the stack to
+        a state that accepts 'error', drops the offending token 'p' and
+        reduces "decl : error ';'" with the ';' left here.
+        '''
+        # symbols above the last state that accepts 'error' are discarded
+        # by sly, so their braces/parens are part of what is skipped
+        actions = self._lrtable.lr_action
+        keep = max((i for i, state in enumerate(self.statestack) if 'error' in actions[state]), default=0)
+        kept = [s.type for s in self.symstack[:keep + 1]]
+        dropped = [s.type for s in self.symstack[keep + 1:]]
+        braces = kept.count('{') - kept.count('}')
+        nest = dropped.count('{') - dropped.count('}')
+        parens = kept.count('(') - kept.count(')') + dropped.count('(') - dropped.count(')')
+
+        push = self.stream.push
+        tok = p
+        if (p.type, p.index) == self.last_error:
+            # a second error on the same token right after recovering from
+            # it: the token can never be accepted here, so drop it
+            tok = next(self.stream, None)
+        self.last_error = (p.type, p.index)
+        while tok:
+            if tok.type == ';' and nest == 0:
+                if tok is not p:
+                    push(tok)
+                break
+            elif tok.type == '{':
+                nest += 1
+            elif tok.type == '}':
+                if nest:
+                    nest -= 1
+                    if nest == 0:
+                        # a whole block was skipped: it ends the declaration,
+                        # together with a ';' right after it
+                        nxt = next(self.stream, None)
+                        if nxt and nxt.type == ';':
+                            push(nxt)
+                        else:
+                            push(_semi(tok), *([nxt] if nxt else []))
+                        break
+                elif braces:
+                    # end of the enclosing block
+                    push(_semi(tok), tok)
+                    break
+            elif tok.type == '(':
+                parens += 1
+            elif tok.type == ')':
+                parens -= 1
+            elif tok.type == 'ID' and nest == 0 and parens <= 0:
+                nxt = next(self.stream, None)
+                if nxt and nxt.type == ':':
+                    push(_semi(tok), tok, nxt)
+                    break
+                if nxt:
+                    push(nxt)
+            tok = next(self.stream, None)
+
+        if len(self.statestack) <= 1 and tok:
+            # sly drops errors in the initial state without recovery:
+            # feed it the 'error' token explicitly
+            if tok is p:
+                push(_semi(p))
+            err = _semi(p)
+            err.type = 'error'
+            push(err)
 
 
 def parse(txt):
@@ -354,20 +568,67 @@ def parse(txt):
     return p.parse(l.tokenize(txt))
 
 
+
+def decl_ends(types):
+    '''
+    Given the sequence of token types, yield the position just past the
+    last token of each top-level declaration. A declaration ends with a
+    ';' outside braces, or with the '}' that closes a function body (a
+    '}' followed by ';' is an array initializer and the declaration goes
+    on up to that ';').
+    '''
+    depth = 0
+    closed = False
+    n = 0
+    for n, kind in enumerate(types):
+        if closed:
+            closed = False
+            if kind != ';':
+                yield n
+        if kind == '{':
+            depth += 1
+        elif kind == '}':
+            depth -= 1
+            closed = depth == 0
+        elif kind == ';' and depth <= 0:
+            depth = 0
+            yield n + 1
+    else:
+        if closed:
+            yield n + 1
+
+
+def split_decls(tokens):
+    '''
+    Split a token list into the tokens of each top-level declaration
+    (see decl_ends). Tokens after the last complete declaration form a
+    last, incomplete chunk.
+    '''
+    start = 0
+    for end in decl_ends(tok.type for tok in tokens):
+        yield tokens[start:end]
+        start = end
+    if start < len(tokens):
+        yield tokens[start:]
+
+
 if __name__ == '__main__':
     import sys
+    from dataclasses import fields
     if len(sys.argv) != 2:
         rprint("Usage: python parser.py <filename>")
     else:
         filename = sys.argv[1]
         txt = open(filename, encoding='utf-8').read()
         ast = parse(txt)
+        render()
 
         # Imprimir AST con Rich
         def print_ast(node, tree: Tree):
             if isinstance(node, Node):
                 branch = tree.add(node.__class__.__name__)
-                for field, value in vars(node).items():
+                for f in fields(node):
+                    field, value = f.name, getattr(node, f.name)
                     if isinstance(value, list):
                         sub = branch.add(field)
                         for v in value: print_ast(v, sub)
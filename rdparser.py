@@ -0,0 +1,395 @@
+# rdparser.py
+'''
+Hand-written parser for B-Minor: recursive descent for declarations and
+statements, Pratt parsing for expressions.
+
+It accepts the same language as the sly grammar in parser.py and builds
+the same model.py nodes, but without the LALR driver: no table lookups
+per token and no semantic action for each unit reduction
+(expr -> expr1 -> expr2 -> factor).
+
+The first syntax error is reported at the same token as parser.Parser,
+and recovery skips input with the same panic-mode rules (see
+Parser.synchronize). sly's LALR error state can still absorb or report
+the tokens right after a recovery differently, so later messages may
+not match exactly.
+'''
+from lexer  import Lexer
+from model  import *
+from errors import error
+
+
+_simple_types = frozenset({'INTEGER', 'FLOAT', 'BOOLEAN', 'CHAR', 'STRING', 'VOID'})
+
+# Binding power of the binary operators. The grammar gives all of them
+# the same precedence, associating to the left (expr2 : expr2 op factor).
+_binary_power = {'+': 10, '-': 10, '*': 10, '/': 10}
+
+_literals = {
+    'INT_LITERAL':    Integer,
+    'FLOAT_LITERAL':  Float,
+    'CHAR_LITERAL':   Char,
+    'STRING_LITERAL': String,
+}
+
+
+class _SyntaxError(Exception):
+    pass
+
+
+class _Abort(Exception):
+    # the input ended while recovering from an error
+    pass
+
+
+class RDParser:
+    '''
+    Same interface as parser.Parser: parse(tokens) returns a Program and
+    leaves the (lineno, message) of each syntax error in 'errors'.
+    '''
+    def parse(self, tokens):
+        self.toks = list(tokens)
+        self.types = [t.type for t in self.toks]
+        self.types.append('$end')
+        self.pos = 0
+        self.errors = []
+        self.last_error = None
+        self.decls = []
+        try:
+            while self.types[self.pos] != '$end':
+                self.decls.append(self.decl())
+        except _Abort:
+            # like sly, keep the complete declarations and one ErrorDecl
+            lineno, message = self.errors[-1]
+            self.decls.append(ErrorDecl(message=message, lineno=lineno))
+        return Program(self.decls)
+
+    # ==========================================================
+    # TOKENS
+    # ==========================================================
+    def next(self):
+        tok = self.toks[self.pos]
+        self.pos += 1
+        return tok
+
+    def expect(self, type):
+        if self.types[self.pos] != type:
+            raise _SyntaxError()
+        return self.next()
+
+    def at(self, node, first):
+        '''
+        Give 'node' the position of the tokens from 'first' to the last
+        one consumed, like parser._L does for a production.
+        '''
+        tok = self.toks[first]
+        node.lineno = tok.lineno
+        node.start = tok.index
+        node.end = self.toks[self.pos - 1].end
+        return node
+
+    # ==========================================================
+    # DECLARATIONS
+    # ==========================================================
+    def decl(self, braces=0):
+        start = self.pos
+        try:
+            return self.decl_()
+        except _SyntaxError:
+            return self.recover(start, braces)
+
+    def decl_(self):
+        first = self.pos
+        name = self.expect('ID').value
+        self.expect(':')
+        kind = self.types[self.pos]
+
+        if kind == 'FUNCTION':
+            self.next()
+            if self.types[self.pos] == 'ARRAY':
+                ret_type = self.array_type(sized=True)
+            else:
+                ret_type = self.simple_type()
+            self.expect('(')
+            params = self.params()
+            self.expect(')')
+            if self.types[self.pos] == ';':
+                self.next()
+                return self.at(FuncDecl(name=name, return_type=ret_type, params=params), first)
+            self.expect('=')
+            self.expect('{')
+            body = self.stmt_list(braces=1)
+            self.expect('}')
+            return self.at(FuncDecl(name=name, return_type=ret_type, params=params, body=body), first)
+
+        if kind == 'ARRAY':
+            t = self.array_type()
+            if not t.dims:
+                self.expect(';')
+                return self.at(ArrayDecl(name=name, type=t, dims=[]), first)
+            if self.types[self.pos] == ';':
+                self.next()
+                return self.at(ArrayDecl(name=name, type=t, dims=t.dims), first)
+            self.expect('=')
+            self.expect('{')
+            vals = self.expr_list('}')
+            self.expect('}')
+            self.expect(';')
+            return self.at(ArrayDecl(name=name, type=t, dims=t.dims, value=vals), first)
+
+        t = self.simple_type()
+        if self.types[self.pos] == ';':
+            self.next()
+            return self.at(VarDecl(name=name, type=t), first)
+        self.expect('=')
+        value = self.expr()
+        self.expect(';')
+        return self.at(VarDecl(name=name, type=t, value=value), first)
+
+    def simple_type(self):
+        if self.types[self.pos] not in _simple_types:
+            raise _SyntaxError()
+        first = self.pos
+        return intern(self.at(TypeNode(name=self.next().value), first))
+
+    def array_type(self, sized=False):
+        # array [ ] type  |  array [ expr ] type
+        first = self.pos
+        self.expect('ARRAY')
+        self.expect('[')
+        if self.types[self.pos] == ']' and not sized:
+            self.next()
+            return intern(self.at(TypeNode(name=self.simple_type().name, dims=[]), first))
+        size = self.expr()
+        self.expect(']')
+        return intern(self.at(TypeNode(name=self.simple_type().name, dims=[size]), first))
+
+    def params(self):
+        params = []
+        if self.types[self.pos] == ')':
+            return params
+        while True:
+            first = self.pos
+            name = self.expect('ID').value
+            self.expect(':')
+            if self.types[self.pos] == 'ARRAY':
+                t = self.array_type()
+            else:
+                t = self.simple_type()
+            params.append(self.at(VarParm(name=name, type=t), first))
+            if self.types[self.pos] != ',':
+                return params
+            self.next()
+
+    # ==========================================================
+    # STATEMENTS
+    # ==========================================================
+    def stmt_list(self, braces):
+        # opt_stmt_list: statements up to the closing '}'
+        stmts = []
+        types = self.types
+        while types[self.pos] != '}' and types[self.pos] != '$end':
+            stmts.append(self.stmt(braces))
+        return stmts
+
+    def stmt(self, braces):
+        '''
+        Parse a statement. 'self.open' tells whether it ends with an if
+        without else (if_stmt_open/for_stmt_open in the grammar).
+        '''
+        start = self.pos
+        try:
+            return self.stmt_(braces)
+        except _SyntaxError:
+            self.open = False
+            return self.recover(start, braces)
+
+    def stmt_(self, braces):
+        kind = self.types[self.pos]
+        first = self.pos
+        self.open = False
+
+        if kind == 'IF':
+            self.next()
+            self.expect('(')
+            cond = self.opt_expr(')')
+            self.expect(')')
+            then = self.stmt(braces)
+            then = then if isinstance(then, list) else [then]
+            if self.open or self.types[self.pos] != 'ELSE':
+                self.open = True
+                return self.at(IfStmt(cond=cond, then=then), first)
+            self.next()
+            else_ = self.stmt(braces)
+            if self.open:
+                if not isinstance(else_, IfStmt):
+                    # for_stmt_open is not allowed after ELSE
+                    raise _SyntaxError()
+                # if_cond closed_stmt ELSE if_stmt_open takes the 'then'
+                # branch of the nested if
+                return self.at(IfStmt(cond=cond, then=then, else_=else_.then), first)
+            else_ = else_ if isinstance(else_, list) else [else_]
+            return self.at(IfStmt(cond=cond, then=then, else_=else_), first)
+
+        if kind == 'FOR':
+            self.next()
+            self.expect('(')
+            init = self.opt_expr(';')
+            self.expect(';')
+            cond = self.opt_expr(';')
+            self.expect(';')
+            incr = self.opt_expr(')')
+            self.expect(')')
+            body = self.stmt(braces)
+            body = body if isinstance(body, list) else [body]
+            return self.at(ForStmt(init=init, cond=cond, step=incr, body=body), first)
+
+        if kind == 'RETURN':
+            self.next()
+            value = self.opt_expr(';')
+            self.expect(';')
+            return self.at(ReturnStmt(value=value), first)
+
+        if kind == 'PRINT':
+            self.next()
+            vals = self.expr_list(';')
+            self.expect(';')
+            return self.at(PrintStmt(value=vals), first)
+
+        if kind == '{':
+            self.next()
+            stmts = self.stmt_list(braces + 1)
+            self.expect('}')
+            self.open = False
+            return stmts
+
+        if kind == 'ID' and self.types[self.pos + 1] == ':':
+            return self.decl_()
+
+        value = self.expr()
+        self.expect(';')
+        return value
+
+    # ==========================================================
+    # EXPRESSIONS
+    # ==========================================================
+    def opt_expr(self, follow):
+        if self.types[self.pos] == follow:
+            return None
+        return self.expr()
+
+    def expr_list(self, follow):
+        # opt_expr_list: comma separated expressions, possibly none
+        if self.types[self.pos] == follow:
+            return []
+        vals = [self.expr()]
+        while self.types[self.pos] == ',':
+            self.next()
+            vals.append(self.expr())
+        return vals
+
+    def expr(self):
+        # expr1 : lval '=' expr1 | expr2
+        types, pos = self.types, self.pos
+        if types[pos] == 'ID':
+            after = types[pos + 1]
+            if after == '=':
+                target = self.at(VarLoc(mode='store', name=self.next().value), pos)
+                self.next()
+                return self.at(Assignment(target=target, value=self.expr()), pos)
+            if after == '[':
+                name = self.next().value
+                self.next()
+                index = self.expr()
+                self.expect(']')
+                target = self.at(ArrayLoc(mode='store', name=name, index=[index]), pos)
+                self.expect('=')
+                return self.at(Assignment(target=target, value=self.expr()), pos)
+        return self.binary(0)
+
+    def binary(self, rbp):
+        first = self.pos
+        left = self.factor()
+        types = self.types
+        while _binary_power.get(types[self.pos], 0) > rbp:
+            oper = self.next().type
+            right = self.binary(_binary_power[oper])
+            left = self.at(BinOper(oper=oper, left=left, right=right), first)
+        return left
+
+    def factor(self):
+        kind = self.types[self.pos]
+        first = self.pos
+        if kind == 'ID':
+            return self.at(VarLoc(mode='load', name=self.next().value), first)
+        if kind in _literals:
+            return intern(_literals[kind](self.next().value))
+        if kind == 'TRUE' or kind == 'FALSE':
+            self.next()
+            return intern(Boolean(kind == 'TRUE'))
+        raise _SyntaxError()
+
+    # ==========================================================
+    # ERROR
+    # ==========================================================
+    def recover(self, start, braces):
+        '''
+        Report the syntax error at the current token and skip input with
+        the rules of Parser.synchronize. The tokens consumed since 'start'
+        (where the broken declaration or statement began) are discarded
+        along with it; 'braces' is the number of enclosing blocks.
+        '''
+        types = self.types
+        tok = self.toks[self.pos] if types[self.pos] != '$end' else None
+        value = repr(tok.value) if tok else 'EOF'
+        error(f"Syntax error at {value}", tok if tok else 'EOF', 'syntax')
+        self.errors.append((tok.lineno if tok else None, f"Syntax error at {value}"))
+        if tok is None:
+            raise _Abort()
+        node = ErrorDecl(message=self.errors[-1][1], lineno=tok.lineno)
+
+        dropped = types[start:self.pos]
+        nest = dropped.count('{') - dropped.count('}')
+        parens = dropped.count('(') - dropped.count(')')
+        pos = self.pos
+        if (tok.type, tok.index) == self.last_error:
+            pos += 1
+        self.last_error = (tok.type, tok.index)
+
+        while True:
+            kind = types[pos]
+            if kind == '$end':
+                raise _Abort()
+            if kind == ';' and nest == 0:
+                pos += 1
+                break
+            elif kind == '{':
+                nest += 1
+            elif kind == '}':
+                if nest:
+                    nest -= 1
+                    if nest == 0:
+                        # a whole block was skipped, with a ';' after it
+                        pos += 1
+                        if types[pos] == ';':
+                            pos += 1
+                        break
+                elif braces:
+                    # end of the enclosing block
+                    break
+            elif kind == '(':
+                parens += 1
+            elif kind == ')':
+                parens -= 1
+            elif kind == 'ID' and nest == 0 and parens <= 0 and types[pos + 1] == ':':
+                break
+            pos += 1
+        self.pos = pos
+        # from the offending token to the last one skipped
+        node.start = tok.index
+        node.end = max(self.toks[pos - 1].end, tok.index)
+        return node
+
+
+def parse(txt):
+    return RDParser().parse(Lexer().tokenize(txt))
@@ -40,4 +40,828 @@ for file_name, expected_exit in test_cases.items():
     actual_exit = result.returncode
 
     status = 'OK' if actual_exit == expected_exit else 'ERROR'
-    print(f"{file_name}: Expected={expected_exit}, Actual={actual_exit} → {status}")
\ No newline at end of file
+    print(f"{file_name}: Expected={expected_exit}, Actual={actual_exit} → {status}")
+
+# ==========================================================
+# Relex incremental: ediciones aleatorias frente a relex completo
+# ==========================================================
+import glob
+import random
+
+from lexer import Lexer
+from incremental import IncrementalLexer
+
+FRAGMENTS = ['/*', '*/', '"', "'", '\n', ' ', 'x', 'if', '1', '.5', 'e+3', '//', '{', '}', ';', '=', '*', '/', 'a = b + 1;\n']
+
+def full_lex(text):
+    try:
+        return [(t.type, t.value, t.lineno, t.index, t.end) for t in Lexer().tokenize(text)]
+    except Exception as e:
+        return str(e)
+
+def incremental_lex(lexer, offset, deleted, inserted):
+    try:
+        return [(t.type, t.value, t.lineno, t.index, t.end) for t in lexer.edit(offset, deleted, inserted)]
+    except Exception as e:
+        return str(e)
+
+print("\nRunning incremental relex tests...\n")
+rng = random.Random(2024)
+for path in sorted(glob.glob(os.path.join('typechecker', 'good*.bminor'))) + ['knight.bminor', 'sieve.bminor']:
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    lexer = IncrementalLexer(text)
+    failures = 0
+    for _ in range(200):
+        offset = rng.randrange(len(lexer.text) + 1)
+        deleted = rng.randrange(min(6, len(lexer.text) - offset) + 1)
+        inserted = ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randrange(3)))
+        expected = lexer.text[:offset] + inserted + lexer.text[offset + deleted:]
+        if incremental_lex(lexer, offset, deleted, inserted) != full_lex(expected):
+            failures += 1
+    status = 'OK' if failures == 0 else 'ERROR'
+    print(f"{path}: 200 edits, {failures} mismatches → {status}")
+
+# ==========================================================
+# Reparse incremental: ediciones aleatorias frente a reparse desde cero
+# ==========================================================
+import contextlib
+import io
+from dataclasses import fields
+
+from incremental import IncrementalParser
+from model import Node
+from parser import parse
+
+def node_positions(node):
+    '''
+    Línea y posiciones en el código fuente de todos los nodos (no forman
+    parte de ==).
+    '''
+    if isinstance(node, list):
+        return [node_positions(n) for n in node]
+    if isinstance(node, Node):
+        return [(node.lineno, node.start, node.end)] + [node_positions(getattr(node, f.name))
+                                                        for f in fields(node)]
+    return None
+
+DECL_FRAGMENTS = ['x: integer = 1;\n', 'f: function void () = {\n', 'print 1;', '{', '}', ';', '\n', 'x', '/*', '*/', ' ']
+
+print("\nRunning incremental reparse tests...\n")
+rng = random.Random(2024)
+for path in sorted(glob.glob(os.path.join('typechecker', 'good*.bminor'))) + ['knight.bminor', 'sieve.bminor']:
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    failures = edits = 0
+    # los errores de sintaxis de las ediciones no interesan aquí
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = IncrementalParser(text)
+        for _ in range(100):
+            offset = rng.randrange(len(parser.text) + 1)
+            deleted = rng.randrange(min(6, len(parser.text) - offset) + 1)
+            inserted = ''.join(rng.choice(DECL_FRAGMENTS) for _ in range(rng.randrange(3)))
+            expected = parser.text[:offset] + inserted + parser.text[offset + deleted:]
+            try:
+                prog = parser.edit(offset, deleted, inserted)
+            except Exception:
+                continue            # error léxico: el texto no cambia
+            edits += 1
+            fresh = parse(expected)
+            if (repr(prog) != repr(fresh) or node_positions(prog) != node_positions(fresh) or
+                prog.digest != fresh.digest):
+                failures += 1
+    status = 'OK' if failures == 0 else 'ERROR'
+    print(f"{path}: {edits} edits, {failures} mismatches → {status}")
+
+# una declaración cortada al final del texto, y las ediciones que hacen
+# que deje de ser la primera o que pase a serlo
+edits = [('x: integer = 1;\nprint', []),
+         ('x: integer = 1;\nprint', [(0, 16, '')]),
+         ('print', [(0, 0, 'x: integer = 1;\n')]),
+         ('x: integer;\n{ print', [(0, 0, 'y: integer;\n'), (0, 24, '')]),
+         ('x: integer;\ny: integer = 1;\nprint', [(0, 0, '\n'), (0, 1, '')])]
+for text, changes in edits:
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = IncrementalParser(text)
+        ok = True
+        for change in changes:
+            prog = parser.edit(*change)
+            ok = ok and repr(prog) == repr(parse(parser.text))
+        ok = ok and repr(parser.program) == repr(parse(parser.text))
+    print(f"{text!r} {changes}: {'OK' if ok else 'ERROR'}")
+
+# un nodo que la edición movió sin volver a analizarlo
+from context import Context
+
+with contextlib.redirect_stdout(io.StringIO()):
+    parser = IncrementalParser('x: integer;\ny: integer = x;\n')
+    decl = parser.program.body[1]
+    parser.edit(0, 0, '/* nuevo */\n')
+    ctxt = Context('<edit>', parser.text)
+    span = ctxt.find_span(decl.value)
+    ok = (parser.program.body[1] is decl and ctxt.source[span[0]:span[1]] == 'x' and
+          ctxt.find_source(decl.value) == 'x' and ctxt.position(decl.value.start) == (3, 14) and
+          decl.lineno == 3 and ctxt.find_span(decl.type) is None)
+print(f"find_span: {'OK' if ok else 'ERROR'}")
+
+# ==========================================================
+# Parser en paralelo frente a parse() secuencial
+# ==========================================================
+from bench import gen_program
+from parser import parse
+from parallel import parse_parallel
+
+print("\nRunning parallel parse tests...\n")
+sources = {'gen_program(400)': gen_program(400)}
+for path in sorted(glob.glob(os.path.join('typechecker', '*.bminor'))) + ['knight.bminor', 'sieve.bminor']:
+    with open(path, encoding='utf-8') as f:
+        sources[path] = f.read()
+for name, text in sources.items():
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            expected = parse(text)
+        except Exception as e:
+            expected = str(e)
+        try:
+            result = parse_parallel(text, workers=2)
+        except Exception as e:
+            result = str(e)
+    status = 'OK' if result == expected else 'ERROR'
+    print(f"{name}: {status}")
+
+# ==========================================================
+# Caché del front-end: el resultado guardado es el mismo
+# ==========================================================
+import tempfile
+
+import cache
+from errors import clear_errors, error_messages
+
+print("\nRunning front-end cache tests...\n")
+cache.cache_dir = tempfile.mkdtemp()
+for name, text in sources.items():
+    with contextlib.redirect_stdout(io.StringIO()):
+        runs = []
+        for _ in range(2):
+            clear_errors()
+            try:
+                program, _ = cache.frontend(text, check=False)
+            except Exception as e:
+                program = str(e)
+            runs.append((program, error_messages()))
+    status = 'OK' if runs[0] == runs[1] else 'ERROR'
+    print(f"{name}: {status}")
+
+# un árbol más profundo de lo que pickle puede recorrer se guarda y se
+# carga igual; si no se puede escribir, la compilación sigue y queda un
+# mensaje de depuración
+import logging
+
+from traversal import node_repr
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+
+deep = ('f: function integer () = {\n    x: integer = 0;\n    x = ' +
+        ' + '.join(['1'] * 3000) + ';\n    return x;\n}\n')
+handler = Records()
+cache.log.addHandler(handler)
+cache.log.setLevel(logging.DEBUG)
+for name, directory in (('deep chain', cache.cache_dir),
+                        ('unwritable cache', os.path.join(__file__, 'cache'))):
+    saved, cache.cache_dir = cache.cache_dir, directory
+    clear_errors()
+    handler.records.clear()
+    try:
+        first, _ = cache.frontend(deep)
+        program, env = cache.frontend(deep)
+        ok = not error_messages() and 'f' in env.entries and env.entries['f'] is program.body[0]
+        stored = cache.load(cache.cache_key(deep))
+        if name == 'deep chain':
+            ok = (ok and stored is not None and program is not first and
+                  node_repr(stored[0]) == node_repr(first))
+        else:
+            ok = ok and stored is None and len(handler.records) == 2
+    except Exception:
+        ok = False
+    cache.cache_dir = saved
+    print(f"{name}: {'OK' if ok else 'ERROR'}")
+cache.log.removeHandler(handler)
+cache.log.setLevel(logging.NOTSET)
+cache.clear()
+os.rmdir(cache.cache_dir)
+
+# ==========================================================
+# Parser descendente recursivo frente al parser sly
+# ==========================================================
+from lexer import Lexer
+from parser import Parser
+from rdparser import RDParser
+
+def parse_with(parser_class, text):
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            p = parser_class()
+            return p.parse(Lexer().tokenize(text)), p.errors
+        except Exception as e:
+            return str(e), None
+
+def same_parse(text):
+    '''
+    Sin errores de sintaxis, ambos parsers deben construir el mismo AST;
+    con errores, el primero debe ser el mismo.
+    '''
+    expected, errors = parse_with(Parser, text)
+    result, rd_errors = parse_with(RDParser, text)
+    if not errors:
+        return ((result, rd_errors) == (expected, errors) and
+                node_positions(result) == node_positions(expected))
+    return bool(rd_errors) and rd_errors[0] == errors[0]
+
+print("\nRunning differential parser tests...\n")
+paths = sorted(glob.glob(os.path.join('test', '**', '*.bminor'), recursive=True) +
+               glob.glob(os.path.join('typechecker', '*.bminor'))) + ['knight.bminor', 'sieve.bminor']
+texts = {}
+for path in paths:
+    with open(path, encoding='utf-8') as f:
+        texts[path] = f.read()
+    status = 'OK' if same_parse(texts[path]) else 'ERROR'
+    print(f"{path}: {status}")
+
+TOKEN_FRAGMENTS = ['{', '}', ';', '(', ')', 'if', 'else', 'for', 'x', '=', '1', '+', '-', 'print',
+                   'return', ':', 'integer', 'function', '[', ']', ',', 'array', '2.5', 'true']
+rng = random.Random(2024)
+failures = 0
+for _ in range(300):
+    path = rng.choice(paths)
+    try:
+        toks = [t.value if t.type not in ('STRING_LITERAL', 'CHAR_LITERAL') else 'x'
+                for t in Lexer().tokenize(texts[path])]
+    except Exception:
+        continue
+    for _ in range(rng.randrange(1, 4)):
+        i = rng.randrange(len(toks) + 1)
+        if rng.random() < 0.5 and i < len(toks):
+            del toks[i]
+        else:
+            toks.insert(i, rng.choice(TOKEN_FRAGMENTS))
+    if not same_parse(' '.join(str(t) for t in toks)):
+        failures += 1
+status = 'OK' if failures == 0 else 'ERROR'
+print(f"300 token mutations: {failures} mismatches → {status}")
+
+# ==========================================================
+# AST plano: flatten, save y load conservan el árbol
+# ==========================================================
+import flatast
+
+def count_nodes(node):
+    if isinstance(node, list):
+        return 1 + sum(count_nodes(n) for n in node)
+    if isinstance(node, Node):
+        return 1 + sum(count_nodes(getattr(node, f.name)) for f in fields(node))
+    return 0
+
+print("\nRunning flat AST tests...\n")
+tmp = tempfile.mkdtemp()
+for name, text in sources.items():
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            program = parse(text)
+        except Exception:
+            continue
+    path = os.path.join(tmp, 'ast.bin')
+    flatast.flatten(program).save(path)
+    with flatast.load(path) as flat:
+        tree = flat.to_tree()
+        ok = (tree == program and node_positions(tree) == node_positions(program) and
+              sum(1 for _ in flat.walk()) == count_nodes(program))
+    os.unlink(path)
+    print(f"{name}: {'OK' if ok else 'ERROR'}")
+os.rmdir(tmp)
+
+# ==========================================================
+# Recorridos con pila explícita sobre árboles muy profundos
+# ==========================================================
+from errors import collecting
+from model import BinOper, Integer, Visitor
+from traversal import node_repr, postorder, preorder, transform
+
+class SumVisitor(Visitor):
+    def visit(self, n: BinOper):
+        return (yield n.left) + (yield n.right)
+
+    def visit(self, n: Integer):
+        return n.value
+
+print("\nRunning deep traversal tests...\n")
+DEPTH = 200000
+chain = Integer(0)
+for i in range(1, DEPTH):
+    chain = BinOper('+', chain, Integer(i))
+total = DEPTH * (DEPTH - 1) // 2
+checks = {
+    'visit': chain.accept(SumVisitor()) == total,
+    'preorder': sum(1 for _ in preorder(chain)) == 2 * DEPTH - 1,
+    'postorder': next(postorder(chain)) == Integer(0),
+    'node_repr': node_repr(chain).count('BinOper(') == DEPTH - 1 and
+                 node_repr(chain.left.left.left).startswith('BinOper('),
+    'transform': transform(chain, lambda n: Integer(n.left.value + n.right.value)
+                           if isinstance(n, BinOper) else n) == Integer(total),
+}
+for name, ok in checks.items():
+    print(f"{name}: {'OK' if ok else 'ERROR'}")
+
+# node_repr da el mismo texto que repr(), y --parse lo usa para imprimir
+for name, text in sources.items():
+    with collecting():
+        program = parse(text)
+    ok = program is None or node_repr(program) == repr(program)
+    print(f"node_repr {name}: {'OK' if ok else 'ERROR'}")
+
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'deep.bminor')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('x: integer = ' + ' + '.join(['1'] * 50000) + ';\n')
+    result = subprocess.run(['python', BMINOR_SCRIPT, '--no-cache', '--parse', path],
+                            capture_output=True, text=True)
+    ok = result.returncode == 0 and result.stdout.count('BinOper(') == 49999
+    print(f"--parse deep.bminor: {'OK' if ok else 'ERROR'}")
+
+# ==========================================================
+# Literales y tipos canónicos
+# ==========================================================
+import pickle
+from model import Literal, TypeNode, intern
+
+def canonical(program):
+    # cada literal y cada tipo (salvo los arreglos de tamaño calculado)
+    # es la instancia canónica, también después de pickle y de la caché
+    nodes = [n for n in preorder(program) if isinstance(n, (Literal, TypeNode))]
+    copies = [[n for n in preorder(load(dump(program))) if isinstance(n, (Literal, TypeNode))]
+              for dump, load in ((pickle.dumps, pickle.loads), (cache._dumps, cache._loads))]
+    return all(n is intern(n) or n.start is not None for n in nodes) and \
+           all(a is b or a.start is not None for copy in copies for a, b in zip(nodes, copy))
+
+print("\nRunning canonical node tests...\n")
+for name, text in sources.items():
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            program = parse(text)
+        except Exception:
+            continue
+        rd = RDParser().parse(Lexer().tokenize(text))
+    print(f"{name}: {'OK' if canonical(program) and canonical(rd) else 'ERROR'}")
+
+# los arreglos de tamaño calculado tienen cada uno su TypeNode: volver a
+# declararlo con el mismo tipo no es un conflicto de tipos
+from checker import Check
+from errors import collecting
+
+for text, code in [('n: integer = 3;\na: array [n] integer;\na: array [n] integer;\n', 'redefined'),
+                   ('a: array [3] integer;\na: array [3] integer;\n', 'redefined'),
+                   ('n: integer = 3;\na: array [n] integer;\na: array [n] float;\n', 'conflict'),
+                   ('a: array [3] integer;\na: array [4] integer;\n', 'conflict')]:
+    with collecting() as sink:
+        Check.checker(parse(text))
+    ok = [d.code for d in sink.records] == [code]
+    print(f"redefinition ({code}): {'OK' if ok else 'ERROR'}")
+
+# los nodos canónicos no tienen posiciones: ningún error del checker se
+# reporta en uno de ellos
+ok = True
+for name, text in sources.items():
+    with collecting() as sink:
+        try:
+            Check.checker(parse(text))
+        except Exception:
+            continue
+    ok = ok and all(d.start is not None and d.lineno is not None
+                    for d in sink.records if d.code != 'syntax')
+print(f"checker diagnostics have positions: {'OK' if ok else 'ERROR'}")
+
+# ==========================================================
+# Hash estructural
+# ==========================================================
+print("\nRunning structural hash tests...\n")
+for name, text in sources.items():
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            program = parse(text)
+        except Exception:
+            continue
+        moved = parse('\n\n  ' + text)
+        rd = RDParser().parse(Lexer().tokenize(text))
+    # mismo hash sin importar las posiciones, el parser o el proceso
+    ok = (program.digest == moved.digest == rd.digest ==
+          pickle.loads(pickle.dumps(program)).digest and
+          all(a.digest == b.digest for a, b in zip(program.body, moved.body)))
+    funcs = [d for d in program.body if getattr(d, 'body', None)]
+    if funcs:
+        # cambiar un literal cambia el hash de la función y del programa
+        f = funcs[-1]
+        old = f.digest
+        f.body.append(Integer(123456789))
+        f._digest = program._digest = None
+        ok = ok and f.digest != old and program.digest != rd.digest
+    print(f"{name}: {'OK' if ok else 'ERROR'}")
+
+# ==========================================================
+# Direcciones léxicas del checker
+# ==========================================================
+from checker import Check
+from model import ArrayLoc, Expression, FuncCall, FuncDecl, TypeNode, VarLoc
+
+print("\nRunning lexical addressing tests...\n")
+for name, text in sources.items():
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            program = parse(text)
+        except Exception:
+            continue
+        env = Check.checker(program)
+    tables = {}
+    for table in env.children:
+        tables.setdefault(table.name, table)
+    ok = True
+    for decl in program.body:
+        frames = [tables[decl.name], env] if isinstance(decl, FuncDecl) and decl.name in tables else [env]
+        for n in preorder(decl):
+            if isinstance(n, (VarLoc, ArrayLoc, FuncCall)) and n.addr is not None:
+                depth, slot = n.addr
+                ok = ok and frames[depth].layout[slot].name == n.name
+            # el tipo de toda expresión, también el de un literal, es un código
+            if isinstance(n, Expression) and not isinstance(n, TypeNode):
+                ok = ok and type(n.type) is int
+    print(f"{name}: {'OK' if ok else 'ERROR'}")
+
+# ==========================================================
+# Checker en paralelo frente a Check.checker
+# ==========================================================
+from parallel import check_parallel
+
+def checked_state(program, env):
+    # las anotaciones de cada nodo y las Symtab, con los nodos por su
+    # posición en el preorden del programa
+    nodes = list(preorder(program))
+    index = {}
+    for j, n in enumerate(nodes):
+        index.setdefault(id(n), j)
+    notes = [(None if isinstance(n.type, Node) else n.type, n.addr) for n in nodes]
+    tables = []
+    stack = [(0, env)]
+    while stack:
+        depth, t = stack.pop()
+        tables.append((depth, t.name, t.block, [(k, index[id(v)], t.slots[k]) for k, v in t.entries.items()],
+                       None if t.block else [index[id(v)] for v in t.layout]))
+        stack.extend((depth + 1, c) for c in reversed(t.children))
+    return notes, tables
+
+print("\nRunning parallel checker tests...\n")
+for name, text in sources.items():
+    results = []
+    for check in (Check.checker, lambda p: check_parallel(p, workers=2)):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            try:
+                program = parse(text)
+            except Exception:
+                break
+            clear_errors()
+            env = check(program)
+        results.append((out.getvalue(), error_messages(), checked_state(program, env)))
+    if results:
+        print(f"{name}: {'OK' if results[0] == results[1] else 'ERROR'}")
+
+# ==========================================================
+# Verificación incremental frente a Check.checker
+# ==========================================================
+from errors import current
+from incremental import IncrementalChecker
+
+def check_results(check, program):
+    clear_errors()
+    env = check(program)
+    return (list(current().records), [(n.type, n.addr) for n in preorder(program)],
+            [d.name for d in env.layout])
+
+print("\nRunning incremental checker tests...\n")
+rng = random.Random(2025)
+for path in sorted(glob.glob(os.path.join('typechecker', '*.bminor'))) + ['knight.bminor', 'sieve.bminor']:
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    failures = edits = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = IncrementalParser(text)
+        checker = IncrementalChecker()
+        checker.check(parser.program)
+        for _ in range(30):
+            offset = rng.randrange(len(parser.text) + 1)
+            deleted = rng.randrange(min(6, len(parser.text) - offset) + 1)
+            inserted = ''.join(rng.choice(DECL_FRAGMENTS) for _ in range(rng.randrange(3)))
+            expected = parser.text[:offset] + inserted + parser.text[offset + deleted:]
+            try:
+                prog = parser.edit(offset, deleted, inserted)
+            except Exception:
+                continue
+            edits += 1
+            got = check_results(checker.check, prog)
+            if got != check_results(Check.checker, IncrementalParser(expected).program):
+                failures += 1
+    status = 'OK' if failures == 0 else 'ERROR'
+    print(f"{path}: {edits} edits, {failures} mismatches → {status}")
+
+# ==========================================================
+# Diagnósticos: registros, duplicados, límite y formatos
+# ==========================================================
+import json
+import unicodedata
+
+from errors import Diagnostics, collecting, error
+
+print("\nRunning diagnostics tests...\n")
+text = 'x: integer = true;\nf: function void () = {\n    print u;\n    print u;\n    y = 1;\n}\n'
+with collecting() as sink:
+    program = parse(text)
+    Check.checker(program)
+    Check.checker(program)              # los mismos errores otra vez
+codes = [d.code for d in sink.records]
+spans = [text[d.start:d.end] for d in sink.records]
+ok = (codes == ['type-mismatch', 'undefined', 'undefined', 'undefined'] and
+      spans == ['x: integer = true;', 'u', 'u', 'y'] and sink.count == 4)
+print(f"records: {'OK' if ok else 'ERROR'}")
+
+with collecting(Diagnostics(limit=2)) as sink:
+    for i in range(5):
+        error(f"error {i}", i + 1, 'test')
+    error("error 0", 1, 'test')
+out = io.StringIO()
+sink.render(out, 'text')
+ok = (sink.count == 5 and sink.dropped == 3 and
+      unicodedata.normalize('NFC', out.getvalue()) == '1: error 0\n2: error 1\n... y 3 errores más\n')
+print(f"limit: {'OK' if ok else 'ERROR'}")
+
+# un nodo sin posiciones (armado a mano) sólo tiene el número de línea
+from model import ArrayLoc
+
+with collecting() as sink:
+    error("error", ArrayLoc('load', 'a', [Integer(1)]), 'test')
+    error("error", ArrayLoc('load', 'a', [Integer(2)]), 'test')
+ok = [(d.lineno, d.start, d.end) for d in sink.records] == [(None, None, None)]
+print(f"no position: {'OK' if ok else 'ERROR'}")
+
+with collecting() as sink:
+    parse('x: integer = ;\ny integer;\n')
+out = io.StringIO()
+sink.render(out, 'json')
+found = json.loads(out.getvalue())
+ok = ([(d['code'], d['message'], d['lineno'], d['start']) for d in found] ==
+      [(d.code, d.message, d.lineno, d.start) for d in sink.records] and
+      all(d['code'] == 'syntax' for d in found) and found)
+print(f"json: {'OK' if ok else 'ERROR'}")
+
+# los scripts que usan el front-end muestran los errores al final
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'bad.bminor')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('x: integer = ;\n')
+    for script in ('testParser.py', 'parser.py'):
+        result = subprocess.run(['python', script, path], capture_output=True, text=True,
+                                env=dict(os.environ, BMINOR_NO_CACHE='1'))
+        ok = "1: Syntax error at ';'" in result.stdout
+        print(f"{script}: {'OK' if ok else 'ERROR'}")
+
+# ==========================================================
+# Índice de símbolos frente a lo que resolvió el checker
+# ==========================================================
+from symindex import SymbolIndex
+
+print("\nRunning symbol index tests...\n")
+db = os.path.join(tempfile.mkdtemp(), 'symbols.db')
+with SymbolIndex(db) as ix:
+    for name, text in sources.items():
+        ix.update(name, text)
+for name, text in sources.items():
+    refs = []
+    with collecting():
+        try:
+            program = parse(text)
+        except Exception:
+            continue
+        Check.checker(program, refs)
+    with SymbolIndex(db) as ix:
+        ok = not ix.update(name, text)
+        for n, decl in refs:
+            found = ix.definition_at(name, n.start)
+            if decl is None:
+                ok = ok and found is None
+                continue
+            ok = ok and found is not None and (found.name, found.start) == (decl.name, decl.start)
+            uses = [(r.start, r.end) for r in ix.references_at(name, n.start)]
+            ok = ok and uses == sorted((m.start, m.end) for m, d in refs if d is decl)
+        ix.remove(name)
+        ok = ok and name not in ix.files() and not ix.definition_at(name, 0)
+    print(f"{name}: {'OK' if ok else 'ERROR'}")
+os.unlink(db)
+os.rmdir(os.path.dirname(db))
+
+# ==========================================================
+# Plegado y propagación de constantes
+# ==========================================================
+from model import Boolean, DoWhileStmt, Float, Program, PrintStmt, WhileStmt, type_node
+from optimize import fold_constants, fold_binop, fold_unaryop
+
+print("\nRunning constant folding tests...\n")
+cases = [
+    (fold_binop('/', Integer(-7), Integer(2)), Integer(-4)),       # división entera de la ejecución
+    (fold_binop('%', Integer(-7), Integer(3)), Integer(2)),
+    (fold_binop('/', Float(7.0), Float(2.0)), Float(3.5)),
+    (fold_binop('/', Integer(1), Integer(0)), None),                # queda para la ejecución
+    (fold_binop('+', Integer(1), Float(2.0)), None),                # typesys no lo permite
+    (fold_binop('<', Integer(1), Integer(2)), Boolean(True)),
+    (fold_binop('&&', Boolean(True), Boolean(False)), Boolean(False)),
+    (fold_unaryop('-', Integer(5)), Integer(-5)),
+    (fold_unaryop('!', Integer(5)), None),
+]
+ok = all(got == want and type(got) is type(want) for got, want in cases)
+print(f"operators: {'OK' if ok else 'ERROR'}")
+
+text = '''N: integer = 100;
+M: integer = N * 2;
+s: array [N] integer;
+f: function integer (a: integer) = {
+    x: integer = M / 3;
+    y: integer = 1;
+    y = a;
+    if (true) { print x; } else { print y; }
+    return x + y;
+}
+'''
+program = fold_constants(parse(text))
+f = program.body[3]
+ok = (program.body[1].value == Integer(200) and
+      program.body[2].type is intern(TypeNode('integer', [Integer(100)])) and
+      f.body[0].value == Integer(66) and f.body[1].value == Integer(1) and
+      f.body[3] == [PrintStmt([Integer(66)])] and
+      f.body[4].value.left == Integer(66) and isinstance(f.body[4].value.right, VarLoc))
+# la gramática no tiene while: el AST se arma a mano
+loops = [WhileStmt(intern(Boolean(False)), [PrintStmt([Integer(1)])]),
+         DoWhileStmt([PrintStmt([Integer(2)])], intern(Boolean(False)))]
+program = fold_constants(Program([FuncDecl('g', type_node('void'), [], loops)]))
+ok = ok and program.body[0].body == [[], [PrintStmt([Integer(2)])]]
+print(f"propagation: {'OK' if ok else 'ERROR'}")
+
+# una llamada (Check.refs también la registra) no se pliega, pero sus
+# argumentos sí; la gramática no tiene llamadas: se agrega una al AST
+from model import FuncCall
+
+program = parse('''N: integer = 2;
+g: function integer (a: integer) = { return a; }
+f: function void () = {
+    x: integer = 0;
+    print x;
+}
+''')
+f = program.body[2]
+f.body[0].value = FuncCall('g', [BinOper('*', VarLoc('load', 'N'), Integer(3))])
+try:
+    fold_constants(program)
+    ok = (f.body[0].value == FuncCall('g', [Integer(6)]) and
+          f.body[1] == PrintStmt([VarLoc('load', 'x')]))
+except Exception:
+    ok = False
+print(f"calls: {'OK' if ok else 'ERROR'}")
+
+# el programa plegado sigue siendo válido y el resultado no cambia al
+# volver a plegarlo
+for name, text in sources.items():
+    with collecting() as sink:
+        try:
+            program = parse(text)
+        except Exception:
+            continue
+        Check.checker(program)
+    if sink.count:
+        continue
+    fold_constants(program)
+    digest = program.digest
+    with collecting() as sink:
+        fold_constants(program)
+    print(f"{name}: {'OK' if not sink.count and program.digest == digest else 'ERROR'}")
+
+# ==========================================================
+# Eliminación de código muerto
+# ==========================================================
+from model import FuncCall
+from optimize import eliminate_dead_code
+
+print("\nRunning dead code elimination tests...\n")
+text = '''N: integer = 100;
+unused: integer = 5;
+arr: array [N] integer;
+helper: function integer (a: integer) = { return a * N; }
+dead: function integer (a: integer) = { return a; }
+main: function void () = {
+    x: integer = 1;
+    if (true) { print x; } else { print 0; }
+    if (x) { return; } else { return; }
+    print 1;
+}
+'''
+for exact in (False, True):
+    program = parse(text)
+    main = program.body[-1]
+    # la gramática no tiene llamadas: se agrega una al AST
+    main.body[0].value = FuncCall('helper', [Integer(2)])
+    refs = None
+    if exact:
+        refs = []
+        with collecting():
+            Check.checker(program, refs)
+    removed = eliminate_dead_code(program, refs)
+    ok = ([getattr(n, 'name', type(n).__name__) for n in removed] ==
+          ['unused', 'arr', 'dead', 'IfStmt', 'PrintStmt'] and
+          [d.name for d in program.body] == ['N', 'helper', 'main'] and
+          main.body[1] == [PrintStmt([VarLoc('load', 'x')])] and len(main.body) == 3)
+    print(f"{'refs' if exact else 'names'}: {'OK' if ok else 'ERROR'}")
+
+# sin main no se elimina ninguna declaración, y lo que queda sigue
+# siendo válido
+for name, text in sources.items():
+    with collecting() as sink:
+        try:
+            program = parse(text)
+        except Exception:
+            continue
+        refs = []
+        Check.checker(program, refs)
+    if sink.count:
+        continue
+    has_main = any(getattr(d, 'name', None) == 'main' for d in program.body)
+    before = len(program.body)
+    eliminate_dead_code(program, refs)
+    with collecting() as sink:
+        Check.checker(program)
+    ok = not sink.count and (has_main or len(program.body) == before)
+    print(f"{name}: {'OK' if ok else 'ERROR'}")
+
+# ==========================================================
+# Modo rápido del lexer frente a Lexer.tokenize: espacios al final
+# ==========================================================
+from lexer import scan, scan_stream
+
+def fast_lex(text):
+    try:
+        return [(t.type, t.value, t.lineno, t.index, t.end) for t in scan(text).tokens()]
+    except Exception as e:
+        return str(e)
+
+def stream_lex(text, chunk_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'input.bminor')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        try:
+            return [(t.type, t.value, t.lineno, t.index, t.end)
+                    for toks in scan_stream(path, chunk_size) for t in toks.tokens()]
+        except Exception as e:
+            return str(e)
+
+print("\nRunning fast lexer whitespace tests...\n")
+for text in ['x ', 'x\t', 'x \t ', 'x: integer = 1; ', 'x\r\n', 'x: integer = 1;\r\n  \r\n',
+             'a\r\nb \t\r\n  ', ' ', '', 'x $ ', '// comentario ', '/* c */ \t']:
+    expected = full_lex(text)
+    ok = fast_lex(text) == expected and all(stream_lex(text, n) == expected for n in (1, 2, 3, 64))
+    print(f"{text!r}: {'OK' if ok else 'ERROR'}")
+
+# ==========================================================
+# Modo rápido del lexer: bloques pequeños y reprs() (--scan)
+# ==========================================================
+import lexer as _lexer
+
+def token_reprs(text):
+    try:
+        return [repr(t) for t in Lexer().tokenize(text)]
+    except Exception as e:
+        return [str(e)]
+
+print("\nRunning fast lexer block tests...\n")
+block = _lexer._BLOCK
+for name, text in sources.items():
+    expected = full_lex(text)
+    try:
+        ok = True
+        for _lexer._BLOCK in (5, 64):
+            ok = ok and fast_lex(text) == expected
+    finally:
+        _lexer._BLOCK = block
+    toks = scan(text)
+    reprs = list(toks.reprs())
+    if toks.error:
+        reprs.append(str(toks.error))
+    ok = ok and reprs == token_reprs(text)
+    print(f"{name}: {'OK' if ok else 'ERROR'}")
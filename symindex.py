@@ -0,0 +1,256 @@
+# symindex.py
+'''
+Índice de símbolos persistente, para "ir a la definición" y "buscar
+referencias" en un proyecto sin volver a analizar sus archivos.
+
+De cada archivo se guardan, en una base de datos sqlite:
+
+    scopes    las tablas de símbolos (global, funciones y bloques) y
+              la tabla que contiene a cada una
+    symbols   las declaraciones de cada tabla: nombre, clase de nodo,
+              tipo y posición en el código fuente
+    refs      cada uso de un nombre (VarLoc, ArrayLoc, FuncCall) con su
+              posición y la declaración a la que se resolvió (NULL si
+              no está definido)
+
+Los usos los entrega el checker (ver Check.refs). Cada archivo se
+actualiza por separado: update() no hace nada si el código fuente y el
+compilador son los mismos que la última vez, y si no reemplaza sólo las
+filas de ese archivo, en una transacción. Las consultas usan los
+índices de la base de datos y no cargan el resto.
+'''
+import hashlib
+import sqlite3
+from collections import namedtuple
+from importlib   import import_module
+
+from errors import collecting
+from model  import FuncDecl
+
+
+# Una definición o un uso: archivo, nombre, clase del nodo de la
+# declaración (None si el nombre no está definido) y posición
+Location = namedtuple('Location', 'path name kind lineno start end')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id      INTEGER PRIMARY KEY,
+    path    TEXT UNIQUE NOT NULL,
+    digest  TEXT NOT NULL,
+    refspan INTEGER NOT NULL DEFAULT 0,     -- largo máximo de un uso
+    symspan INTEGER NOT NULL DEFAULT 0      -- y de una declaración
+);
+CREATE TABLE IF NOT EXISTS scopes (
+    id      INTEGER PRIMARY KEY,
+    file    INTEGER NOT NULL,
+    parent  INTEGER,
+    name    TEXT NOT NULL,
+    block   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    id      INTEGER PRIMARY KEY,
+    file    INTEGER NOT NULL,
+    scope   INTEGER NOT NULL,
+    name    TEXT NOT NULL,
+    kind    TEXT NOT NULL,
+    type    TEXT,
+    lineno  INTEGER,
+    start   INTEGER,
+    end     INTEGER
+);
+CREATE TABLE IF NOT EXISTS refs (
+    file    INTEGER NOT NULL,
+    symbol  INTEGER,
+    name    TEXT NOT NULL,
+    lineno  INTEGER,
+    start   INTEGER,
+    end     INTEGER
+);
+CREATE INDEX IF NOT EXISTS scopes_file   ON scopes (file);
+CREATE INDEX IF NOT EXISTS symbols_name  ON symbols (name);
+CREATE INDEX IF NOT EXISTS symbols_file  ON symbols (file, start);
+CREATE INDEX IF NOT EXISTS refs_symbol   ON refs (symbol);
+CREATE INDEX IF NOT EXISTS refs_name     ON refs (name);
+CREATE INDEX IF NOT EXISTS refs_file     ON refs (file, start);
+'''
+
+
+class SymbolIndex:
+    '''
+    El índice guardado en 'path' (por omisión en memoria). Se cierra con
+    close() o usándolo con 'with'.
+    '''
+    def __init__(self, path=':memory:'):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    # ==========================================================
+    # ACTUALIZACIÓN
+    # ==========================================================
+    def update(self, path, source=None, parser='sly'):
+        '''
+        Indexa el archivo 'path' (leyendo 'source' de él si no se da).
+        Retorna False si ya estaba indexado con el mismo contenido. Los
+        errores del archivo no se reportan: se indexa lo que se pudo
+        verificar.
+        '''
+        if source is None:
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+        digest = _digest(source, parser)
+        row = self.db.execute('SELECT digest FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] == digest:
+            return False
+
+        # importados aquí, como en cache.frontend
+        import cache
+        from checker import Check
+
+        refs = []
+        with collecting():
+            program = import_module(cache.PARSERS[parser]).parse(source)
+            env = Check.checker(program, refs)
+        self.add(path, env, refs, digest)
+        return True
+
+    def add(self, path, env, refs, digest=''):
+        '''
+        Reemplaza lo indexado de 'path' con la Symtab global 'env' y los
+        usos 'refs' que registró el checker (ver Check.refs).
+        '''
+        db = self.db
+        with db:
+            self._remove(path)
+            file = db.execute('INSERT INTO files (path, digest) VALUES (?, ?)',
+                              (path, digest)).lastrowid
+            symbols = {}            # id(declaración) -> fila
+            symspan = 0
+            stack = [(env, None)]
+            while stack:
+                table, parent = stack.pop()
+                scope = db.execute('INSERT INTO scopes (file, parent, name, block) VALUES (?, ?, ?, ?)',
+                                   (file, parent, table.name, table.block)).lastrowid
+                for name, decl in table.entries.items():
+                    symbols[id(decl)] = db.execute(
+                        'INSERT INTO symbols (file, scope, name, kind, type, lineno, start, end) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (file, scope, name, type(decl).__name__, _type_name(decl),
+                         decl.lineno, decl.start, decl.end)).lastrowid
+                    if decl.start is not None:
+                        symspan = max(symspan, decl.end - decl.start)
+                stack.extend((child, scope) for child in reversed(table.children))
+            db.executemany('INSERT INTO refs (file, symbol, name, lineno, start, end) '
+                           'VALUES (?, ?, ?, ?, ?, ?)',
+                           [(file, symbols.get(id(decl)), n.name, n.lineno, n.start, n.end)
+                            for n, decl in refs])
+            refspan = max((n.end - n.start for n, _ in refs if n.start is not None), default=0)
+            db.execute('UPDATE files SET refspan = ?, symspan = ? WHERE id = ?',
+                       (refspan, symspan, file))
+
+    def remove(self, path):
+        '''
+        Elimina del índice el archivo 'path'.
+        '''
+        with self.db:
+            self._remove(path)
+
+    def _remove(self, path):
+        row = self.db.execute('SELECT id FROM files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return
+        for table in ('refs', 'symbols', 'scopes'):
+            self.db.execute(f'DELETE FROM {table} WHERE file = ?', row)
+        self.db.execute('DELETE FROM files WHERE id = ?', row)
+
+    # ==========================================================
+    # CONSULTAS
+    # ==========================================================
+    def files(self):
+        return [path for path, in self.db.execute('SELECT path FROM files ORDER BY path')]
+
+    def definitions(self, name):
+        '''
+        Las declaraciones de 'name' en todos los archivos y tablas.
+        '''
+        return self._locations(
+            'SELECT f.path, s.name, s.kind, s.lineno, s.start, s.end '
+            'FROM symbols s JOIN files f ON f.id = s.file WHERE s.name = ? '
+            'ORDER BY f.path, s.start', (name,))
+
+    def references(self, name):
+        '''
+        Los usos de 'name' en todos los archivos, definido o no.
+        '''
+        return self._locations(
+            'SELECT f.path, r.name, s.kind, r.lineno, r.start, r.end '
+            'FROM refs r JOIN files f ON f.id = r.file LEFT JOIN symbols s ON s.id = r.symbol '
+            'WHERE r.name = ? ORDER BY f.path, r.start', (name,))
+
+    def definition_at(self, path, offset):
+        '''
+        La declaración del nombre que está en la posición 'offset' de
+        'path' (un uso o la propia declaración), o None.
+        '''
+        symbol = self._symbol_at(path, offset)
+        if symbol is None:
+            return None
+        return self._locations(
+            'SELECT f.path, s.name, s.kind, s.lineno, s.start, s.end '
+            'FROM symbols s JOIN files f ON f.id = s.file WHERE s.id = ?', (symbol,))[0]
+
+    def references_at(self, path, offset):
+        '''
+        Los usos de la misma declaración que el nombre que está en la
+        posición 'offset' de 'path'.
+        '''
+        symbol = self._symbol_at(path, offset)
+        if symbol is None:
+            return []
+        return self._locations(
+            'SELECT f.path, r.name, s.kind, r.lineno, r.start, r.end '
+            'FROM refs r JOIN files f ON f.id = r.file JOIN symbols s ON s.id = r.symbol '
+            'WHERE r.symbol = ? ORDER BY r.start', (symbol,))
+
+    def _symbol_at(self, path, offset):
+        # El uso que contiene 'offset' y empieza más cerca, es decir, el
+        # más interno (en a[i] el ArrayLoc también contiene a i); si no
+        # hay ninguno, la declaración más interna que lo contiene. Sólo
+        # se recorren las filas que empiezan a menos del largo máximo de
+        # un uso (o de una declaración) antes de 'offset'.
+        row = self.db.execute('SELECT id, refspan, symspan FROM files WHERE path = ?',
+                              (path,)).fetchone()
+        if row is None:
+            return None
+        file, refspan, symspan = row
+        row = self.db.execute('SELECT symbol FROM refs WHERE file = ? AND start BETWEEN ? AND ? '
+                              'AND end > ? ORDER BY start DESC LIMIT 1',
+                              (file, offset - refspan, offset, offset)).fetchone()
+        if row is None:
+            row = self.db.execute('SELECT id FROM symbols WHERE file = ? AND start BETWEEN ? AND ? '
+                                  'AND end > ? ORDER BY start DESC LIMIT 1',
+                                  (file, offset - symspan, offset, offset)).fetchone()
+        return row[0] if row is not None else None
+
+    def _locations(self, query, params):
+        return [Location(*row) for row in self.db.execute(query, params)]
+
+
+def _digest(source, parser):
+    import cache
+    h = hashlib.sha256(cache.compiler_version().encode('ascii'))
+    h.update(parser.encode('ascii'))
+    h.update(source.encode('utf-8'))
+    return h.hexdigest()
+
+def _type_name(decl):
+    t = decl.return_type if isinstance(decl, FuncDecl) else decl.type
+    return t.name if t is not None else None
@@ -4,6 +4,7 @@ from rich.console import Console
 from rich         import print
 
 from model        import Node
+from typesys      import type_code
 
 class Symtab:
 	'''
@@ -18,6 +19,22 @@ class Symtab:
 	código estan anidados y las búsquedas de las tablas de
 	simbolos se repetirán hacia arriba a través de los padres
 	para representar las reglas de alcance léxico.
+
+	Cada símbolo recibe además un slot: su posición, en orden de
+	declaración, dentro de la tabla. La lista 'layout' es la
+	disposición del marco (frame) de la tabla: en una función, sus
+	parámetros y luego sus variables locales. Con lookup() un nombre
+	se resuelve a una dirección léxica (profundidad, slot), donde la
+	profundidad es el número de marcos que hay que subir.
+
+	Un bloque ({ ... }) tiene su propia tabla (block=True) para el
+	alcance de sus nombres, pero no su propio marco: sus variables
+	ocupan slots en el marco de la función que lo contiene.
+
+	Si a la tabla global se le asigna un conjunto en 'reads', cada
+	nombre que se busca en ella (con get, lookup o add, se encuentre o
+	no) se agrega al conjunto: son los símbolos globales de los que
+	depende lo que se verificó mientras tanto.
 	'''
 	class SymbolDefinedError(Exception):
 		'''
@@ -37,13 +54,17 @@ class Symtab:
 		'''
 		pass
 		
-	def __init__(self, name, parent=None):
+	def __init__(self, name, parent=None, block=False):
 		'''
 		Crea una tabla de símbolos vacia con la tabla de
 		simbolos padre dada.
 		'''
 		self.name = name
 		self.entries = {}
+		self.slots = {}
+		self.block = block
+		self.layout = parent.layout if block else []
+		self.reads = None
 		self.parent = parent
 		if self.parent:
 			self.parent.children.append(self)
@@ -70,12 +91,16 @@ class Symtab:
 		o definición de una función, variable (por ejemplo, Declaración
 		o FuncDeclaration)
 		'''
+		if self.reads is not None:
+			self.reads.add(name)
 		if name in self.entries:
-			if self.entries[name].type != value.type:
+			if not _same_type(self.entries[name].type, value.type):
 				raise Symtab.SymbolConflictError()
 			else:
 				raise Symtab.SymbolDefinedError()
 		self.entries[name] = value
+		self.slots[name] = len(self.layout)
+		self.layout.append(value)
 		
 	def get(self, name):
 		'''
@@ -83,11 +108,30 @@ class Symtab:
 		simbol, recorriendo hacia arriba a traves de las tablas
 		de simbol principales si no se encuentra en la actual.
 		'''
-		if name in self.entries:
-			return self.entries[name]
-		elif self.parent:
-			return self.parent.get(name)
+		table = self
+		while table is not None:
+			if table.reads is not None:
+				table.reads.add(name)
+			if name in table.entries:
+				return table.entries[name]
+			table = table.parent
 		return None
+
+	def lookup(self, name):
+		'''
+		Como get(), pero retorna (valor, (profundidad, slot)), o
+		(None, None) si el nombre no está definido.
+		'''
+		table, depth = self, 0
+		while table is not None:
+			if table.reads is not None:
+				table.reads.add(name)
+			if name in table.entries:
+				return table.entries[name], (depth, table.slots[name])
+			if not table.block:
+				depth += 1
+			table = table.parent
+		return None, None
 		
 	def print(self):
 		table = Table(title = f"Symbol Table: '{self.name}'")
@@ -100,4 +144,22 @@ class Symtab:
 		print(table, '\n')
 		
 		for child in self.children:
-			child.print()
\ No newline at end of file
+			child.print()
+
+
+def _type_key(t):
+	# Código del tipo (el nombre si no es un tipo conocido) y las
+	# dimensiones, por su digest: no importan las posiciones
+	return type_code(t.name) or t.name, tuple(d.digest for d in t.dims)
+
+def _same_type(a, b):
+	'''
+	Dos tipos son iguales si tienen el mismo código y las mismas
+	dimensiones. No se comparan los objetos: un arreglo cuyo tamaño no es
+	un literal tiene su propio TypeNode en cada declaración.
+	'''
+	if a is b:
+		return True
+	if a is None or b is None:
+		return False
+	return _type_key(a) == _type_key(b)
@@ -1,7 +1,7 @@
 # testInterp.py
 import sys
-from lexer import Lexer
-from parser import Parser
+from cache import frontend
+from errors import errors_detected, render
 from context import Context
 from interp import Interpreter
 
@@ -18,14 +18,12 @@ def main():
     # Crear contexto de compilación
     ctxt = Context(filename, source)
 
-    # Analizador léxico y sintáctico
-    lexer = Lexer()
-    parser = Parser()
-    ast = parser.parse(lexer.tokenize(source))
+    # Analizador léxico y sintáctico (o el AST guardado en la caché)
+    ast, _ = frontend(source, check=False)
 
-    if ctxt.have_errors:
+    if errors_detected():
         print("Se encontraron errores durante el análisis sintáctico o léxico.")
-        ctxt.show_errors()
+        render(position=ctxt.position)
         return
 
     print("Análisis sintáctico exitoso. Ejecutando intérprete...\n")
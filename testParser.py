@@ -3,8 +3,8 @@
 # Script para probar el parser con knight.bminor
 
 import sys
-from lexer import Lexer
-from parser import Parser
+from cache  import frontend
+from errors import errors_detected, render
 
 def main():
     if len(sys.argv) != 2:
@@ -21,14 +21,14 @@ def main():
         print(f"Error: no se encontró el archivo '{filename}'")
         sys.exit(1)
 
-    # Inicializar lexer y parser
-    lexer = Lexer()
-    parser = Parser()
-
     try:
-        tokens = lexer.tokenize(source)
-        ast = parser.parse(tokens)
-        print("Parsing exitoso\n")
+        # lexer y parser (o el AST guardado en la caché del front-end)
+        ast, _ = frontend(source, check=False)
+        render()
+        if errors_detected():
+            print("Parsing con errores\n")
+        else:
+            print("Parsing exitoso\n")
 
         # Si tu parser devuelve un AST tipo objeto, ajusta aquí
         print("AST")
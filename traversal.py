@@ -0,0 +1,145 @@
+# traversal.py
+'''
+Recorridos del AST con una pila explícita, para árboles de cualquier
+profundidad (una cadena a + b + c + ... de n operandos produce n-1
+BinOper anidados, y la recursión de Python se agota en unas mil).
+
+    preorder(node)          los nodos, cada uno antes que sus hijos
+    postorder(node)         los nodos, cada uno después de sus hijos
+    transform(node, func)   reemplaza cada nodo por func(nodo), de las
+                            hojas hacia la raíz
+    node_repr(node)         el mismo texto que repr(node)
+
+Las listas de los campos (cuerpos, argumentos, bloques anidados) se
+recorren pero no se entregan. Un nodo que aparece en dos lugares del
+árbol (las dimensiones de un ArrayDecl, que también están en su
+TypeNode) se entrega una vez por cada lugar, como en un recorrido
+recursivo.
+
+Para los Visitor, los métodos visit escritos como generadores se
+ejecutan también con una pila explícita (ver model._run).
+'''
+from dataclasses import fields
+
+from model import Node
+
+
+_field_names = {}
+_repr_names = {}
+
+def field_names(cls):
+    names = _field_names.get(cls)
+    if names is None:
+        names = _field_names[cls] = tuple(f.name for f in fields(cls))
+    return names
+
+
+def children(node):
+    '''
+    Los nodos hijos de 'node', en el orden de sus campos.
+    '''
+    out = []
+    stack = [getattr(node, name) for name in reversed(field_names(type(node)))]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Node):
+            out.append(value)
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+    return out
+
+
+def preorder(node):
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, list):
+            stack.extend(reversed(n))
+            continue
+        yield n
+        stack.extend(reversed(children(n)))
+
+
+def postorder(node):
+    stack = [(node, False)]
+    while stack:
+        n, expanded = stack.pop()
+        if expanded:
+            yield n
+        elif isinstance(n, list):
+            stack.extend((c, False) for c in reversed(n))
+        else:
+            stack.append((n, True))
+            stack.extend((c, False) for c in reversed(children(n)))
+
+
+def transform(node, func):
+    '''
+    Aplica 'func' a cada nodo después de haberla aplicado a sus hijos y
+    pone el resultado en el lugar del nodo (los campos y las listas se
+    modifican en el lugar). Retorna func(node). Un nodo compartido se
+    transforma una sola vez.
+    '''
+    done = {}           # id(nodo o lista) -> resultado
+    keep = []           # los originales, para que sus id no se reutilicen
+    stack = [(node, False)]
+    while stack:
+        obj, expanded = stack.pop()
+        if id(obj) in done:
+            continue
+        if isinstance(obj, list):
+            items = obj
+        else:
+            items = [getattr(obj, name) for name in field_names(type(obj))]
+        if not expanded:
+            stack.append((obj, True))
+            stack.extend((v, False) for v in reversed(items)
+                         if isinstance(v, (Node, list)) and id(v) not in done)
+            continue
+        keep.append(obj)
+        if isinstance(obj, list):
+            obj[:] = [done[id(v)] if isinstance(v, (Node, list)) else v for v in obj]
+            done[id(obj)] = obj
+        else:
+            for name, v in zip(field_names(type(obj)), items):
+                if isinstance(v, (Node, list)) and done[id(v)] is not v:
+                    setattr(obj, name, done[id(v)])
+            obj._digest = None      # sus hijos pudieron cambiar
+            done[id(obj)] = func(obj)
+    return done[id(node)]
+
+
+def node_repr(node):
+    '''
+    El texto de repr(node) (el __repr__ de las dataclass), construido con
+    una pila explícita: el __repr__ generado es recursivo y falla con un
+    RecursionError en un árbol profundo.
+    '''
+    out = []
+    stack = [(False, node)]     # (es texto, valor)
+    while stack:
+        text, value = stack.pop()
+        if text:
+            out.append(value)
+        elif isinstance(value, Node):
+            cls = type(value)
+            names = _repr_names.get(cls)
+            if names is None:
+                names = _repr_names[cls] = tuple(f.name for f in fields(cls) if f.repr)
+            items = [(True, cls.__qualname__ + '(')]
+            for i, name in enumerate(names):
+                items.append((True, (', ' if i else '') + name + '='))
+                items.append((False, getattr(value, name)))
+            items.append((True, ')'))
+            stack.extend(reversed(items))
+        elif isinstance(value, list):
+            items = [(True, '[')]
+            for i, v in enumerate(value):
+                if i:
+                    items.append((True, ', '))
+                items.append((False, v))
+            items.append((True, ']'))
+            stack.extend(reversed(items))
+        else:
+            out.append(repr(value))
+    return ''.join(out)
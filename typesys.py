@@ -103,8 +103,64 @@ def loockup_type(name):
 	else:
 		return None
 		
+# Códigos enteros
+# ---------------
+# El checker no trabaja con los nombres: cada tipo y cada operador tiene
+# un código entero pequeño, y el resultado de cada operador está en una
+# tabla densa indexada por esos códigos (armada una vez a partir de
+# _bin_ops y _unary_ops). El código NOTYPE (0) es "sin tipo": el de una
+# expresión con errores, y el resultado de un operador no permitido.
+# Una operación con un operando NOTYPE también da NOTYPE.
+NOTYPE = 0
+
+types = ('integer', 'float', 'boolean', 'char', 'string', 'void')
+type_codes = {name: code for code, name in enumerate(types, 1)}
+
+operators = ('+', '-', '*', '/', '%', '^', '=', '<', '<=', '>', '>=', '==', '!=', '&&', '||', '!')
+op_codes = {op: code for code, op in enumerate(operators)}
+
+_ntypes = len(types) + 1
+
+_binop_table = bytearray(len(operators) * _ntypes * _ntypes)
+for (left, op, right), result in _bin_ops.items():
+	_binop_table[(op_codes[op] * _ntypes + type_codes[left]) * _ntypes + type_codes[right]] = type_codes[result]
+
+_unaryop_table = bytearray(len(operators) * _ntypes)
+for (op, operand), result in _unary_ops.items():
+	_unaryop_table[op_codes[op] * _ntypes + type_codes[operand]] = type_codes[result]
+
+def type_code(name):
+	'''
+	Código del tipo 'name' (NOTYPE si no es un tipo).
+	'''
+	return type_codes.get(name, NOTYPE)
+
+def type_name(code):
+	'''
+	Nombre del tipo con código 'code' (None para NOTYPE).
+	'''
+	return types[code - 1] if code else None
+
+def binop(op, left, right):
+	'''
+	Código del tipo de 'left op right', todo en códigos.
+	'''
+	return _binop_table[(op * _ntypes + left) * _ntypes + right]
+
+def unaryop(op, operand):
+	'''
+	Código del tipo de 'op operand', todo en códigos.
+	'''
+	return _unaryop_table[op * _ntypes + operand]
+
 def check_binop(op, left_type, right_type):
-	return _bin_ops.get((left_type, op, right_type))
+	op = op_codes.get(op)
+	if op is None:
+		return None
+	return type_name(binop(op, type_code(left_type), type_code(right_type)))
 
 def check_unaryop(op, operand_type):
-	return _unary_ops.get((op, operand_type))
\ No newline at end of file
+	op = op_codes.get(op)
+	if op is None:
+		return None
+	return type_name(unaryop(op, type_code(operand_type)))
\ No newline at end of file